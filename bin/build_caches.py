@@ -0,0 +1,296 @@
+#!/usr/bin/python3
+"""
+build daily caches (tsa, tsastats, quantile, total_stats) of many
+project/tablename/datestring combinations in parallel
+
+only missing or outdated caches are built, see CachePlanner, independent
+caches of one unit are built at the same time
+
+every combination is one unit of work, every unit is built in its own
+worker process, a failing unit does not stop the others, also not if
+its worker process is killed, for example by the OOM killer.
+units with big raw input files are started first, and only --max-large
+of them are allowed to run at the same time to limit memory usage, the
+main process starts a large unit only if a large slot is free, otherwise
+the next smaller unit is started, so no worker waits for a slot
+
+with --rollups the weekly, monthly and yearly rollups of every processed
+project/tablename are updated after all daily caches are finished
+"""
+import os
+import sys
+import time
+import datetime
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+# own modules
+from datalogger import DataLogger as DataLogger
+from datalogger import DataLoggerRawFileMissing as DataLoggerRawFileMissing
+from datalogger import DataLoggerLiveDataError as DataLoggerLiveDataError
+from datalogger import CachePlanner as CachePlanner
+
+# cache steps in order of dependency
+STEPS = tuple(CachePlanner.stages.keys())
+
+def get_raw_size(basedir, project, tablename, datestring):
+    """
+    return size in bytes of raw input file, like DataLogger looks for it,
+    or 0 if there is no raw file (caches could exist already)
+    """
+    filename = os.path.join(basedir, project, "raw", "%s_%s.csv" % (tablename, datestring))
+    for candidate in (filename, filename + ".gz"):
+        if os.path.isfile(candidate):
+            return os.stat(candidate).st_size
+    return 0
+
+def get_units(basedir, startdate, enddate, project=None, tablename=None):
+    """
+    return list of units (project, tablename, datestring, raw_size)
+    biggest raw input first, so the long running units start early
+    """
+    datalogger = DataLogger(basedir)
+    units = []
+    for datestring in DataLogger.datewalker(startdate, enddate):
+        for unit_project in datalogger.get_projects():
+            if project is not None and unit_project != project:
+                continue
+            for unit_tablename in datalogger.get_tablenames(unit_project):
+                if tablename is not None and unit_tablename != tablename:
+                    continue
+                raw_size = get_raw_size(basedir, unit_project, unit_tablename, datestring)
+                units.append((unit_project, unit_tablename, datestring, raw_size))
+    units.sort(key=lambda unit: unit[3], reverse=True)
+    return units
+
+def build_unit(args):
+    """
+    build all caches of one unit, never raises
+
+    parameters:
+    args <tuple> (basedir, project, tablename, datestring, force)
+
+    returns:
+    <dict> with keys unit, status, message, timings, duration
+    """
+    basedir, project, tablename, datestring, force = args
+    result = {
+        "unit" : "%s/%s/%s" % (datestring, project, tablename),
+        "status" : "ok",
+        "message" : "",
+        "timings" : {},
+        "duration" : 0.0,
+    }
+    starttime = time.time()
+    try:
+        datalogger = DataLogger(basedir)
+        datalogger.setup(project, tablename, datestring)
+        if force:
+            datalogger.delete_caches()
+        result["timings"].update(CachePlanner(datalogger).run())
+        if not result["timings"]:
+            result["message"] = "up to date"
+        elif datalogger.raw_counts is not None and (datalogger.raw_counts["reordered"] or datalogger.raw_counts["duplicates"]):
+            result["message"] = "%(reordered)d rows reordered, %(duplicates)d duplicates skipped" % datalogger.raw_counts
+    except DataLoggerRawFileMissing as exc:
+        result["status"] = "missing"
+        result["message"] = "raw input file missing"
+    except DataLoggerLiveDataError as exc:
+        result["status"] = "skipped"
+        result["message"] = "live data"
+    except Exception as exc:
+        logging.exception(exc)
+        result["status"] = "error"
+        result["message"] = "%s: %s" % (exc.__class__.__name__, exc)
+    result["duration"] = time.time() - starttime
+    return result
+
+def run_unit(connection, args):
+    """
+    build_unit in worker process, result is sent over connection
+
+    parameters:
+    connection <multiprocessing.connection.Connection> write end of pipe
+    args <tuple> arguments of build_unit
+    """
+    try:
+        connection.send(build_unit(args))
+    finally:
+        connection.close()
+
+def build_parallel(basedir, units, jobs, max_large, large_size, force):
+    """
+    build units in up to jobs worker processes, yield results as units finish
+
+    the next unit is chosen in this process, whenever a worker is free,
+    the biggest pending unit is started, large units only while less than
+    max_large of them are running, otherwise the biggest small unit
+
+    every unit gets a fresh process, so memory of big tables is given back,
+    a worker process which exits without result is reported as error
+
+    parameters:
+    basedir <str> basedirectory of datalogger data
+    units <list> of (project, tablename, datestring, raw_size), biggest first
+    jobs <int> number of worker processes
+    max_large <int> maximum number of large units running at the same time
+    large_size <int> units with raw_size of at least large_size are large
+    force <bool> delete existing caches and rebuild
+
+    returns:
+    <generator> of <dict> results of build_unit
+    """
+    pending_large = [unit for unit in units if unit[3] >= large_size]
+    pending_small = [unit for unit in units if unit[3] < large_size]
+    running = {} # receiving connection : (process, unit name, large)
+    counts = {"large" : 0}
+
+    def start(unit, large):
+        """start unit in new worker process"""
+        project, tablename, datestring, _ = unit
+        name = "%s/%s/%s" % (datestring, project, tablename)
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=run_unit, args=(sender, (basedir, project, tablename, datestring, force)), name=name)
+        process.start()
+        sender.close() # only the worker writes, EOF if the worker dies
+        running[receiver] = (process, name, large)
+        if large:
+            counts["large"] += 1
+
+    def finish(receiver):
+        """return result of finished unit, or error if the worker died"""
+        process, name, large = running.pop(receiver)
+        if large:
+            counts["large"] -= 1
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+        receiver.close()
+        process.join()
+        if result is None:
+            if process.exitcode < 0:
+                message = "worker process killed by signal %d" % -process.exitcode
+            else:
+                message = "worker process exited with code %d" % process.exitcode
+            result = {"unit" : name, "status" : "error", "message" : message, "timings" : {}, "duration" : 0.0}
+        return result
+
+    try:
+        while pending_large or pending_small or running:
+            while len(running) < jobs:
+                if pending_large and counts["large"] < max_large:
+                    start(pending_large.pop(0), True)
+                elif pending_small:
+                    start(pending_small.pop(0), False)
+                else:
+                    break
+            for receiver in multiprocessing.connection.wait(list(running.keys())):
+                yield finish(receiver)
+    finally:
+        for receiver, (process, _, _) in list(running.items()):
+            process.terminate()
+            process.join()
+            receiver.close()
+
+def build_rollups(basedir, project, tablename, datestrings):
+    """
+    update weekly, monthly and yearly rollups of one project/tablename
+    containing datestrings, never raises
+
+    returns:
+    <bool> True if successful
+    """
+    try:
+        datalogger = DataLogger(basedir)
+        datalogger.setup(project, tablename, datestrings[0])
+        written = datalogger.update_rollups(datestrings)
+        logging.info("%s/%s rollups written: %s", project, tablename, ", ".join(written))
+        return True
+    except Exception as exc:
+        logging.exception(exc)
+        logging.error("%s/%s building rollups failed", project, tablename)
+        return False
+
+def report(result):
+    """log one line for every finished unit"""
+    timings = ", ".join(("%s %0.2fs" % (step, result["timings"][step]) for step in STEPS if step in result["timings"]))
+    if result["status"] == "error":
+        logging.error("%-60s %-7s %8.2fs %s %s", result["unit"], result["status"], result["duration"], timings, result["message"])
+    else:
+        logging.info("%-60s %-7s %8.2fs %s %s", result["unit"], result["status"], result["duration"], timings, result["message"])
+
+def main(args, startdate):
+    """
+    build caches of all units from startdate to args.enddate
+
+    parameters:
+    args <argparse.Namespace> parsed command line arguments
+    startdate <str> first date in isoformat YYYY-MM-DD
+    """
+    units = get_units(args.basedir, startdate, args.enddate, args.project, args.tablename)
+    logging.info("%d units to build with %d jobs", len(units), args.jobs)
+    starttime = time.time()
+    results = []
+    if args.jobs == 1:
+        for project, tablename, datestring, _ in units:
+            results.append(build_unit((args.basedir, project, tablename, datestring, args.force)))
+            report(results[-1])
+    else:
+        for result in build_parallel(args.basedir, units, args.jobs, args.max_large, args.large_size, args.force):
+            results.append(result)
+            report(result)
+    if args.rollups:
+        # rollups are built from finished daily caches, one table after another
+        tables = {}
+        for result in results:
+            if result["status"] in ("ok", "missing"):
+                datestring, project, tablename = result["unit"].split("/")
+                tables.setdefault((project, tablename), []).append(datestring)
+        for (project, tablename), datestrings in sorted(tables.items()):
+            if not build_rollups(args.basedir, project, tablename, sorted(datestrings)):
+                results.append({"unit" : "rollup/%s/%s" % (project, tablename), "status" : "error", "duration" : 0.0})
+    duration = time.time() - starttime
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    logging.info("finished %d units in %0.2fs, %s", len(results), duration, ", ".join(("%s: %d" % item for item in sorted(counts.items()))))
+    for result in sorted(results, key=lambda result: result["duration"], reverse=True)[:5]:
+        logging.info("slowest: %-60s %8.2fs", result["unit"], result["duration"])
+    if counts.get("error", 0) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    yesterday_datestring = (datetime.date.today() - datetime.timedelta(1)).isoformat()
+    parser = argparse.ArgumentParser(description='build DataLogger caches in parallel')
+    parser.add_argument('--basedir', default="/var/rrd", help="basedirectory of datalogger data on local machine, default : %(default)s")
+    parser.add_argument("-b", '--back', help="how many days back from now")
+    parser.add_argument("-s", '--startdate', help="start date in isoformat YYYY-MM-DD")
+    parser.add_argument("-e", '--enddate', default=yesterday_datestring, help="stop date in isoformat YYYY-MM-DD, default : %(default)s")
+    parser.add_argument("-p", '--project', help="process only this project name")
+    parser.add_argument("-t", '--tablename', help="process only this tablename")
+    parser.add_argument("-j", '--jobs', type=int, default=multiprocessing.cpu_count(), help="number of worker processes, default : %(default)s")
+    parser.add_argument('--max-large', type=int, default=1, help="maximum number of large tables processed at the same time, default : %(default)s")
+    parser.add_argument('--large-size', type=int, default=100 * 1024 * 1024, help="raw input files bigger than this number of bytes are large, default : %(default)s")
+    parser.add_argument("-f", '--force', action='store_true', help="delete existing caches and rebuild")
+    parser.add_argument("-r", '--rollups', action='store_true', help="update weekly, monthly and yearly rollups of processed days afterwards")
+    parser.add_argument("-q", '--quiet', action='store_true', help="set to loglevel ERROR")
+    parser.add_argument("-v", '--verbose', action='store_true', help="set to loglevel DEBUG")
+    args = parser.parse_args()
+    if args.quiet is True:
+        logging.getLogger("").setLevel(logging.ERROR)
+    if args.verbose is True:
+        logging.getLogger("").setLevel(logging.DEBUG)
+    if (args.back is not None) == (args.startdate is not None):
+        logging.error("you have to provide either -b or -s")
+        sys.exit(1)
+    if args.jobs < 1 or args.max_large < 1:
+        logging.error("--jobs and --max-large must be at least 1")
+        sys.exit(1)
+    if args.back is not None:
+        startdate = (datetime.date.today() - datetime.timedelta(int(args.back))).isoformat()
+    else:
+        startdate = args.startdate
+    main(args, startdate)
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""
+convert stored TimeseriesArray caches between the one file per key layout
+(ts_<key>.csv.gz) and the single file TimeseriesArrayContainer layout (tsa_<index_keys>.tsc),
+compressed or uncompressed to be memory mapped
+
+every directory below the given paths containing a tsa_*.json manifest is converted
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+logging.basicConfig(level=logging.INFO)
+# own modules
+from datalogger import TimeseriesArray as TimeseriesArray
+from datalogger import TimeseriesArrayContainer as TimeseriesArrayContainer
+
+def find_manifests(paths):
+    """yield every tsa_*.json filename below paths"""
+    for path in paths:
+        for dirpath, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.startswith("tsa_") and filename.endswith(".json"):
+                    yield os.path.join(dirpath, filename)
+
+def convert(manifest, to_csv=False, compress=True, delete=False, dry_run=False):
+    """
+    convert one stored TimeseriesArray, the stored data is not converted
+    to datatypes, so the content stays the same
+
+    parameters:
+    manifest <str> full path to tsa_*.json
+    to_csv <bool> convert container to csv files, instead of csv files to container
+    compress <bool> write compressed container, existing containers are rewritten if different
+    delete <bool> delete files of old layout after successful conversion
+    dry_run <bool> only report what would be done
+
+    returns:
+    <bool> True if something was converted
+    """
+    path = os.path.dirname(manifest)
+    with open(manifest, "rt") as infile:
+        data = json.load(infile)
+    if "container" in data:
+        old_files = [os.path.join(path, data["container"])]
+        with TimeseriesArrayContainer(old_files[0]) as container:
+            old_compress = container.compress
+        if not to_csv and old_compress == compress:
+            logging.debug("%s is already converted", manifest)
+            return False
+    elif to_csv:
+        logging.debug("%s is already converted", manifest)
+        return False
+    else:
+        old_files = [os.path.join(path, filename) for filename in data["ts_filenames"]]
+    index_keys = tuple(data["index_keys"])
+    logging.info("converting %s with %d files", manifest, len(old_files))
+    if dry_run:
+        return True
+    with TimeseriesArray.load(path, index_keys, datatypes={}) as tsa:
+        tsa.dump(path, overwrite=True, container=not to_csv, compress=compress)
+        # verify before deleting anything
+        with TimeseriesArray.load(path, index_keys, datatypes={}) as converted:
+            if list(converted.keys()) != list(tsa.keys()) or any((converted[key].data != tsa[key].data for key in tsa.keys())):
+                raise AssertionError("verification of converted %s failed" % manifest)
+    if delete and "container" in data and not to_csv:
+        logging.debug("container %s was rewritten in place", old_files[0])
+    elif delete:
+        for filename in old_files:
+            logging.debug("deleting %s", filename)
+            os.unlink(filename)
+    return True
+
+def main():
+    converted = 0
+    failed = 0
+    for manifest in find_manifests(args.path):
+        try:
+            if convert(manifest, args.to_csv, not args.no_compress, args.delete, args.dry_run):
+                converted += 1
+        except Exception as exc:
+            logging.exception(exc)
+            logging.error("conversion of %s failed", manifest)
+            failed += 1
+    logging.info("converted %d TimeseriesArrays, %d failed", converted, failed)
+    if failed > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='convert TimeseriesArray caches to or from single file container')
+    parser.add_argument('path', nargs="+", help="cache directories to search for tsa_*.json, like /var/rrd/global_cache")
+    parser.add_argument('--to-csv', action='store_true', help="convert containers back to one csv file per key")
+    parser.add_argument('--no-compress', action='store_true', help="write uncompressed containers, which are memory mapped on load")
+    parser.add_argument('--delete', action='store_true', help="delete files of the old layout after successful conversion")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="only show what would be converted")
+    parser.add_argument("-q", '--quiet', action='store_true', help="set to loglevel ERROR")
+    parser.add_argument("-v", '--verbose', action='store_true', help="set to loglevel DEBUG")
+    args = parser.parse_args()
+    if args.quiet is True:
+        logging.getLogger("").setLevel(logging.ERROR)
+    if args.verbose is True:
+        logging.getLogger("").setLevel(logging.DEBUG)
+    main()
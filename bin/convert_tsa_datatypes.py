@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+store existing TimeseriesArray caches converted to datatypes, so loading
+skips the conversion of every Timeseries, like caches built with
+converted_cache set in datalogger.json
+
+every directory below the given paths containing a tsa_*.json manifest is converted,
+the directories have to be in layout <cachedir>/<datestring>/<project>/<tablename>
+to find the datatypes in the table definition of this project
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+logging.basicConfig(level=logging.INFO)
+# own modules
+from datalogger import DataLogger as DataLogger
+from datalogger import TimeseriesArray as TimeseriesArray
+from datalogger import TimeseriesArrayContainer as TimeseriesArrayContainer
+
+def find_manifests(paths):
+    """yield every tsa_*.json filename below paths"""
+    for path in paths:
+        for dirpath, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.startswith("tsa_") and filename.endswith(".json"):
+                    yield os.path.join(dirpath, filename)
+
+def convert(datalogger, manifest, dry_run=False):
+    """
+    convert one stored TimeseriesArray to datatypes, the layout (csv files
+    or container) stays the same
+
+    parameters:
+    datalogger <DataLogger> to get datatypes from table definition
+    manifest <str> full path to tsa_*.json
+    dry_run <bool> only report what would be done
+
+    returns:
+    <bool> True if something was converted
+    """
+    path = os.path.dirname(manifest)
+    path_parts = os.path.abspath(path).split(os.sep)
+    datestring, project, tablename = path_parts[-3:]
+    datalogger.setup(project, tablename, datestring)
+    with open(manifest, "rt") as infile:
+        data = json.load(infile)
+    if data.get("converted") == datalogger.datatypes:
+        logging.debug("%s is already converted", manifest)
+        return False
+    elif "converted" in data:
+        raise AssertionError("%s is stored converted to other datatypes, rebuild this cache from raw data" % manifest)
+    index_keys = tuple(data["index_keys"])
+    container = "container" in data
+    compress = True
+    if container:
+        with TimeseriesArrayContainer(os.path.join(path, data["container"])) as tsa_container:
+            compress = tsa_container.compress
+    logging.info("converting %s of %s/%s/%s", manifest, project, tablename, datestring)
+    if dry_run:
+        return True
+    stat = os.stat(manifest)
+    with TimeseriesArray.load(path, index_keys, datatypes=datalogger.datatypes) as tsa:
+        tsa.cache = True # keep converted Timeseries to verify afterwards
+        tsa.dump(path, overwrite=True, container=container, compress=compress, converted=True)
+        # verify, stored Timeseries are not converted again
+        with TimeseriesArray.load(path, index_keys, datatypes=datalogger.datatypes) as converted:
+            if list(converted.keys()) != list(tsa.keys()) or any((str(converted[key].data) != str(tsa[key].data) for key in tsa.keys())):
+                raise AssertionError("verification of converted %s failed" % manifest)
+    # the content is the same, so dependent caches stay up to date
+    os.utime(manifest, (stat.st_atime, stat.st_mtime))
+    return True
+
+def main():
+    datalogger = DataLogger(args.basedir)
+    converted = 0
+    failed = 0
+    for manifest in find_manifests(args.path):
+        try:
+            if convert(datalogger, manifest, args.dry_run):
+                converted += 1
+        except Exception as exc:
+            logging.exception(exc)
+            logging.error("conversion of %s failed", manifest)
+            failed += 1
+    logging.info("converted %d TimeseriesArrays, %d failed", converted, failed)
+    if failed > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='store TimeseriesArray caches converted to datatypes')
+    parser.add_argument('path', nargs="+", help="cache directories to search for tsa_*.json, like /var/rrd/global_cache/2018-04-01")
+    parser.add_argument('--basedir', default="/var/rrd", help="basedirectory of datalogger data on local machine, default : %(default)s")
+    parser.add_argument('-n', '--dry-run', action='store_true', help="only show what would be converted")
+    parser.add_argument("-q", '--quiet', action='store_true', help="set to loglevel ERROR")
+    parser.add_argument("-v", '--verbose', action='store_true', help="set to loglevel DEBUG")
+    args = parser.parse_args()
+    if args.quiet is True:
+        logging.getLogger("").setLevel(logging.ERROR)
+    if args.verbose is True:
+        logging.getLogger("").setLevel(logging.DEBUG)
+    main()
@@ -12,65 +12,51 @@ import argparse
 from datalogger import DataLogger as DataLogger
 from datalogger import TimeseriesArrayStats as TimeseriesArrayStats
 from datalogger import DataLoggerRawFileMissing as DataLoggerRawFileMissing
+from datalogger import DataLoggerLiveDataError as DataLoggerLiveDataError
+from datalogger import CachePlanner as CachePlanner
 
-def gen_caches(project, tablename, datestring):
-    datalogger = DataLogger(basedir, project, tablename)
-    caches = datalogger.get_caches(datestring)
+def gen_caches(project, tablename, datestring, rebuild=()):
+    """
+    build missing or outdated caches of one project/tablename/datestring
+
+    rebuild <tuple> stages to build even if up to date, see CachePlanner.stages
+    """
     suffix = "%s/%s/%s\t" % (datestring, project, tablename)
-    data = None
-    if caches["tsa"]["raw"] is None:
-        if len(caches["tsa"]["keys"]) == 0:
-            logging.info("%s RAW Data is missing", suffix)
-        else:
-            logging.debug("%s RAW Data is archived, tsa archive exists already", suffix)
-    else:
-        if len(caches["tsa"]["keys"]) == 0:
-            logging.info("%s TSA Archive missing, calling get_tsa and load_tsastats", suffix)
-            data = datalogger.load_tsa(datestring)
-        else:
-            if len(caches["tsastat"]["keys"]) == 0:
-                logging.info("%s TSASTAT Archive missing, calling load_tsastats", suffix)
-                data = datalogger.load_tsastats(datestring)
-            else:
-                if len(caches["ts"]["keys"]) == 0:
-                    logging.info("%s there are no ts archives, something went wrong, or tsa is completely empty, calling load_tsastats", suffix)
-                    data = datalogger.load_tsastats(datestring, cleancache=True)
-                else:
-                    logging.debug("%s All fine", suffix)
-            if caches["quantile"]["exists"] is not True:
-                logging.info("%s Quantile archive is missing, calling load_quantile", suffix)
-                #data = datalogger.load_quantile(datestring)
-    del data
-    del caches
-    del datalogger
-    #print(gc.get_count())
+    datalogger = DataLogger(args.basedir)
+    datalogger.setup(project, tablename, datestring)
+    planner = CachePlanner(datalogger)
+    try:
+        waves = planner.plan(rebuild)
+        if not waves:
+            logging.debug("%s All fine", suffix)
+            return
+        logging.info("%s building %s", suffix, " -> ".join((", ".join(wave) for wave in waves)))
+        planner.run(rebuild)
+    except DataLoggerRawFileMissing:
+        logging.info("%s RAW Data is missing", suffix)
 
 def main():
+    datalogger = DataLogger(args.basedir)
     for datestring in tuple(DataLogger.datewalker(startdate, args.enddate)):
         start_ts, stop_ts = DataLogger.get_ts_for_datestring(datestring)
         logging.debug("working on datestring %s (from %s to %s)", datestring, start_ts, stop_ts)
-        for project in DataLogger.get_projects(args.basedir):
+        for project in datalogger.get_projects():
             if args.project is not None:
                 if project != args.project:
                     logging.debug("skipping project %s", project)
                     continue
             logging.debug("working on project %s", project)
-            for tablename in DataLogger.get_tablenames(args.basedir, project):
+            for tablename in datalogger.get_tablenames(project):
                 if args.tablename is not None:
                     if tablename != args.tablename:
                         logging.debug("skipping tablename %s", tablename)
                         continue
                     logging.debug("working on tablename %s", tablename)
-                if args.object is not None:
-                    if args.object == "tsastats":
-                        datalogger = DataLogger(basedir, project, tablename)
-                        try:
-                            tsa = datalogger.load_tsastats(datestring, cleancache=True)
-                        except DataLoggerRawFileMissing:
-                            pass
-                else:
-                    # normal cache check, not trying to recreate
-                    gen_caches(project, tablename, datestring)
+                try:
+                    # with --object recreate this stage and all depending on it
+                    gen_caches(project, tablename, datestring, (args.object, ) if args.object is not None else ())
+                except DataLoggerLiveDataError:
+                    logging.debug("skipping live data of %s", datestring)
 
 if __name__ == "__main__":
     basedir = "/var/rrd"
@@ -84,7 +70,7 @@ if __name__ == "__main__":
     parser.add_argument("-v", '--verbose', action='store_true', help="set to loglevel DEBUG")
     parser.add_argument("-p", '--project', help="process only this project name")
     parser.add_argument("-t", '--tablename', help="process only this tablename")
-    parser.add_argument("-o", '--object', help="object to recreate")
+    parser.add_argument("-o", '--object', choices=tuple(CachePlanner.stages.keys()), help="object to recreate, with all objects depending on it")
     parser.add_argument("--profile", action="store_true", help="use cProfile to start main")
     args = parser.parse_args()
     if args.quiet is True:
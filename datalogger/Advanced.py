@@ -1,9 +1,13 @@
 #!/usr/bin/python3
 import json
+from operator import add
 # own modules
 from DataLogger import DataLogger as DataLogger
 from TimeseriesArray import TimeseriesArray as TimeseriesArray
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+
+group_aggregations = ("sum", "min", "max", "avg", "count") # builtin aggregations of tsa_aggregate
 
 def tsa_group_by(tsa, datestring, index_keynames, group_func, interval):
     """
@@ -16,11 +20,14 @@ def tsa_group_by(tsa, datestring, index_keynames, group_func, interval):
     datestring <str> datestring to use to aggregate data TODO: get this from tsa
     subkey <tuple> could also be empty, to aggregate everything
     group_func <func> like lambda a, b : (a + b) / 2 to get averages
+        or <str> one of group_aggregations, then tsa_aggregate is used, which is much faster
     interval <int> interval in seconds the timeseries values should appear
 
     returns:
     <TimeseriesArray>
     """
+    if group_func in group_aggregations:
+        return tsa_aggregate(tsa, datestring, index_keynames, interval, aggregations=(group_func, ))
     # intermediated tsa
     tsa2 = TimeseriesArray(index_keynames=index_keynames, value_keynames=tsa.value_keynames, ts_key=tsa.ts_key, datatypes=tsa.datatypes)
     start_ts, _ = DataLogger.get_ts_for_datestring(datestring)
@@ -32,63 +39,147 @@ def tsa_group_by(tsa, datestring, index_keynames, group_func, interval):
         tsa2.add(data, group_func)
     return tsa2
 
+def tsa_aggregate(tsa, datestring, index_keynames, interval, aggregations=("avg", )):
+    """
+    group given tsa by subkeys like tsa_group_by, but aggregate whole columns
+    of every Timeseries at once with builtin aggregations, without exporting rows
+
+    timestamps are aligned to interval starting at datestring, all values of
+    one group in the same time slot are aggregated, every aggregation of
+    aggregations is calculated in the same pass
+
+    parameters:
+    tsa <TimeseriesArray>
+    datestring <str> datestring to use to align timestamps
+    index_keynames <tuple> could also be empty, to aggregate everything to key ()
+    interval <int> interval in seconds the timeseries values should appear
+    aggregations <tuple> of <str> names out of group_aggregations,
+        if there is more than one aggregation value_keynames of the result are
+        named <value_keyname>_<aggregation>
+
+    returns:
+    <TimeseriesArray>
+    """
+    for aggregation in aggregations:
+        if aggregation not in group_aggregations:
+            raise KeyError("unknown aggregation %s, use one of %s" % (aggregation, group_aggregations))
+    start_ts, _ = DataLogger.get_ts_for_datestring(datestring)
+    value_keynames = tuple(tsa.value_keynames)
+    positions = [tsa.index_keynames.index(index_keyname) for index_keyname in index_keynames]
+    ncols = len(value_keynames)
+    # only needed aggregations are calculated
+    need_sum = "sum" in aggregations or "avg" in aggregations
+    need_min = "min" in aggregations
+    need_max = "max" in aggregations
+    groups = {} # group key : [slot_ids, counts, sums, mins, maxs, row_ids of known aligned timestamps]
+    for key in tsa.keys():
+        timeseries = tsa[key]
+        newkey = tuple([key[position] for position in positions])
+        if newkey not in groups:
+            groups[newkey] = [{}, [], [[] for _ in range(ncols)], [[] for _ in range(ncols)], [[] for _ in range(ncols)], {}]
+        slot_ids, counts, sums, mins, maxs, known_slots = groups[newkey]
+        # align timestamps and map every row to row of group,
+        # most Timeseries of one group have the same aligned timestamps
+        slots = tuple([float(round(start_ts + round((timestamp - start_ts) / interval) * interval)) for timestamp in timeseries.get_column(timeseries.ts_keyname)])
+        if not slots:
+            continue
+        if slots in known_slots:
+            row_ids, contiguous = known_slots[slots]
+        else:
+            for slot in slots:
+                if slot not in slot_ids:
+                    slot_ids[slot] = len(counts)
+                    counts.append(0)
+                    for colnum in range(ncols):
+                        sums[colnum].append(0.0)
+                        mins[colnum].append(float("inf"))
+                        maxs[colnum].append(float("-inf"))
+            row_ids = list(map(slot_ids.__getitem__, slots))
+            contiguous = row_ids == list(range(row_ids[0], row_ids[0] + len(row_ids)))
+            known_slots[slots] = (row_ids, contiguous)
+        if contiguous:
+            first = row_ids[0]
+            last = first + len(row_ids)
+            # usual case, all keys have the same slots, aggregate whole blocks
+            counts[first:last] = [count + 1 for count in counts[first:last]]
+            for colnum, value_keyname in enumerate(value_keynames):
+                series = timeseries.get_serie(value_keyname)
+                if need_sum:
+                    sums[colnum][first:last] = map(add, sums[colnum][first:last], series)
+                if need_min:
+                    mins[colnum][first:last] = map(min, mins[colnum][first:last], series)
+                if need_max:
+                    maxs[colnum][first:last] = map(max, maxs[colnum][first:last], series)
+        else:
+            for row_id in row_ids:
+                counts[row_id] += 1
+            for colnum, value_keyname in enumerate(value_keynames):
+                col_sums, col_mins, col_maxs = sums[colnum], mins[colnum], maxs[colnum]
+                for row_id, value in zip(row_ids, timeseries.get_serie(value_keyname)):
+                    col_sums[row_id] += value
+                    if value < col_mins[row_id]:
+                        col_mins[row_id] = value
+                    if value > col_maxs[row_id]:
+                        col_maxs[row_id] = value
+    if len(aggregations) == 1:
+        new_value_keynames = value_keynames
+        datatypes = tsa.datatypes
+    else:
+        new_value_keynames = tuple(["%s_%s" % (value_keyname, aggregation) for value_keyname in value_keynames for aggregation in aggregations])
+        datatypes = dict(((value_keyname, "asis") for value_keyname in new_value_keynames))
+    tsa2 = TimeseriesArray(index_keynames=index_keynames, value_keynames=new_value_keynames, ts_key=tsa.ts_key, datatypes=datatypes)
+    for newkey, (slot_ids, counts, sums, mins, maxs, _) in groups.items():
+        if not counts:
+            continue
+        order = [row_id for slot, row_id in sorted(slot_ids.items())]
+        times = sorted(slot_ids.keys())
+        columns = []
+        for colnum in range(ncols):
+            for aggregation in aggregations:
+                if aggregation == "sum":
+                    columns.append([sums[colnum][row_id] for row_id in order])
+                elif aggregation == "min":
+                    columns.append([mins[colnum][row_id] for row_id in order])
+                elif aggregation == "max":
+                    columns.append([maxs[colnum][row_id] for row_id in order])
+                elif aggregation == "avg":
+                    columns.append([sums[colnum][row_id] / counts[row_id] for row_id in order])
+                elif aggregation == "count":
+                    columns.append([float(counts[row_id]) for row_id in order])
+        tsa2.add_columns(newkey, times, columns)
+    return tsa2
+
 def tsastats_group_by(tsastat, index_keynames):
     """
     group given tsastat array by some subkey
 
+    the TimeseriesStats of all keys of one group are merged by their
+    StatsState, so the grouped values are the same as calculated from
+    the joined Timeseries, no matter in which order keys are merged
+
     parameters:
     tsastat <TimeseriesArrayStats>
-    subkey <tuple> subkey to group by
+    subkey <tuple> subkey to group by, empty to aggregate everything to key ("__total__", )
 
     returns:
-    <dict>
+    <TimeseriesArrayStats>
     """
-    # how to aggregate statistical values
-    group_funcs = {
-        u'count' : lambda a, b: a + b,
-        u'std' : lambda a, b: (a + b)/2,
-        u'avg': lambda a, b: (a + b)/2,
-        u'last' : lambda a, b: -1.0, # theres no meaning
-        u'min' : min,
-        u'max' : max,
-        u'sum' : lambda a, b: (a + b) / 2,
-        u'median' : lambda a, b: (a + b)/2,
-        u'mean' : lambda a, b: (a + b)/2,
-        u'diff' : lambda a, b: (a + b)/2,
-        u'dec' : lambda a, b: (a + b)/2,
-        u'inc' : lambda a, b: (a + b)/2,
-        u'first' : lambda a, b: -1.0, # theres no meaning
-    }
-    # create new empty TimeseriesArrayStats Object
-    #tsastats_new = TimeseriesArrayStats.__new__(TimeseriesArrayStats)
-    #tsastats_new.index_keynames = index_keynames # only subkey
-    #tsastats_new.value_keynames = tsastat.value_keynames # same oas original
-    newdata = {}
+    positions = [tsastat.index_keynames.index(index_keyname) for index_keyname in index_keynames]
+    newstates = {}
     for index_key, tsstat in tsastat.items():
-        key_dict = dict(zip(tsastat.index_keynames, index_key))
-        newkey = None
         if len(index_keynames) == 0: # no subkey means total aggregation
             newkey = ("__total__", )
         else:
-            newkey = tuple([key_dict[key] for key in index_keynames])
-        if newkey not in newdata:
-            newdata[newkey] = {}
-        for value_keyname in tsastat.value_keynames:
-            if value_keyname not in newdata[newkey]:
-                newdata[newkey][value_keyname] = dict(tsstat[value_keyname])
-            else:
-                for stat_funcname in tsstat[value_keyname].keys():
-                    existing = float(newdata[newkey][value_keyname][stat_funcname])
-                    to_group = float(tsstat[value_keyname][stat_funcname])
-                    newdata[newkey][value_keyname][stat_funcname] = group_funcs[stat_funcname](existing, to_group)
-
-    tsastats_data = [
-        index_keynames,
-        tsastat.value_keynames,
-        [(key, data) for key, data in newdata.items()]
-    ]
-    tsastats = TimeseriesArrayStats.from_json(json.dumps(tsastats_data))
-    return tsastats
+            newkey = tuple([index_key[position] for position in positions])
+        states = tsstat.state
+        if newkey not in newstates:
+            newstates[newkey] = dict(states)
+        else:
+            group_states = newstates[newkey]
+            for value_keyname in tsastat.value_keynames:
+                group_states[value_keyname] = group_states[value_keyname].merge(states[value_keyname])
+    newstats = dict(((newkey, TimeseriesStats.from_states(states)) for newkey, states in newstates.items()))
+    return TimeseriesArrayStats.from_stats(index_keynames, tsastat.value_keynames, newstats)
 
 def get_scatter_data(tsa, value_keynames, stat_func):
     """
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+functions to write files atomically
+
+files are written to a temporary file in the same directory first and
+renamed to their final name afterwards, so readers in other threads or
+processes never see incomplete files. the name of the temporary file is
+unique for every process and thread, so concurrent writers of the same
+file do not interfere, the last rename wins
+"""
+import os
+import logging
+import threading
+from contextlib import contextmanager
+
+def get_tmpfilename(filename):
+    """
+    return temporary filename to write filename, unique for this process and thread
+
+    parameters:
+    filename <str>
+
+    returns:
+    <str>
+    """
+    return "%s.%d.%d.tmp" % (filename, os.getpid(), threading.get_ident())
+
+@contextmanager
+def atomic_open(filename, mode="wt", opener=open):
+    """
+    open temporary file to write filename, which is renamed to filename
+    if the block is left without exception, otherwise it is deleted
+
+    parameters:
+    filename <str>
+    mode <str> like "wt" or "wb"
+    opener <func> like open or gzip.open
+
+    yields:
+    <file> opened temporary file
+    """
+    tmpfilename = get_tmpfilename(filename)
+    try:
+        with opener(tmpfilename, mode) as outfile:
+            yield outfile
+        os.rename(tmpfilename, filename)
+    except BaseException as exc:
+        # also reached, if the generator using this file is closed
+        if not isinstance(exc, GeneratorExit):
+            logging.exception(exc)
+            logging.error("something went wrong while writing %s", filename)
+        if os.path.isfile(tmpfilename):
+            os.unlink(tmpfilename)
+        raise
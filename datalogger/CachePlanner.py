@@ -0,0 +1,193 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for CachePlanner Class
+
+the cache files of one project/tablename/datestring depend on each other
+
+    raw -> tsa (with ts) -> tsastats (with tsstat) -> quantile
+                                                   -> total_stats
+
+every stage is built from the stages it depends on, a stage has to be
+built if its file is missing, if it is older than the file of one of its
+dependencies or if one of its dependencies has to be built. the raw
+input file is only checked for existence, raw files are compressed
+some time after the day, which must not invalidate all caches.
+
+independent stages, which dependencies are finished, are built at the
+same time in threads, every thread uses its own copy of DataLogger.
+new derived stages are added with CachePlanner.add_stage, they are
+built from existing caches without reading the raw data again.
+"""
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from Quantile import QuantileArray as QuantileArray
+from CustomExceptions import *
+
+
+class CachePlanner(object):
+    """
+    plan and build the minimal set of cache stages of one DataLogger
+    set up to project/tablename/datestring
+    """
+    source = "raw"
+    # stage : (<tuple> depends, <func> datalogger -> filename, <str> name of DataLogger method to build,
+    #   <tuple> prefixes of all other files of this stage), in order of dependency
+    stages = OrderedDict((
+        ("tsa", (("raw", ), lambda datalogger: os.path.join(datalogger.cachedir, TimeseriesArray.get_dumpfilename(datalogger.index_keynames)), "load_tsa", ("tsa_", "ts_"))),
+        ("tsastats", (("tsa", ), lambda datalogger: os.path.join(datalogger.cachedir, TimeseriesArrayStats.get_dumpfilename(datalogger.index_keynames)), "load_tsastats", ("tsastat_", "tsstat_", "tsstate_"))),
+        ("quantile", (("tsa", "tsastats"), lambda datalogger: QuantileArray.get_dumpfilename(datalogger.cachedir), "load_quantile", ())),
+        ("total_stats", (("tsastats", ), lambda datalogger: os.path.join(datalogger.cachedir, "total_stats.json"), "load_total_stats", ())),
+    ))
+
+    def __init__(self, datalogger):
+        """
+        parameters:
+        datalogger <DataLogger> set up to project/tablename/datestring
+        """
+        self.__datalogger = datalogger
+
+    @classmethod
+    def add_stage(cls, name, depends, get_filename, method_name, prefixes=()):
+        """
+        register new derived stage, for all CachePlanner objects
+
+        parameters:
+        name <str> name of stage
+        depends <tuple> of <str> names of existing stages or "raw"
+        get_filename <func> called with DataLogger, returns filename of stage
+        method_name <str> name of DataLogger method, which builds and stores the stage
+        prefixes <tuple> of <str> prefixes of other files in cachedir belonging to this stage
+        """
+        for depend in depends:
+            if depend != cls.source and depend not in cls.stages:
+                raise KeyError("unknown stage %s, define stages in order of dependency" % depend)
+        cls.stages[name] = (tuple(depends), get_filename, method_name, tuple(prefixes))
+
+    def get_status(self):
+        """
+        return state of every stage
+
+        returns:
+        <dict> stage : <dict> with keys filename, exists, mtime
+        """
+        self.__datalogger.wait_dumps() # files of background dumps are not there yet
+        status = {}
+        raw_filename = self.__datalogger.raw_filename
+        status[self.source] = {
+            "filename" : raw_filename,
+            "exists" : raw_filename is not None,
+            "mtime" : None, # only existence counts
+        }
+        for stage, (depends, get_filename, method_name, prefixes) in self.stages.items():
+            filename = get_filename(self.__datalogger)
+            exists = os.path.isfile(filename)
+            status[stage] = {
+                "filename" : filename,
+                "exists" : exists,
+                "mtime" : os.stat(filename).st_mtime if exists else None,
+            }
+        return status
+
+    def plan(self, rebuild=()):
+        """
+        return stages to build, grouped in waves, all stages of one wave
+        are independent of each other and depend only on earlier waves
+
+        parameters:
+        rebuild <tuple> of <str> stages to build even if they are up to date
+
+        returns:
+        <list> of <list> of <str> stages, empty if everything is up to date
+        """
+        status = self.get_status()
+        todo = set()
+        for stage, (depends, get_filename, method_name, prefixes) in self.stages.items():
+            if stage in rebuild or not status[stage]["exists"]:
+                todo.add(stage)
+                continue
+            for depend in depends:
+                if depend in todo:
+                    todo.add(stage)
+                elif status[depend]["mtime"] is not None and status[depend]["mtime"] > status[stage]["mtime"]:
+                    logging.info("%s is older than %s, has to be rebuilt", status[stage]["filename"], status[depend]["filename"])
+                    todo.add(stage)
+        # stages are defined in order of dependency, so one pass is enough
+        level = {}
+        for stage, (depends, get_filename, method_name, prefixes) in self.stages.items():
+            if stage in todo:
+                level[stage] = max([level.get(depend, -1) for depend in depends]) + 1
+        waves = [[] for _ in range(max(level.values()) + 1)] if level else []
+        for stage in self.stages:
+            if stage in level:
+                waves[level[stage]].append(stage)
+        if todo and not status[self.source]["exists"] and any((self.source in self.stages[stage][0] for stage in todo)):
+            raise DataLoggerRawFileMissing("raw input file of %s/%s/%s is missing, but needed for %s" % (self.__datalogger.project, self.__datalogger.tablename, self.__datalogger.datestring, ", ".join(sorted(todo))))
+        return waves
+
+    def run(self, rebuild=(), threads=True):
+        """
+        build all stages of plan, stale files are deleted before
+
+        parameters:
+        rebuild <tuple> of <str> stages to build even if they are up to date
+        threads <bool> build independent stages at the same time
+
+        returns:
+        <OrderedDict> of stage : <float> duration in seconds, only built stages
+        """
+        waves = self.plan(rebuild)
+        # delete stale files first, DataLogger would use them otherwise
+        for wave in waves:
+            for stage in wave:
+                self.__delete(stage)
+        timings = OrderedDict()
+        for wave in waves:
+            if threads and len(wave) > 1:
+                errors = []
+                workers = [threading.Thread(target=self.__build, args=(copy.copy(self.__datalogger), stage, timings, errors), name=stage) for stage in wave]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                if errors:
+                    raise errors[0]
+            else:
+                for stage in wave:
+                    self.__build(self.__datalogger, stage, timings)
+        self.__datalogger.wait_dumps()
+        return timings
+
+    def __delete(self, stage):
+        """delete all files of one stage"""
+        cachedir = self.__datalogger.cachedir
+        depends, get_filename, method_name, prefixes = self.stages[stage]
+        filename = get_filename(self.__datalogger)
+        for entry in os.listdir(cachedir):
+            absfile = os.path.join(cachedir, entry)
+            if absfile == filename or any((entry.startswith(prefix) for prefix in prefixes)):
+                logging.debug("deleting stale cache file %s", absfile)
+                os.unlink(absfile)
+
+    def __build(self, datalogger, stage, timings, errors=None):
+        """build one stage, store duration in timings, exceptions in errors if given"""
+        starttime = time.time()
+        try:
+            result = getattr(datalogger, self.stages[stage][2])()
+            if isinstance(result, TimeseriesArray):
+                result.close()
+        except Exception as exc:
+            if errors is None:
+                raise
+            logging.exception(exc)
+            errors.append(exc)
+            return
+        timings[stage] = time.time() - starttime
+        logging.debug("%s/%s/%s stage %s built in %0.2fs", datalogger.project, datalogger.tablename, datalogger.datestring, stage, timings[stage])
@@ -1,7 +1,11 @@
 #!/usr/bin/pypy
 # pylint: disable=line-too-long
+import ast
+import heapq
 import json
 import logging
+from array import array
+from operator import sub, mul
 
 def get_mse(series1, series2):
     """
@@ -62,13 +66,35 @@ def get_mse_sorted_norm(series1, series2):
     return mse
 
 
+def get_mse_sorted_norm_prepared(series1, series2):
+    """
+    same as get_mse_sorted_norm, but both series are already sorted,
+    so the calculation is done without any sort or normalization
+    """
+    max_v = series1[-1]
+    if max_v == 0.0:
+        # difference is equa series2
+        return sum(map(mul, series2, series2))/len(series1)
+    diffs = list(map(sub, series1, series2))
+    return sum(map(mul, diffs, diffs))/(max_v * max_v)/len(series1)
+
+
 class CorrelationMatrixArray(object):
 
-    def __init__(self, tsa):
+    def __init__(self, tsa, topk=None):
+        """
+        calculate CorrelationMatrix for every value_keyname of tsa,
+        every Timeseries is read only once
+
+        parameters:
+        tsa <TimeseriesArray>
+        topk <int> store only topk most similar keys per key, None for full matrix
+        """
         self.__data = {}
-        for value_key in tsa.value_keys:
+        sorted_series = CorrelationMatrix.get_sorted_series(tsa, tsa.value_keynames)
+        for value_key in tsa.value_keynames:
             logging.info("calculating value_key %s", value_key)
-            self.__data[value_key] = CorrelationMatrix(tsa, value_key)
+            self.__data[value_key] = CorrelationMatrix.from_data(CorrelationMatrix.get_correlation_matrix(sorted_series.pop(value_key), topk))
 
     def __eq__(self, other):
         try:
@@ -101,9 +127,37 @@ class CorrelationMatrixArray(object):
 
 
 class CorrelationMatrix(object):
+    """
+    MSE of sorted and normalized series for every pair of keys of one value_key,
+    lower values are more similar
+
+    every series is sorted once, the pairwise MSE are calculated from
+    the sorted series, see get_mse_sorted_norm
+    """
+
+    def __init__(self, tsa, value_key, topk=None):
+        """
+        parameters:
+        tsa <TimeseriesArray>
+        value_key <str>
+        topk <int> store only topk most similar keys per key, None for full matrix
+        """
+        self.__data = self.get_correlation_matrix(self.get_sorted_series(tsa, (value_key, ))[value_key], topk)
+
+    @staticmethod
+    def from_data(data):
+        """
+        create CorrelationMatrix from already calculated data
+
+        parameters:
+        data <dict> key : <dict> otherkey : mse
 
-    def __init__(self, tsa, value_key):
-        self.__data = self.__get_correlation_matrix(tsa, value_key)
+        returns:
+        <CorrelationMatrix>
+        """
+        cm = CorrelationMatrix.__new__(CorrelationMatrix)
+        cm.__data = data
+        return cm
 
     @property
     def data(self):
@@ -119,7 +173,11 @@ class CorrelationMatrix(object):
         return False
 
     def __getitem__(self, key):
-        if isinstance(key, tuple):
+        """
+        key <tuple> index_key : returns <dict> otherkey : mse
+        key <tuple> (index_key, otherkey) : returns <float> mse
+        """
+        if isinstance(key, tuple) and key not in self.__data:
             return self.__data[key[0]][key[1]]
         else:
             return self.__data[key]
@@ -128,35 +186,172 @@ class CorrelationMatrix(object):
         return self.__data.keys()
 
     @staticmethod
-    def __get_correlation_matrix(tsa, value_key):
-        """
-        search for corelating series in all other series available
-        """
-        logging.info("Searching for correlation in value_key %s)", value_key)
-        matrix = {}
-        keylist = tsa.keys()
-        for key in keylist:
-            series = tsa[key][value_key]
-            matrix[key] = {}
-            for otherkey in keylist:
-                try:
-                    matrix[key][otherkey]
-                except KeyError:
-                    if otherkey not in matrix:
-                        matrix[otherkey] = {}
-                    other = tsa[otherkey][value_key]
-                    if len(series) == len(other):
-                        matrix[key][otherkey] = get_mse_sorted_norm(series, other)
-                        matrix[otherkey][key] = matrix[key][otherkey]
-                    else:
-                        logging.info("skipping, dataseries are not of same length")
+    def get_sorted_series(tsa, value_keys):
+        """
+        read every Timeseries of tsa once and sort the series of value_keys,
+        empty Timeseries are skipped
+
+        parameters:
+        tsa <TimeseriesArray>
+        value_keys <tuple> of <str>
+
+        returns:
+        <dict> value_key : <list> of (key, <array> sorted series), in order of tsa.keys()
+        """
+        sorted_series = dict(((value_key, []) for value_key in value_keys))
+        for key in tsa.keys():
+            timeseries = tsa[key]
+            if len(timeseries) == 0:
+                logging.info("skipping %s, empty Timeseries", key)
+                continue
+            for value_key in value_keys:
+                sorted_series[value_key].append((key, array("d", sorted(timeseries.get_column(value_key)))))
+        return sorted_series
+
+    @staticmethod
+    def __get_groups(sorted_series):
+        """
+        only series of the same length are compared,
+        return lists of positions in sorted_series with same length
+        """
+        groups = {}
+        for position, (key, series) in enumerate(sorted_series):
+            groups.setdefault(len(series), []).append(position)
+        if len(groups) > 1:
+            logging.info("dataseries are not of same length, only series of same length %s are compared", sorted(groups.keys()))
+        return groups.values()
+
+    @staticmethod
+    def get_correlation_matrix(sorted_series, topk=None):
+        """
+        search for corelating series in all other series available,
+        every pair is calculated once
+
+        parameters:
+        sorted_series <list> of (key, <array>) from get_sorted_series
+        topk <int> keep only topk most similar otherkeys per key, None for all
+
+        returns:
+        <dict> key : <dict> otherkey : mse
+        """
+        if topk is not None:
+            return dict(CorrelationMatrix.iter_rows(sorted_series, topk))
+        matrix = dict(((key, {}) for key, series in sorted_series))
+        for group in CorrelationMatrix.__get_groups(sorted_series):
+            for offset, position in enumerate(group):
+                key, series = sorted_series[position]
+                row = matrix[key]
+                for otherposition in group[offset:]:
+                    otherkey, other = sorted_series[otherposition]
+                    # the later key of a pair is normalizing, as it always was
+                    row[otherkey] = matrix[otherkey][key] = get_mse_sorted_norm_prepared(other, series)
         return matrix
 
+    @staticmethod
+    def iter_rows(sorted_series, topk=None):
+        """
+        yield one row of the matrix after another, in order of sorted_series,
+        to write huge matrices without holding them in memory
+
+        with topk every pair is calculated once and only the topk candidates
+        of every key are held in a heap. without topk every row is calculated
+        completely, so every pair is calculated twice, but only one row
+        is held in memory
+
+        parameters:
+        sorted_series <list> of (key, <array>) from get_sorted_series
+        topk <int> yield only topk most similar otherkeys per key, the key itself is excluded
+
+        returns:
+        <generator> of (key, <dict> otherkey : mse)
+        """
+        group_of = {}
+        for group in CorrelationMatrix.__get_groups(sorted_series):
+            for position in group:
+                group_of[position] = group
+        if topk is None:
+            for position, (key, series) in enumerate(sorted_series):
+                row = {}
+                for otherposition in group_of[position]:
+                    otherkey, other = sorted_series[otherposition]
+                    # the later key of a pair is normalizing, like in get_correlation_matrix
+                    if otherposition > position:
+                        row[otherkey] = get_mse_sorted_norm_prepared(other, series)
+                    else:
+                        row[otherkey] = get_mse_sorted_norm_prepared(series, other)
+                yield key, row
+            return
+        heaps = [[] for _ in sorted_series] # (-mse, otherposition), largest mse on top
+        for position, (key, series) in enumerate(sorted_series):
+            for otherposition in group_of[position]:
+                if otherposition <= position:
+                    continue
+                other = sorted_series[otherposition][1]
+                mse = get_mse_sorted_norm_prepared(other, series)
+                for heap, candidate in ((heaps[position], otherposition), (heaps[otherposition], position)):
+                    if len(heap) < topk:
+                        heapq.heappush(heap, (-mse, candidate))
+                    elif -heap[0][0] > mse:
+                        heapq.heapreplace(heap, (-mse, candidate))
+            # all pairs with this key are calculated now
+            heap = heaps[position]
+            heaps[position] = None
+            yield key, dict(((sorted_series[candidate][0], -negmse) for negmse, candidate in sorted(heap, reverse=True)))
+
+    @staticmethod
+    def dump_rows(rows, filehandle, chunksize=256):
+        """
+        write rows from iter_rows to filehandle, one json encoded row per line,
+        filehandle is flushed after every chunksize rows
+
+        parameters:
+        rows <iterable> of (key, <dict> otherkey : mse)
+        filehandle <file>
+        chunksize <int>
+
+        returns:
+        <int> number of rows written
+        """
+        count = 0
+        for key, row in rows:
+            filehandle.write(json.dumps((key, list(row.items()))))
+            filehandle.write("\n")
+            count += 1
+            if count % chunksize == 0:
+                filehandle.flush()
+        filehandle.flush()
+        return count
+
+    @staticmethod
+    def load_rows(filehandle):
+        """
+        read rows written by dump_rows one after another
+
+        parameters:
+        filehandle <file>
+
+        returns:
+        <generator> of (key, <dict> otherkey : mse)
+        """
+        for line in filehandle:
+            key, items = json.loads(line)
+            yield tuple(key), dict(((tuple(otherkey), mse) for otherkey, mse in items))
+
+    @staticmethod
+    def stream(tsa, value_key, filehandle, topk=None, chunksize=256):
+        """
+        calculate the matrix of value_key row by row and write it to filehandle,
+        see iter_rows and dump_rows
+
+        returns:
+        <int> number of rows written
+        """
+        sorted_series = CorrelationMatrix.get_sorted_series(tsa, (value_key, ))[value_key]
+        return CorrelationMatrix.dump_rows(CorrelationMatrix.iter_rows(sorted_series, topk), filehandle, chunksize)
+
     def dumps(self):
         return json.dumps(str(self.__data))
 
     @staticmethod
     def loads(data):
-        cm = CorrelationMatrix.__new__(CorrelationMatrix)
-        cm.__data = eval(json.loads(data))
-        return cm
+        return CorrelationMatrix.from_data(ast.literal_eval(json.loads(data)))
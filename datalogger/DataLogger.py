@@ -5,20 +5,35 @@ Module to handle global DataLogger things, like reading from raw data,
 dumping cache files, and so on
 """
 import os
+import re
+import copy
 import glob
 import json
+import hashlib
 import logging
 import datetime
 import calendar
 import time
 import gzip
-import base64
 import pwd
+import threading
+from array import array
+from operator import itemgetter, lt
+from itertools import islice
 # own modules
 from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayContainer import TimeseriesArrayContainer as TimeseriesArrayContainer
+from KeyIndex import KeyIndex as KeyIndex
+from LRUCache import LRUCache as LRUCache
+from ResponseCache import ResponseCache as ResponseCache
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesArrayStats import b64decode_key as b64decode_key
+from TimeseriesArrayStatsContainer import TimeseriesArrayStatsContainer as TimeseriesArrayStatsContainer
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from TimeseriesStats import StatsState as StatsState
 from Quantile import QuantileArray as QuantileArray
+from Rollup import Rollup as Rollup
+from SpillBuilder import SpillBuilder as SpillBuilder
 from CustomExceptions import *
 
 class DataLogger(object):
@@ -29,6 +44,12 @@ class DataLogger(object):
 
     most of the time the pre-calculation will be done with the first call for this kind of data
     """
+    raw_chunksize = 4 * 1024 * 1024 # bytes of raw input to parse at once
+    __ts_caches = {} # (max_entries, max_bytes) : LRUCache, shared by all objects of this process
+    __response_caches = {} # (directory, maxsize) : ResponseCache, shared by all objects of this process
+    __dumps = {} # cachefilename : Event, builds and background dumps running in this process
+    __dumps_lock = threading.Lock()
+    __datestring_re = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 
     def __init__(self, basedir, configfilename="datalogger.json"):
         """
@@ -61,6 +82,7 @@ class DataLogger(object):
         self.__tablename = None
         self.__timedelta = None
         self.__meta = None
+        self.__raw_counts = None
 
     def setup(self, project, tablename, datestring, timedelta=0.0):
         """
@@ -193,6 +215,24 @@ class DataLogger(object):
         """subdirectory under wich to find raw inout files"""
         return self.__meta["raw_basedir"]
 
+    @property
+    def raw_filename(self):
+        """filename of raw input file, or None if there is none (archived or missing)"""
+        try:
+            return self.__get_raw_filename()
+        except DataLoggerRawFileMissing:
+            return None
+
+    @property
+    def raw_counts(self):
+        """
+        counts of the last read of raw input, or None if not read yet
+
+        returns:
+        <dict> with keys rows (stored), reordered (rows older than a row before), duplicates (skipped rows)
+        """
+        return self.__raw_counts
+
     @property
     def global_cachedir(self):
         """subdirectory where to put caches"""
@@ -213,6 +253,165 @@ class DataLogger(object):
         """return OS group to use for file permissions, defined in datalogger.json"""
         return self.__config["group"]
 
+    @property
+    def columnar(self):
+        """
+        return True if Timeseries should be held in array backed columnar format,
+        optional key columnar in datalogger.json, defaults to False
+        """
+        return self.__config.get("columnar", False)
+
+    @property
+    def container(self):
+        """
+        return True if TimeseriesArray and TimeseriesArrayStats caches should be stored in one single container file,
+        optional key container in datalogger.json, defaults to False
+        """
+        return self.__config.get("container", False)
+
+    @property
+    def container_compress(self):
+        """
+        return False if container files should be stored uncompressed and memory mapped,
+        optional key container_compress in datalogger.json, defaults to True
+        """
+        return self.__config.get("container_compress", True)
+
+    @property
+    def converted_cache(self):
+        """
+        return True if Timeseries should be stored converted to datatypes, so loading skips conversion,
+        optional key converted_cache in datalogger.json, defaults to False
+        """
+        return self.__config.get("converted_cache", False)
+
+    @property
+    def memory_budget(self):
+        """
+        return bytes of memory to use to build caches, bigger raw input files are built out of core with SpillBuilder,
+        optional key memory_budget in datalogger.json, defaults to None, everything is built in memory
+        """
+        return self.__config.get("memory_budget", None)
+
+    @property
+    def spilldir(self):
+        """
+        return directory for temporary partition files of SpillBuilder,
+        optional key spilldir in datalogger.json relative to basedir, defaults to subdirectory spill of cachedir
+        """
+        if "spilldir" in self.__config:
+            return os.path.join(self.__basedir, self.__config["spilldir"])
+        return os.path.join(self.__config["cachedir"], "spill")
+
+    @property
+    def quantile_bins(self):
+        """
+        return number of quantiles calculated in QuantileArray,
+        optional key quantile_bins in datalogger.json, defaults to 5
+        """
+        return self.__config.get("quantile_bins", 5)
+
+    @property
+    def ts_cache(self):
+        """
+        return LRUCache for Timeseries loaded by load_tsa, shared by all DataLogger
+        objects of this process with the same budget, or None if not configured
+
+        optional key ts_cache in datalogger.json, like {"max_bytes" : 1073741824}
+        or {"max_entries" : 10000}
+        """
+        if "ts_cache" not in self.__config:
+            return None
+        budget = (self.__config["ts_cache"].get("max_entries"), self.__config["ts_cache"].get("max_bytes"))
+        if budget not in DataLogger.__ts_caches:
+            DataLogger.__ts_caches[budget] = LRUCache(*budget)
+        return DataLogger.__ts_caches[budget]
+
+    @property
+    def response_cache(self):
+        """
+        return ResponseCache for serialized web responses, stored in subdirectory
+        response of global cachedir, so all processes share the same entries
+
+        optional key response_cache_size in datalogger.json, maximum size in bytes,
+        defaults to 256 MiB
+        """
+        budget = (os.path.join(self.__config["cachedir"], "response"), self.__config.get("response_cache_size", 256 * 1024 * 1024))
+        if budget not in DataLogger.__response_caches:
+            DataLogger.__response_caches[budget] = ResponseCache(*budget)
+        return DataLogger.__response_caches[budget]
+
+    @property
+    def cache_generation(self):
+        """
+        return stamp of stored caches of actual project/tablename/datestring,
+        the stamp changes whenever cache files are created or deleted,
+        the cache directory is not created, if there is none the stamp is 0
+
+        returns:
+        <str>
+        """
+        return self.__get_dir_stamp(os.path.join(self.__config["cachedir"], self.datestring, self.project, self.tablename))
+
+    @staticmethod
+    def __get_dir_stamp(path):
+        """modification time of directory in nanoseconds as string, 0 if there is none"""
+        try:
+            stat = os.stat(path)
+        except OSError: # no caches yet
+            return "0"
+        return "%d" % stat.st_mtime_ns
+
+    def get_range_generation(self, datestring_start, datestring_stop):
+        """
+        return stamp of stored caches of every day from datestring_start to
+        datestring_stop and of the rollups of actual project/tablename,
+        the stamp changes whenever one of them changes
+
+        parameters:
+        datestring_start <str>
+        datestring_stop <str>
+
+        returns:
+        <str>
+        """
+        date = datetime.datetime.strptime(datestring_start, "%Y-%m-%d").date()
+        stop = datetime.datetime.strptime(datestring_stop, "%Y-%m-%d").date()
+        stamps = []
+        while date <= stop:
+            stamps.append(self.__get_dir_stamp(os.path.join(self.__config["cachedir"], date.isoformat(), self.project, self.tablename)))
+            date += datetime.timedelta(days=1)
+        stamps.append(self.__get_dir_stamp(self.rollupdir))
+        return hashlib.sha1(",".join(stamps).encode("utf-8")).hexdigest()
+
+    def get_generation(self, args, maxage):
+        """
+        return generation stamp of response cache entries for calls
+        with url arguments like <project>/<tablename>/<datestring>/...
+
+        a finished day gets the cache_generation of this day, a range of
+        finished days like <project>/<tablename>/<datestring start>/<datestring stop>/...
+        the get_range_generation of this range, all other calls get a
+        new stamp every maxage seconds
+
+        parameters:
+        args <list> of <str> url arguments without method name
+        maxage <int> seconds
+
+        returns:
+        <str>
+        """
+        datestrings = [arg for arg in args[2:4] if self.__datestring_re.match(arg)]
+        if datestrings and args[2] == datestrings[0] and max(datestrings) < datetime.date.today().isoformat():
+            try:
+                self.setup(args[0], args[1], datestrings[0])
+                if len(datestrings) == 1:
+                    return self.cache_generation
+                return self.get_range_generation(*datestrings)
+            except (AttributeError, KeyError, ValueError, DataLoggerLiveDataError, OSError):
+                pass # no valid project, tablename or datestring, let the called method handle this
+        return "%d" % int(time.time() / maxage)
+
     @property
     def cachedir(self):
         """
@@ -241,6 +440,17 @@ class DataLogger(object):
             logging.error("User %s does not exist on this systemi, default permission will be applied to created directories", username)
         return subdir
 
+    @property
+    def rollupdir(self):
+        """
+        return subdirectory to store rollups of this project/tablename,
+        the directory is not created
+
+        returns:
+        <str> directory path
+        """
+        return os.path.join(self.__config["cachedir"], "rollup", self.project, self.tablename)
+
     @property
     def interval(self):
         """return defined interval of timestamps defined in configuration"""
@@ -275,7 +485,8 @@ class DataLogger(object):
         if isinstance(args[0], tuple):
             kind, subkey = args[0]
             if kind == "tsa":
-                return self.load_tsa()[subkey]
+                with self.load_tsa() as tsa:
+                    return tsa[subkey]
             if kind == "tsastats":
                 return self.load_tsastats()[subkey]
             if kind == "qa":
@@ -378,6 +589,220 @@ class DataLogger(object):
                     logging.exception(exc)
                     logging.error("UnicodeDecodeError in File %s, line %s, on row: %s, skipping", filename, lineno, row)
 
+    def __read_raw_columns(self):
+        """
+        bulk version of __read_raw_dict, used by load_tsa_raw
+
+        like Timeseries.add, rows with an already seen timestamp for the
+        same index_key are skipped
+
+        returns:
+        <dict> index_key : (<list> timestamps, <list> of <list> one column for every value_keyname)
+        """
+        grouped = {} # index_key : (<list> timestamps, <list> of columns)
+        # rows of one index_key are collected as they come and sorted once afterwards
+        for chunk in self.read_raw_chunks():
+            for index_key, (times, columns) in chunk.items():
+                if index_key not in grouped:
+                    grouped[index_key] = (times, columns)
+                    continue
+                key_times, key_columns = grouped[index_key]
+                key_times.extend(times)
+                for key_column, column in zip(key_columns, columns):
+                    key_column.extend(column)
+        self.__raw_counts = {"rows" : 0, "reordered" : 0, "duplicates" : 0}
+        for index_key, (times, columns) in grouped.items():
+            times, columns, reordered, duplicates = self.sort_unique(times, columns)
+            grouped[index_key] = (times, columns)
+            self.__add_raw_counts(index_key, len(times), reordered, duplicates)
+        self.__log_raw_counts()
+        return grouped
+
+    @staticmethod
+    def sort_unique(times, columns):
+        """
+        sort rows of one index_key by timestamp and skip rows with duplicate timestamps,
+        the first one in order of raw input wins. rows already in order are checked
+        in one pass, without looking up every timestamp
+
+        parameters:
+        times <list> or <array> of <float> in order of raw input
+        columns <list> of <list> or <array> of <float> one for every value_keyname
+
+        returns:
+        <tuple> of times, <list> of columns, <int> reordered rows, <int> duplicate rows,
+        times and columns of the same type as given
+        """
+        if all(map(lt, times, islice(times, 1, None))):
+            return times, columns, 0, 0 # strictly increasing, nothing to do
+        order = sorted(range(len(times)), key=times.__getitem__) # stable, first one of equal timestamps wins
+        keep = [False] * len(times)
+        rownums = []
+        last = None
+        for rownum in order:
+            if rownums and times[rownum] == last:
+                continue
+            keep[rownum] = True
+            rownums.append(rownum)
+            last = times[rownum]
+        # stored rows, which came after some row with a newer timestamp
+        reordered = 0
+        newest = None
+        for timestamp, kept in zip(times, keep):
+            if newest is not None and timestamp < newest and kept:
+                reordered += 1
+            if newest is None or timestamp > newest:
+                newest = timestamp
+        def select(values):
+            """kept rows of values, arrays stay arrays"""
+            selected = [values[rownum] for rownum in rownums]
+            return array(values.typecode, selected) if isinstance(values, array) else selected
+        return select(times), [select(column) for column in columns], reordered, len(times) - len(rownums)
+
+    def __add_raw_counts(self, index_key, rows, reordered, duplicates):
+        """add counts of one index_key to raw_counts"""
+        if reordered or duplicates:
+            logging.debug("index_key %s: %d rows reordered, %d duplicate rows skipped", index_key, reordered, duplicates)
+        self.__raw_counts["rows"] += rows
+        self.__raw_counts["reordered"] += reordered
+        self.__raw_counts["duplicates"] += duplicates
+
+    def __log_raw_counts(self):
+        """log summary of raw_counts"""
+        if self.__raw_counts["reordered"] or self.__raw_counts["duplicates"]:
+            logging.info("%s/%s/%s: %d rows, %d reordered, %d duplicate rows skipped", self.project, self.tablename, self.datestring, self.__raw_counts["rows"], self.__raw_counts["reordered"], self.__raw_counts["duplicates"])
+
+    def read_raw_chunks(self, chunksize=None):
+        """
+        read raw input of this day chunk by chunk, memory usage depends only
+        on chunksize and not on the size of the raw input file
+
+        raw input is read in chunks of raw_chunksize bytes, every chunk is split
+        into one flat list of fields, so every column is a slice at a precalculated
+        position. value columns are converted at once and rows are grouped
+        by index_key without building a dict for every row.
+        if a chunk contains some malformed row, this chunk is parsed row by row
+        with the same rules as __read_raw_dict
+
+        rows are neither sorted nor rows with duplicate timestamps skipped, see sort_unique
+
+        parameters:
+        chunksize <int> bytes of raw input to parse at once, defaults to raw_chunksize
+
+        yields:
+        <dict> index_key : (<list> timestamps, <list> of <list> one column for every value_keyname)
+            rows of one chunk in order of raw input
+        """
+        filename = self.__get_raw_filename()
+        logging.debug("reading raw data from file %s", filename)
+        start_ts, stop_ts = self.get_ts_for_datestring(self.__datestring) # get first and last timestamp of this date
+        chunksize = self.raw_chunksize if chunksize is None else chunksize
+        delimiter = self.delimiter
+        timedelta = self.timedelta
+        ts_keyname = self.ts_keyname
+        index_keynames = self.index_keynames
+        value_keynames = self.value_keynames
+        ncols = len(self.headers)
+        ts_pos = self.headers.index(ts_keyname)
+        index_positions = [self.headers.index(key) for key in index_keynames]
+        value_positions = [self.headers.index(key) for key in value_keynames]
+        index_key_cache = {} # joined index values : index_key tuple
+
+        def add_rows(grouped, joined_keys, timestamps, columns):
+            """
+            group one chunk of converted rows by index_key,
+            index values of every row are joined by delimiter to avoid a tuple for every row
+            """
+            if not timestamps:
+                return
+            positions = {}
+            for rownum, joined_key in enumerate(joined_keys):
+                try:
+                    positions[joined_key].append(rownum)
+                except KeyError:
+                    positions[joined_key] = [rownum, ]
+            in_range = start_ts <= min(timestamps) and max(timestamps) <= stop_ts
+            for joined_key, rownums in positions.items():
+                try:
+                    index_key = index_key_cache[joined_key]
+                except KeyError:
+                    index_key = index_key_cache[joined_key] = tuple(joined_key.split(delimiter))
+                if not in_range:
+                    rownums = [rownum for rownum in rownums if start_ts <= timestamps[rownum] <= stop_ts]
+                    if not rownums:
+                        continue
+                if index_key not in grouped:
+                    grouped[index_key] = ([], [[] for _ in value_keynames])
+                key_times, key_columns = grouped[index_key]
+                if len(rownums) == 1:
+                    key_times.append(timestamps[rownums[0]])
+                    for key_column, column in zip(key_columns, columns):
+                        key_column.append(column[rownums[0]])
+                    continue
+                getter = itemgetter(*rownums)
+                key_times.extend(getter(timestamps))
+                for key_column, column in zip(key_columns, columns):
+                    key_column.extend(getter(column))
+
+        def add_rows_slow(grouped, lines):
+            """parse every line on its own, to skip malformed lines like load_tsa_raw_rowwise"""
+            index_keys = []
+            timestamps = []
+            rows = []
+            for row in lines:
+                data = self.__parse_line(row)
+                if not isinstance(data.get(ts_keyname), int):
+                    logging.info("Format Error in row: %s, got %s", row, data)
+                    continue
+                try:
+                    index_key = tuple([data[key] for key in index_keynames])
+                    values = [TimeseriesArray.to_float(data[key]) for key in value_keynames]
+                except (KeyError, ValueError) as exc:
+                    logging.debug("skipping malformed row %s: %s", row, exc)
+                    continue
+                index_keys.append(delimiter.join(index_key))
+                timestamps.append(float(data[ts_keyname]))
+                rows.append(values)
+            add_rows(grouped, index_keys, timestamps, list(zip(*rows)))
+
+        if filename.endswith(".gz"):
+            filehandle = gzip.open(filename, "rt")
+        else:
+            filehandle = open(filename, "rt")
+        with filehandle as infile:
+            next(infile) # skip header line
+            while True:
+                lines = infile.readlines(chunksize)
+                if not lines:
+                    break
+                lines = [line for line in lines if line and line[0] != "#"]
+                grouped = {} # index_key : (<list> timestamps, <list> of columns)
+                # every line ends with newline, so the last field of every
+                # line is the same as with line.split(delimiter)
+                fields = delimiter.join(lines).split(delimiter)
+                try:
+                    # every row must have exactly as much fields as headers
+                    if len(fields) != len(lines) * ncols or not all([field[-1] == "\n" for field in fields[ncols - 1:-1:ncols]]):
+                        raise IndexError("some rows have not %d columns" % ncols)
+                    timestamps = [float(int(float(value) + timedelta)) for value in fields[ts_pos::ncols]]
+                    columns = []
+                    for pos in value_positions:
+                        try:
+                            columns.append(list(map(float, fields[pos::ncols])))
+                        except ValueError:
+                            columns.append(list(map(TimeseriesArray.to_float, fields[pos::ncols])))
+                except (ValueError, IndexError) as exc:
+                    logging.info("malformed rows in chunk of %s, parsing row by row: %s", filename, exc)
+                    add_rows_slow(grouped, lines)
+                    yield grouped
+                    continue
+                if len(index_positions) == 1:
+                    joined_keys = fields[index_positions[0]::ncols]
+                else:
+                    joined_keys = list(map(delimiter.join, zip(*[fields[pos::ncols] for pos in index_positions])))
+                add_rows(grouped, joined_keys, timestamps, columns)
+                yield grouped
+
     def get_projects(self):
         """return available project, defined in datalogger.json"""
         return list(self.__config["projects"].keys())
@@ -398,7 +823,7 @@ class DataLogger(object):
         """delete pre calculates caches"""
         for entry in os.listdir(self.cachedir):
             absfile = os.path.join(self.cachedir, entry)
-            if entry.startswith("tsa_") or entry.startswith("ts_") or entry.startswith("tsastat_") or entry.startswith("tsstat_") or entry.startswith("quantile") or entry.startswith("total_stats"):
+            if entry.startswith("tsa_") or entry.startswith("ts_") or entry.startswith("tsastat_") or entry.startswith("tsstat_") or entry.startswith("tsstate_") or entry.startswith("quantile") or entry.startswith("total_stats"):
                 logging.debug("deleting cached file %s", entry)
                 os.unlink(absfile)
 
@@ -451,12 +876,35 @@ class DataLogger(object):
         except Exception as exc:
             logging.exception(exc)
             raise
+        # keys of ts and tsstat files are stored in tsa and tsastat files,
+        # filenames have only to be decoded for older dumps
+        known_keys = {}
+        for pattern, filenames_key in (("tsa_*.json", "ts_filenames"), ("tsastat_*.json", "tsstat_filenames")):
+            for abs_filename in glob.glob(os.path.join(self.cachedir, pattern)):
+                with open(abs_filename, "rt") as infile:
+                    data = json.load(infile)
+                if "keys" in data:
+                    known_keys.update(zip(data[filenames_key], (tuple(key) for key in data["keys"])))
         for cachetype in ("tsa", "ts", "tsastat", "tsstat"):
             file_pattern = os.path.join(self.cachedir, caches[cachetype]["pattern"])
             for abs_filename in glob.glob(file_pattern):
                 filename = os.path.basename(abs_filename)
-                key = self.__decode_filename(filename)
+                key = known_keys.get(filename)
+                if key is None:
+                    key = self.__decode_filename(filename)
                 caches[cachetype]["keys"][str(key)] = filename
+        # Timeseries stored in container files
+        for abs_filename in glob.glob(os.path.join(self.cachedir, "tsa_*.tsc")):
+            filename = os.path.basename(abs_filename)
+            with TimeseriesArrayContainer(abs_filename) as container:
+                for key in container.keys():
+                    caches["ts"]["keys"][str(key)] = filename
+        # TimeseriesStats stored in container files
+        for abs_filename in glob.glob(os.path.join(self.cachedir, "tsastat_*.tss")):
+            filename = os.path.basename(abs_filename)
+            with TimeseriesArrayStatsContainer(abs_filename) as container:
+                for key in container.keys():
+                    caches["tsstat"]["keys"][str(key)] = filename
         # add quantile part
         caches["quantile"]["exists"] = os.path.isfile(os.path.join(self.cachedir, "quantile.json"))
         # add total_stats part
@@ -481,15 +929,15 @@ class DataLogger(object):
             raise AssertionError("provided value_keynames does not match defined value_keynames")
         cachefilename = os.path.join(self.cachedir, TimeseriesArray.get_dumpfilename(tsa.index_keynames))
         if not os.path.isfile(cachefilename):
-            tsa.dump(self.cachedir)
+            tsa.dump(self.cachedir, container=self.container, compress=self.container_compress, converted=self.converted_cache)
             tsastats = TimeseriesArrayStats(tsa)
-            tsastats.dump(self.cachedir)
-            qantile = QuantileArray(tsa, tsastats)
+            tsastats.dump(self.cachedir, container=self.container)
+            qantile = QuantileArray(tsa, tsastats, bins=self.quantile_bins)
             qantile.dump(self.cachedir)
         else:
             raise Exception("TSA Archive %s exists already in cache" % cachefilename)
 
-    def load_tsa(self, filterkeys=None, index_pattern=None):
+    def load_tsa(self, filterkeys=None, index_pattern=None, matchtype="and", prefix=False):
         """
         caching version to load_tsa_raw
         if never called, get ts from load_tsa_raw, and afterwards dump_tsa
@@ -499,44 +947,66 @@ class DataLogger(object):
         datestring <str>
         filterkeys <tuple> or None default None
         index_pattern <str> or None default None
+        matchtype <str> "and" or "or" to combine filterkeys
+        prefix <bool> values of filterkeys are prefixes
 
         HINT:
         use delete_caches to delete all precalculated files
         use setup to define some sort of timedelta to use
 
         returns
-        <TimeseriesArray> object read from cachefile or from raw data
+        <TimeseriesArray> object read from cachefile or from raw data,
+        using ts_cache if configured
         """
         cachefilename = os.path.join(self.cachedir, TimeseriesArray.get_dumpfilename(self.index_keynames))
-        def fallback():
+        def load():
+            """load stored TimeseriesArray"""
+            logging.debug("loading stored TimeseriesArray object file %s", cachefilename)
+            return self.__load_tsa_cached(filterkeys, index_pattern, matchtype, prefix)
+        def fallback(build):
             """
-            fallback method to use, if reading from cache data is not possible
+            fallback method to use, if reading from cache data is not possible,
+            the raw data is stored in background and converted to datatypes in place,
+            without a converted copy, raw data bigger than memory_budget is built
+            out of core and read afterwards
             """
-            tsa = self.load_tsa_raw()
-            tsa.dump(self.cachedir) # save full data
-            # read the data afterwards to make sure there is no problem,
-            # TODO: is this the fastest way?
-            # corrected 2017-09-21 reread stored data to convert data to correct type
-            # if validate is True:
-            tsa = TimeseriesArray.load(self.cachedir, self.index_keynames, filterkeys=filterkeys, index_pattern=index_pattern, datatypes=self.datatypes)
-            return tsa
-        if not os.path.isfile(cachefilename):
             logging.info("cachefile %s does not exist, fallback read from raw data file", cachefilename)
-            return fallback()
-        logging.debug("loading stored TimeseriesArray object file %s", cachefilename)
-        try:
-            tsa = TimeseriesArray.load(self.cachedir, self.index_keynames, filterkeys=filterkeys, index_pattern=index_pattern, datatypes=self.datatypes)
-            return tsa
-        except IOError:
-            logging.error("IOError while reading from %s, using fallback", cachefilename)
-            os.unlink(cachefilename)
-            return fallback()
-        except EOFError:
-            logging.error("EOFError while reading from %s, using fallback", cachefilename)
-            os.unlink(cachefilename)
-            return fallback()
-
-    def load_tsastats(self, filterkeys=None):
+            if self.memory_budget and SpillBuilder(self).is_needed():
+                counts = SpillBuilder(self).run()
+                self.__end_build(cachefilename, build)
+                self.__raw_counts = dict(((name, counts[name]) for name in ("rows", "reordered", "duplicates")))
+                self.__log_raw_counts()
+                return load()
+            tsa = self.load_tsa_raw()
+            if self.converted_cache:
+                tsa.convert_datatypes() # stored converted, nothing else needs the raw data
+            # existing Timeseries files are left from a broken dump or stored converted to older datatypes
+            self.__dump_background(cachefilename, build, tsa.dump, self.cachedir, overwrite=True, container=self.container, compress=self.container_compress, converted=self.converted_cache) # save full data
+            if not self.converted_cache:
+                build.wait() # stored raw, so convert after the dump has written everything
+                tsa.convert_datatypes()
+            if filterkeys is None and index_pattern is None:
+                return tsa
+            keys = list(tsa.keys())
+            if filterkeys is not None:
+                keys = KeyIndex(self.index_keynames, keys).match(filterkeys, matchtype, prefix)
+            if index_pattern is not None:
+                rex = re.compile(index_pattern)
+                keys = [key for key in keys if rex.match(str(key)) is not None]
+            return tsa.select(keys)
+        # DataFormatError, if stored converted with datatypes changed meanwhile
+        return self.__load_or_build(cachefilename, load, fallback, (IOError, EOFError, DataFormatError))
+
+    def __load_tsa_cached(self, filterkeys, index_pattern, matchtype, prefix):
+        """
+        load stored TimeseriesArray and attach ts_cache if configured
+        """
+        tsa = TimeseriesArray.load(self.cachedir, self.index_keynames, filterkeys=filterkeys, index_pattern=index_pattern, matchtype=matchtype, datatypes=self.datatypes, columnar=self.columnar, prefix=prefix)
+        if self.ts_cache is not None:
+            tsa.cache = self.ts_cache
+        return tsa
+
+    def load_tsastats(self, filterkeys=None, matchtype="and", prefix=False):
         """
         caching version to load_tsa_raw
         if never called, get ts from load_tsa_raw, and afterwards dump_tsa
@@ -544,38 +1014,167 @@ class DataLogger(object):
         use cleancache to remove caches
 
         parameters:
-        datestring <str>
-        timedelta <int>
-        cleancache <bool>
+        filterkeys <dict> or None default None
+        matchtype <str> "and" or "or" to combine filterkeys
+        prefix <bool> values of filterkeys are prefixes
 
         returns
         <TimeseriesArray> object read from cachefile or from raw data
         """
         cachefilename = os.path.join(self.cachedir, TimeseriesArrayStats.get_dumpfilename(self.index_keynames))
-        def fallback():
+        def load():
+            """load stored TimeseriesArrayStats"""
+            logging.debug("loading stored TimeseriesArrayStats object file %s", cachefilename)
+            return TimeseriesArrayStats.load(self.cachedir, self.index_keynames, filterkeys=filterkeys, matchtype=matchtype, prefix=prefix)
+        def fallback(build):
             """
             fallback method to use, if reading from cache data is not possible
             """
-            tsa = self.load_tsa(filterkeys=None) # load full tsa, and generate statistics
-            tsastats = TimeseriesArrayStats(tsa) # generate full Stats
-            tsastats.dump(self.cachedir) # save it for future usage
-            tsastats = TimeseriesArrayStats.load(self.cachedir, self.index_keynames, filterkeys=filterkeys) # read specific
-            return tsastats
-        if not os.path.isfile(cachefilename):
             logging.info("cachefile %s does not exist, fallback read from tsa archive", cachefilename)
-            return fallback()
-        logging.debug("loading stored TimeseriesArray object file %s", cachefilename)
+            with self.load_tsa(filterkeys=None) as tsa: # load full tsa, and generate statistics
+                if os.path.isfile(cachefilename):
+                    # built together with tsa out of core
+                    self.__end_build(cachefilename, build)
+                    return load()
+                tsastats = TimeseriesArrayStats(tsa) # generate full Stats
+            self.__dump_background(cachefilename, build, tsastats.dump, self.cachedir, overwrite=True, container=self.container) # save it for future usage, replacing files of broken dumps
+            if filterkeys is None:
+                return tsastats
+            keys = KeyIndex(self.index_keynames, list(tsastats.keys())).match(filterkeys, matchtype, prefix)
+            return TimeseriesArrayStats.from_stats(self.index_keynames, self.value_keynames, dict(((key, tsastats[key]) for key in keys)))
+        return self.__load_or_build(cachefilename, load, fallback, (IOError, EOFError))
+
+    @staticmethod
+    def __load_or_build(cachefilename, load, build, errors):
+        """
+        return load(), or build(<threading.Event>) if cachefilename does not exist
+        or load raises one of errors, broken files are deleted
+
+        only one thread of this process builds cachefilename at once, the
+        build is registered before reading any data, other threads wait for
+        the build and its background dump and load the stored file afterwards
+
+        parameters:
+        cachefilename <str>
+        load <func> read stored cachefilename
+        build <func> called with the registered build, has to pass it to
+            __dump_background or __end_build
+        errors <tuple> of exceptions raised by load for broken files
+
+        returns:
+        return value of load or build
+        """
+        while True:
+            building = DataLogger.__begin_build(cachefilename)
+            if building is not None:
+                break
+            try:
+                return load()
+            except errors as exc:
+                logging.error("%s while reading from %s, using fallback", exc.__class__.__name__, cachefilename)
+                try:
+                    os.unlink(cachefilename)
+                except OSError: # deleted by another thread meanwhile
+                    pass
         try:
-            tsastats = TimeseriesArrayStats.load(self.cachedir, self.index_keynames, filterkeys=filterkeys)
-            return tsastats
-        except IOError:
-            logging.error("IOError while reading from %s, using fallback", cachefilename)
-            os.unlink(cachefilename)
-            return fallback()
-        except EOFError:
-            logging.error("EOFError while reading from %s, using fallback", cachefilename)
-            os.unlink(cachefilename)
-            return fallback()
+            return build(building)
+        except Exception:
+            DataLogger.__end_build(cachefilename, building)
+            raise
+
+    @staticmethod
+    def __begin_build(cachefilename):
+        """
+        wait for running build or dump of cachefilename in this process and
+        register a new build, if cachefilename does not exist afterwards
+
+        returns:
+        <threading.Event> of the new build, or None if cachefilename exists
+        """
+        while True:
+            with DataLogger.__dumps_lock:
+                building = DataLogger.__dumps.get(cachefilename)
+                if building is None:
+                    if os.path.isfile(cachefilename):
+                        return None
+                    building = DataLogger.__dumps[cachefilename] = threading.Event()
+                    return building
+            building.wait()
+
+    @staticmethod
+    def __end_build(cachefilename, building):
+        """unregister finished build of cachefilename and wake up waiting threads"""
+        with DataLogger.__dumps_lock:
+            if DataLogger.__dumps.get(cachefilename) is building:
+                del DataLogger.__dumps[cachefilename]
+        building.set()
+
+    @staticmethod
+    def __dump_background(cachefilename, building, func, *args, **kwds):
+        """
+        call func(*args, **kwds) in background thread, func has to write cachefilename,
+        the registered build of cachefilename ends, when func is finished
+        """
+        def run():
+            try:
+                func(*args, **kwds)
+            except Exception as exc:
+                logging.exception(exc)
+                logging.error("background dump of %s failed", cachefilename)
+            finally:
+                DataLogger.__end_build(cachefilename, building)
+        threading.Thread(target=run, name="dump %s" % os.path.basename(cachefilename)).start()
+
+    @staticmethod
+    def wait_dumps():
+        """wait for all builds and background dumps of this process to finish"""
+        with DataLogger.__dumps_lock:
+            builds = list(DataLogger.__dumps.values())
+        for building in builds:
+            building.wait()
+
+    def load_grid(self, fill="nan", filterkeys=None, matchtype="and", prefix=False):
+        """
+        return all Timeseries of this day aligned to the configured interval,
+        the grid covers the whole day
+
+        parameters:
+        fill <str> how to fill gaps, one of TimeseriesGrid.fill_policies
+        filterkeys <dict> or None default None
+        matchtype <str> "and" or "or" to combine filterkeys
+        prefix <bool> values of filterkeys are prefixes
+
+        returns:
+        <TimeseriesGrid>
+        """
+        start_ts, stop_ts = self.get_ts_for_datestring(self.__datestring)
+        start_ts = round(start_ts) # full seconds, as the configured interval
+        with self.load_tsa(filterkeys=filterkeys, matchtype=matchtype, prefix=prefix) as tsa:
+            return tsa.align(self.interval, start_ts, stop_ts, fill)
+
+    def get_top_n(self, value_keyname, stat_func_name, n=20, reverse=True):
+        """
+        return the n keys with highest (or lowest) value of stat_func_name on value_keyname,
+        reads only one column of stored TimeseriesArrayStatsContainer if available,
+        otherwise uses load_tsastats
+
+        parameters:
+        value_keyname <str>
+        stat_func_name <str>
+        n <int> number of keys to return
+        reverse <bool> True for highest values, False for lowest values
+
+        returns:
+        <list> of (<tuple> key, <float> value) best first
+        """
+        cachefilename = os.path.join(self.cachedir, TimeseriesArrayStats.get_dumpfilename(self.index_keynames))
+        if os.path.isfile(cachefilename):
+            with open(cachefilename, "rt") as infile:
+                data = json.load(infile)
+            if "container" in data:
+                with TimeseriesArrayStatsContainer(os.path.join(self.cachedir, data["container"])) as container:
+                    return container.top_n(value_keyname, stat_func_name, n, reverse)
+        return self.load_tsastats().top_n(value_keyname, stat_func_name, n, reverse)
 
     def load_quantile(self):
         """
@@ -594,11 +1193,9 @@ class DataLogger(object):
             quantile_array = QuantileArray.load(self.cachedir)
         else:
             logging.info("cachefile %s does not exist, fallback read from tsa archive", cachefilename)
-            tsa = self["tsa"]
-            tsa.cache = True # to enable in memory caching of timeseries
-            # huge performance improvement, from 500s to 70s
             tsastats = self["tsastats"]
-            quantile_array = QuantileArray(tsa, tsastats)
+            with self["tsa"] as tsa: # QuantileArray reads every timeseries only once
+                quantile_array = QuantileArray(tsa, tsastats, bins=self.quantile_bins)
             quantile_array.dump(self.cachedir)
         return quantile_array
 
@@ -660,30 +1257,18 @@ class DataLogger(object):
         filename <str> basename of file, without path
 
         returns:
-        <tuple> decoded key (eval(base64.b64decode(key)))
+        <tuple> decoded key (b64decode_key(key))
         """
         try:
             parts = filename.split(".")[0].split("_")
             key_encoded = "_".join(parts[1:]) # there could be more than 2 parts
             # the first part ist something like tsa_, tsastats_, ts_,
             # tsstats_ and so on.
-            #_, key_and_ending = filename.split("_")
-            #key_encoded = key_and_ending.split(".")[0]
-            key = None
             try:
-                # TODO: there are some problems to decode b64string with
-                # urlsafe_b64decode if unicode,
-                # try to use b64decode instead
-                try:
-                    key = eval(base64.urlsafe_b64decode(str(key_encoded)))
-                except TypeError as exc:
-                    logging.exception(exc)
-                    key = eval(base64.b64decode(key_encoded))
-                assert isinstance(key, tuple)
-                return key
-            except Exception as exc:
+                return b64decode_key(key_encoded)
+            except DataFormatError as exc:
                 logging.exception(exc)
-                raise DataLoggerFilenameDecodeError("filename %s could not be decoded to tuple, result: %s" % (filename, key))
+                raise DataLoggerFilenameDecodeError("filename %s could not be decoded to tuple" % filename)
         except Exception as exc:
             logging.exception(exc)
             raise DataLoggerFilenameDecodeError("Something went wrong while decoding filensme %s" % filename)
@@ -699,8 +1284,31 @@ class DataLogger(object):
         returns:
         <TimeseriesArray> object wich holds all data of this day
         """
-        tsa = TimeseriesArray(self.index_keynames, self.value_keynames, datatypes=self.datatypes)
+        tsa = TimeseriesArray(self.index_keynames, self.value_keynames, datatypes=self.datatypes, columnar=self.columnar)
+        for index_key, (times, columns) in self.__read_raw_columns().items():
+            tsa.add_columns(index_key, times, columns)
+        return tsa
+    read_day = load_tsa_raw
+
+    def load_tsa_raw_rowwise(self):
+        """
+        read data from raw input files row by row and return TimeseriesArray object,
+        slower than load_tsa_raw, kept for comparison
+
+        every row is added on its own by TimeseriesArray.add, which skips
+        duplicate timestamps, Timeseries with rows not in order of time
+        are sorted afterwards
+
+        returns:
+        <TimeseriesArray> object wich holds all data of this day
+        """
+        tsa = TimeseriesArray(self.index_keynames, self.value_keynames, datatypes=self.datatypes, columnar=self.columnar)
+        timestamps = {} # index_key : <set> of stored timestamps
+        newest = {} # index_key : newest stored timestamp
+        counts = {} # index_key : [<int> reordered, <int> duplicates]
         for rowdict in self.__read_raw_dict():
+            index_key = tuple([rowdict.get(key) for key in self.index_keynames])
+            length = len(timestamps.get(index_key, ()))
             try:
                 tsa.add(rowdict)
             except ValueError as exc:
@@ -711,8 +1319,37 @@ class DataLogger(object):
                 logging.exception(exc)
                 logging.error("AssertionError by adding this data to TimeseriesArray: %s", rowdict)
                 raise exc
+            if index_key not in timestamps:
+                if index_key not in tsa.keys():
+                    continue # malformed row, skipped by TimeseriesArray.add
+                timestamps[index_key] = set()
+                counts[index_key] = [0, 0]
+            timeseries = tsa[index_key]
+            if len(timeseries) == length:
+                # not stored, duplicate timestamp or malformed row
+                try:
+                    if float(rowdict[self.ts_keyname]) in timestamps[index_key]:
+                        counts[index_key][1] += 1
+                except (KeyError, ValueError):
+                    pass
+                continue
+            timestamp = timeseries.stop_ts
+            timestamps[index_key].add(timestamp)
+            if timestamp < newest.get(index_key, timestamp):
+                counts[index_key][0] += 1
+            else:
+                newest[index_key] = timestamp
+        self.__raw_counts = {"rows" : 0, "reordered" : 0, "duplicates" : 0}
+        for index_key, (reordered, duplicates) in counts.items():
+            timeseries = tsa[index_key]
+            if reordered:
+                times = timeseries.get_column(timeseries.ts_keyname)
+                rownums = sorted(range(len(times)), key=times.__getitem__)
+                columns = [timeseries.get_column(header) for header in timeseries.headers]
+                tsa[index_key] = timeseries.__class__.from_columns(timeseries.headers, [times[rownum] for rownum in rownums], [[column[rownum] for rownum in rownums] for column in columns], timeseries.ts_keyname)
+            self.__add_raw_counts(index_key, len(timeseries), reordered, duplicates)
+        self.__log_raw_counts()
         return tsa
-    read_day = load_tsa_raw
 
 #    def old_tsa_group_by(self, tsa, subkeys, group_func):
 #        """
@@ -855,34 +1492,276 @@ class DataLogger(object):
         stop = "%04d-%02d-%02d" % (int(year), int(month), lastday)
         return DataLogger.datewalker(start, stop)
 
+    def __get_day(self, datestring):
+        """
+        return copy of this DataLogger set to another datestring
+        of the same project/tablename
+        """
+        if datetime.date.today().isoformat() == datestring:
+            raise DataLoggerLiveDataError("Reading from live data is not allowed")
+        datalogger = copy.copy(self)
+        datalogger.__datestring = datestring
+        return datalogger
+
+    def __has_tsastats(self):
+        """
+        True if TimeseriesArrayStats of actual datestring are stored or
+        could be built from raw input, without creating the cache directory
+        """
+        if self.raw_filename is not None:
+            return True
+        subdir = os.path.join(self.__config["cachedir"], self.datestring, self.project, self.tablename)
+        return os.path.isfile(os.path.join(subdir, TimeseriesArrayStats.get_dumpfilename(self.index_keynames)))
+
+    def __load_rollup(self, periodstring):
+        """
+        return stored Rollup of periodstring, or None if there is none
+        """
+        filename = Rollup.get_dumpfilename(self.rollupdir, periodstring)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            return Rollup(filename)
+        except (IOError, ValueError, KeyError, DataFormatError) as exc:
+            logging.exception(exc)
+            logging.error("rollup file %s is not readable, ignoring it", filename)
+            return None
+
+    def get_rollup_plan(self, datestring_start, datestring_stop, periods=Rollup.periods):
+        """
+        split the range from datestring_start to datestring_stop into
+        the coarsest complete rollups available, and single days for
+        the edges and the periods without complete rollup
+
+        parameters:
+        datestring_start <str>
+        datestring_stop <str>
+        periods <tuple> subset of Rollup.periods to use, coarsest first
+
+        returns:
+        <list> of (<str> period, <str> periodstring, <Rollup>),
+        period is "day", periodstring a datestring and Rollup None for single days,
+        the caller has to close the returned Rollup objects
+        """
+        date = self.datestring_to_date(datestring_start)
+        stop_date = self.datestring_to_date(datestring_stop)
+        plan = []
+        while date <= stop_date:
+            for period in periods:
+                periodstring = Rollup.get_periodstring(period, date.isoformat())
+                first, last = Rollup.get_period_dates(periodstring)
+                if first != date or last > stop_date:
+                    continue
+                rollup = self.__load_rollup(periodstring)
+                if rollup is not None and rollup.complete:
+                    plan.append((period, periodstring, rollup))
+                    date = last + datetime.timedelta(days=1)
+                    break
+                if rollup is not None:
+                    rollup.close()
+            else:
+                plan.append(("day", date.isoformat(), None))
+                date = date + datetime.timedelta(days=1)
+        logging.debug("rollup plan from %s to %s: %s", datestring_start, datestring_stop, [periodstring for period, periodstring, rollup in plan])
+        return plan
+
+    def iter_tsastats_longtime(self, datestring_start, datestring_stop, key):
+        """
+        yield daily statistical values of one index_key for every day
+        with data in range, read from rollups where possible, days without
+        raw data are skipped, live data ends the range
+
+        parameters:
+        datestring_start <str>
+        datestring_stop <str>
+        key <tuple> index_key
+
+        returns:
+        <generator> of (<str> datestring, stats), stats like TimeseriesStats
+        value_keyname : <dict> stat_func_name : value
+        """
+        filterkeys = dict(zip(self.index_keynames, key))
+        plan = self.get_rollup_plan(datestring_start, datestring_stop)
+        try:
+            for period, periodstring, rollup in plan:
+                if rollup is not None:
+                    if key in rollup:
+                        for row in rollup.read(key):
+                            yield row
+                    continue
+                try:
+                    day = self.__get_day(periodstring)
+                    if not day.__has_tsastats():
+                        logging.debug("No Input File for datestring %s found, skipping this date", periodstring)
+                        continue
+                    tsastats = day.load_tsastats(filterkeys)
+                except DataLoggerRawFileMissing as exc:
+                    logging.debug("No Input File for datestring %s found, skipping this date", periodstring)
+                    continue
+                except DataLoggerLiveDataError as exc:
+                    logging.error("Reading from live data is not allowed, skipping this data, and ending loop")
+                    break
+                if key in tsastats.keys():
+                    yield periodstring, tsastats[key]
+        finally:
+            for period, periodstring, rollup in plan:
+                if rollup is not None:
+                    rollup.close()
+
+    def get_tsastats_longtime(self, datestring_start, datestring_stop, key, value_keyname, stat_func_name="avg"):
+        """
+        return daily value of one statistical function of one index_key and value_keyname
+
+        parameters:
+        datestring_start <str>
+        datestring_stop <str>
+        key <tuple> index_key
+        value_keyname <str>
+        stat_func_name <str>
+
+        returns:
+        <list> of [<str> datestring, <float> value]
+        """
+        return [[datestring, stats[value_keyname][stat_func_name]] for datestring, stats in self.iter_tsastats_longtime(datestring_start, datestring_stop, key)]
+
+    def get_tsstats_longtime(self, datestring_start, datestring_stop, key):
+        """
+        return statistical values of one index_key for the whole range,
+        merged from the daily statistics without reading any Timeseries
+
+        days stored without StatsState, like older dumps and rollups, have
+        their state derived from the daily statistical values, so median is
+        only approximated there
+
+        parameters:
+        datestring_start <str>
+        datestring_stop <str>
+        key <tuple> index_key
+
+        returns:
+        <TimeseriesStats> or None if there is no data in range
+        """
+        states = None
+        single_day = None # statistical values of the only day, exact median
+        for datestring, stats in self.iter_tsastats_longtime(datestring_start, datestring_stop, key):
+            start_ts, stop_ts = self.get_ts_for_datestring(datestring)
+            day_states = dict(stats.state) if isinstance(stats, TimeseriesStats) else {}
+            for value_keyname in self.value_keynames:
+                state = day_states.get(value_keyname)
+                if state is None or state.first_ts is None:
+                    # the day is enough to order days
+                    state = StatsState.from_stats(stats[value_keyname], start_ts, stop_ts)
+                day_states[value_keyname] = state
+            if states is None:
+                states = dict(day_states)
+                single_day = stats
+            else:
+                states = dict(((value_keyname, state.merge(day_states[value_keyname])) for value_keyname, state in states.items()))
+                single_day = None
+        if states is None:
+            return None
+        if single_day is not None:
+            tsstats = TimeseriesStats.__new__(TimeseriesStats)
+            tsstats.stats = dict(((value_keyname, dict(single_day[value_keyname])) for value_keyname in self.value_keynames))
+            tsstats.state = states
+            return tsstats
+        return TimeseriesStats.from_states(states)
+
     def get_tsastats_longtime_hc(self, monthstring, key, value_key):
         """
         TODO: do this in webapp, not here, too special
         method to get longtime data from stored TimeseriesArrayStats objects
         and return data usable as higcharts input
         """
-        # datalogger = DataLogger(BASEDIR, project, tablename)
-        filterkeys = dict(zip(self.index_keynames, key))
-        logging.debug("build filterkeys %s", filterkeys)
+        first, last = Rollup.get_period_dates(monthstring)
         ret_data = {}
-        for datestring in self.monthwalker(monthstring):
-            logging.debug("getting tsatstats for %s", monthstring)
-            try:
-                tsastats = self.load_tsastats(filterkeys)
-                for funcname in tsastats[key][value_key].keys():
-                    if funcname in ret_data:
-                        ret_data[funcname].append((datestring, tsastats[key][value_key][funcname]))
-                    else:
-                        ret_data[funcname] = [(datestring, tsastats[key][value_key][funcname]), ]
-            except DataLoggerRawFileMissing as exc:
-                logging.exception(exc)
-                logging.error("No Input File for datestring %s found, skipping this date", datestring)
-            except DataLoggerLiveDataError as exc:
-                logging.exception(exc)
-                logging.error("Reading from live data is not allowed, skipping this data, and ending loop")
-                break
+        for datestring, stats in self.iter_tsastats_longtime(first.isoformat(), last.isoformat(), key):
+            for funcname, value in stats[value_key].items():
+                if funcname in ret_data:
+                    ret_data[funcname].append((datestring, value))
+                else:
+                    ret_data[funcname] = [(datestring, value), ]
         return ret_data
 
+    def update_rollups(self, datestrings=None):
+        """
+        (re)build all rollups of the periods containing datestrings,
+        weeks first, so months and years are built from finer rollups,
+        call this after the daily caches of these days are finished
+
+        parameters:
+        datestrings <list> of <str>, defaults to actual datestring
+
+        returns:
+        <list> of <str> written periodstrings
+        """
+        if datestrings is None:
+            datestrings = [self.datestring, ]
+        written = []
+        for period in reversed(Rollup.periods):
+            for periodstring in sorted(set((Rollup.get_periodstring(period, datestring) for datestring in datestrings))):
+                if self.build_rollup(periodstring):
+                    written.append(periodstring)
+        return written
+
+    def build_rollup(self, periodstring):
+        """
+        build rollup of one period of all finished days, from complete
+        finer rollups and from daily TimeseriesArrayStats of the remaining days
+
+        parameters:
+        periodstring <str> like 2018, 2018-04 or 2018-W13
+
+        returns:
+        <bool> True if the rollup was written, False if no day of this period is finished
+        """
+        first, last = Rollup.get_period_dates(periodstring)
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        if first > yesterday:
+            logging.info("no day of period %s is finished, skipping rollup", periodstring)
+            return False
+        finer = Rollup.periods[Rollup.periods.index(Rollup.get_period(periodstring)) + 1:]
+        plan = self.get_rollup_plan(first.isoformat(), min(last, yesterday).isoformat(), finer)
+        try:
+            sources = [] # Rollup or (datestring, TimeseriesArrayStats)
+            dates = []
+            for period, subperiodstring, rollup in plan:
+                if rollup is not None:
+                    sources.append(rollup)
+                    dates.extend(rollup.dates)
+                    continue
+                day = self.__get_day(subperiodstring)
+                if not day.__has_tsastats():
+                    logging.debug("No Input File for datestring %s found, skipping this date", subperiodstring)
+                    continue
+                try:
+                    sources.append((subperiodstring, day.load_tsastats()))
+                    dates.append(subperiodstring)
+                except DataLoggerRawFileMissing as exc:
+                    logging.debug("No Input File for datestring %s found, skipping this date", subperiodstring)
+            keys = set()
+            for source in sources:
+                keys.update(source.keys() if isinstance(source, Rollup) else source[1].keys())
+            def items():
+                """all rows of every key in order of date"""
+                for key in sorted(keys):
+                    rows = []
+                    for source in sources:
+                        if isinstance(source, Rollup):
+                            if key in source:
+                                rows.extend(source.read(key))
+                        elif key in source[1].keys():
+                            rows.append((source[0], source[1][key]))
+                    yield key, rows
+            if not os.path.isdir(self.rollupdir):
+                os.makedirs(self.rollupdir)
+            Rollup.write(Rollup.get_dumpfilename(self.rollupdir, periodstring), periodstring, self.index_keynames, self.value_keynames, self.meta["stat_func_names"], items(), dates, last <= yesterday)
+        finally:
+            for period, subperiodstring, rollup in plan:
+                if rollup is not None:
+                    rollup.close()
+        return True
+
     @staticmethod
     def get_ts_for_datestring(datestring):
         """
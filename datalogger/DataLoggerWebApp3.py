@@ -5,13 +5,19 @@ import logging
 logging.basicConfig(level=logging.ERROR)
 import json
 import gzip
-import base64
+import types
 import web
 # own modules
 import tk_web
 from CustomExceptions import *
 from DataLogger import DataLogger as DataLogger
+from ResponseCache import ResponseCache as ResponseCache
+import Streaming
+import Downsampling
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from TimeseriesArrayStats import b64decode_key as b64decode_key
+
+MAXAGE = 300 # seconds, to cache responses which could change
 
 urls = (
     "/oauth2/v1/", "tk_web.IdpConnector",
@@ -59,11 +65,12 @@ class DataLoggerWebApp3(object):
         /tsa/<projectname>/<tablename>/<datestring> -> get TimeseriesArray of this datestring
         /ts/<projectname>/<tablename>/<datestring>/<index_key base64 encoded> -> get Timeseries for this index_key
         /ts/<projectname>/<tablename>/<datestring>/<index_key base64 encoded>/<value_keyname> -> get only this series of Timeseries
+        /ts/<projectname>/<tablename>/<datestring>/<index_key base64 encoded>?points=<int>&downsample=<lttb|minmax> -> get series reduced for graphing
         /quantile/<projectname>/<tablename>/<datestring> -> get QuantileArray of this datestring
         /tsastat/<projectname>/<tablename>/<datestring> -> get TimeseriesArrayStats of this datestring
         /tsstat/<projectname>/<tablename>/<datestring>/<index_key base64 encoded> -> get TimeseriesStats for this index_key
+        /lt_ts/<projectname>/<tablename>/<datestring start>/<datestring stop>/<index_key base64 encoded>/<value_keyname>/<stat_func_name> -> get daily statistical value of this range
         """
-        web.header("Content-Type", "application/json")
         self.logger.info("calling %s", parameters)
         web.header('Access-Control-Allow-Origin', '*')
         web.header('Access-Control-Allow-Credentials', 'true')
@@ -71,13 +78,64 @@ class DataLoggerWebApp3(object):
         # build method name from url
         method = "get_%s" % args[0].lower()
         query = dict(web.input()) # get query as dict
+        web.header("Content-Type", "text/csv" if query.get("format") == "csv" else "application/json")
         try:
             # calling method, or AttributeError if not found
-            return getattr(self, method)(*args[1:], **query)
+            func = getattr(self, method)
+            # responses are shared by all processes, the key changes if
+            # the underlying caches change, or after MAXAGE seconds
+            response_cache = self.__dl.response_cache
+            key = response_cache.get_key(method, args[1:] + sorted(query.items()), self.__get_generation(args[1:]))
+            entry = response_cache.get_stream(key, Streaming.CHUNKSIZE)
+            if entry is None:
+                data = func(*args[1:], **query)
+                if isinstance(data, types.GeneratorType):
+                    # streamed response, stored in cache while sending,
+                    # etag is known only afterwards
+                    etag = last_modified = None
+                    data = response_cache.put_stream(key, data)
+                else:
+                    if not isinstance(data, str):
+                        data = json.dumps(data)
+                    etag, last_modified = response_cache.put(key, data)
+            else:
+                etag, last_modified, data = entry
+            if etag is not None:
+                web.header("ETag", etag)
+                web.header("Last-Modified", last_modified)
+                if ResponseCache.is_not_modified(etag, last_modified, web.ctx.env.get("HTTP_IF_NONE_MATCH"), web.ctx.env.get("HTTP_IF_MODIFIED_SINCE")):
+                    web.ctx.status = "304 Not Modified"
+                    return ""
+            web.header("Cache-Control", "max-age=%d" % MAXAGE)
+            if "gzip" in web.ctx.env.get("HTTP_ACCEPT_ENCODING", ""):
+                web.header("Content-Encoding", "gzip")
+                web.header("Vary", "Accept-Encoding")
+                if isinstance(data, str):
+                    return b"".join(Streaming.gzip_chunks([data]))
+                return Streaming.gzip_chunks(data)
+            return data
         except AttributeError as exc:
             self.logger.error(exc)
         web.ctx.status = "405 unknown method"
 
+    def __get_generation(self, args):
+        """
+        return generation stamp of response cache entries
+
+        for calls like /<method>/<project>/<tablename>/<datestring>/... of
+        a finished day the stamp changes only if caches of this day change,
+        for ranges like /lt_ts/<project>/<tablename>/<datestring start>/<datestring stop>/...
+        if caches of any day in range or rollups change,
+        all other calls get a new stamp every MAXAGE seconds
+
+        parameters:
+        args <list> arguments from url without method name
+
+        returns:
+        <str>
+        """
+        return self.__dl.get_generation(args, MAXAGE)
+
     def doc(self, *args, **kwds):
         """
         get docstrings from methods available
@@ -158,39 +216,85 @@ class DataLoggerWebApp3(object):
 
     #@outformat
     def get_tsa(self, *args, **kwds):
-        """ using DataLogger method """
+        """
+        using DataLogger method
+
+        ?format=csv streams all rows of all Timeseries as csv
+        """
         project, tablename, datestring = args[:3]
         self.__dl.setup(project, tablename, datestring)
+        if kwds.get("format") == "csv":
+            return Streaming.csv_chunks(self.__dl["tsa"].to_csv())
         return self.__dl["tsa"].to_data()
 
     #@outformat
     def get_tsastats(self, *args, **kwds):
-        """ using DataLogger method """
+        """
+        using DataLogger method
+
+        ?format=stats streams [key, stats] of every index_key as json
+        ?format=csv&stat_func_name=<stat_func_name> streams csv table of one stat_func_name
+        """
         project, tablename, datestring = args[:3]
         self.__dl.setup(project, tablename, datestring)
-        return self.__dl["tsastats"].to_data()
+        tsastats = self.__dl["tsastats"]
+        if kwds.get("format") == "stats":
+            return Streaming.json_chunks(([key, tsastats[key].stats] for key in tsastats.keys()))
+        if kwds.get("format") == "csv":
+            return Streaming.csv_chunks(tsastats.to_csv(kwds.get("stat_func_name", "avg")))
+        return tsastats.to_data()
 
     #@outformat
     def get_ts(self, *args, **kwds):
-        """ using DataLogger method """
+        """
+        using DataLogger method, rows are streamed
+
+        ?format=csv streams csv instead of json
+        ?points=<int>&downsample=<lttb|minmax> returns every series reduced to
+            about points as [{"name" : value_keyname, "data" : [[ts, value], ...]}, ...],
+            invalid points or downsample are answered with 400 bad request
+        """
         project, tablename, datestring, index_key_b64 = args[:4]
+        if "points" in kwds:
+            try:
+                points = int(kwds["points"])
+            except ValueError:
+                raise web.badrequest("points must be an integer")
+            method = kwds.get("downsample", "lttb")
+            if method not in Downsampling.methods:
+                raise web.badrequest("unknown downsample method %s, use one of %s" % (method, ", ".join(sorted(Downsampling.methods.keys()))))
         self.__dl.setup(project, tablename, datestring)
-        index_key = tuple(eval(base64.b64decode(index_key_b64)))
-        if len(args) >= 5:
-            value_keynames = args[4:]
-            print(value_keynames)
-            return list(self.__dl["tsa", index_key].to_data(value_keynames))
-        else:
-            return list(self.__dl["tsa", index_key].to_data())
+        index_key = b64decode_key(index_key_b64)
+        value_keynames = args[4:] if len(args) >= 5 else None
+        timeseries = self.__dl["tsa", index_key]
+        if "points" in kwds:
+            times = timeseries.get_column(timeseries.ts_keyname)
+            ret_data = []
+            for value_keyname in value_keynames or self.__dl.value_keynames:
+                ds_times, ds_values = Downsampling.downsample(times, timeseries.get_serie(value_keyname), points, method)
+                ret_data.append({"name" : value_keyname, "data" : list(zip(ds_times, ds_values))})
+            return ret_data
+        if kwds.get("format") == "csv":
+            return Streaming.csv_chunks(timeseries.to_csv(value_keynames))
+        return Streaming.json_chunks(timeseries.to_data(value_keynames))
 
     #@outformat
     def get_tsstats(self, *args, **kwds):
         """ using DataLogger method """
         project, tablename, datestring, index_key_b64 = args[:4]
         self.__dl.setup(project, tablename, datestring)
-        index_key = tuple(eval(base64.b64decode(index_key_b64)))
+        index_key = b64decode_key(index_key_b64)
         return self.__dl["tsastats", index_key].to_data()
 
+    #@outformat
+    def get_lt_ts(self, *args, **kwds):
+        """ using DataLogger method, answered from rollups where possible """
+        project, tablename, datestring_start, datestring_stop, index_key_b64, value_keyname = args[:6]
+        stat_func_name = args[6] if len(args) >= 7 else "avg"
+        self.__dl.setup(project, tablename, datestring_start)
+        index_key = b64decode_key(index_key_b64)
+        return self.__dl.get_tsastats_longtime(datestring_start, datestring_stop, index_key, value_keyname, stat_func_name)
+
     #@outformat
     def get_total_stats(self, *args, **kwds):
         """ using DataLogger method """
@@ -310,11 +414,11 @@ if __name__ == "__main__":
     print(json.dumps(total_stats, indent=4))
     assert total_stats["bytes_sent"]["count"] == 1440.0
     print("testing /ts/mysql/performance/2018-04-01/KHUnbmFnaW9zLnRpbGFrLmNjJywp")
-    ts = dlw3.get_ts("mysql", "performance", "2018-04-01", "KHUnbmFnaW9zLnRpbGFrLmNjJywp")
+    ts = json.loads("".join(dlw3.get_ts("mysql", "performance", "2018-04-01", "KHUnbmFnaW9zLnRpbGFrLmNjJywp")))
     print(json.dumps(ts, indent=4))
     assert ts[-1]["ts"] == 1522619702.0
     print("testing /ts/mysql/performance/2018-04-01/KHUnbmFnaW9zLnRpbGFrLmNjJywp/com_select/com_update")
-    ts = dlw3.get_ts("mysql", "performance", "2018-04-01", "KHUnbmFnaW9zLnRpbGFrLmNjJywp", "com_select", "com_update")
+    ts = json.loads("".join(dlw3.get_ts("mysql", "performance", "2018-04-01", "KHUnbmFnaW9zLnRpbGFrLmNjJywp", "com_select", "com_update")))
     print(json.dumps(ts, indent=4))
     assert ts[-1]["com_select"] == 2.07
     print("testing /tsstats/mysql/performance/2018-04-01/KHUnbmFnaW9zLnRpbGFrLmNjJywp")
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+functions to reduce one series to a fixed number of points for graphing
+
+the size of the result depends only on the requested number of points,
+not on the length of the series, so chart payloads and render times stay
+the same for a day or a year
+
+methods:
+    lttb - largest triangle three buckets, keeps the visual shape of the series
+    minmax - minimum and maximum value of every bucket, keeps all peaks
+
+every function takes two sequences of the same length, times and values,
+sorted by time, and returns two new lists times and values
+"""
+from operator import itemgetter
+
+
+def lttb(times, values, points):
+    """
+    largest triangle three buckets downsampling, first and last point are kept,
+    the points between are split in points - 2 buckets, from every bucket the
+    point forming the largest triangle with the point chosen before and the
+    average of the next bucket is used
+
+    parameters:
+    times <sequence> of <float> sorted
+    values <sequence> of <float>
+    points <int> number of points to return, at least 3
+
+    returns:
+    <tuple> of <list> times, <list> values
+    """
+    length = len(values)
+    if points >= length or points < 3:
+        return list(times), list(values)
+    every = (length - 2) / float(points - 2) # bucket size
+    ret_times = [times[0]]
+    ret_values = [values[0]]
+    chosen = 0
+    for bucket in range(points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        # average of next bucket, the last bucket is followed by the last point
+        next_end = min(int((bucket + 2) * every) + 1, length)
+        avg_time = sum(times[end:next_end]) / (next_end - end)
+        avg_value = sum(values[end:next_end]) / (next_end - end)
+        # twice the area of triangle chosen, candidate, average
+        # is abs(dx * value + dy * time - offset)
+        chosen_time = times[chosen]
+        chosen_value = values[chosen]
+        dx = chosen_time - avg_time
+        dy = avg_value - chosen_value
+        offset = dx * chosen_value + dy * chosen_time
+        areas = [abs(dx * value + dy * time - offset) for time, value in zip(times[start:end], values[start:end])]
+        chosen = start + areas.index(max(areas))
+        ret_times.append(times[chosen])
+        ret_values.append(values[chosen])
+    ret_times.append(times[-1])
+    ret_values.append(values[-1])
+    return ret_times, ret_values
+
+def minmax(times, values, points):
+    """
+    minimum and maximum per bucket downsampling, the series is split in
+    points // 2 buckets, from every bucket the points with lowest and
+    highest value are used in order of time
+
+    parameters:
+    times <sequence> of <float> sorted
+    values <sequence> of <float>
+    points <int> maximum number of points to return, at least 2
+
+    returns:
+    <tuple> of <list> times, <list> values
+    """
+    length = len(values)
+    if points >= length or points < 2:
+        return list(times), list(values)
+    buckets = points // 2
+    every = length / float(buckets)
+    ret_times = []
+    ret_values = []
+    for bucket in range(buckets):
+        start = int(bucket * every)
+        end = int((bucket + 1) * every)
+        part = list(zip(values[start:end], range(start, end)))
+        lowest = min(part, key=itemgetter(0))[1]
+        highest = max(part, key=itemgetter(0))[1]
+        for index in sorted(set((lowest, highest))):
+            ret_times.append(times[index])
+            ret_values.append(values[index])
+    return ret_times, ret_values
+
+methods = {
+    "lttb" : lttb,
+    "minmax" : minmax,
+}
+
+def downsample(times, values, points, method="lttb"):
+    """
+    reduce series to about points, using method
+
+    parameters:
+    times <sequence> of <float> sorted
+    values <sequence> of <float>
+    points <int> number of points to return
+    method <str> one of methods
+
+    returns:
+    <tuple> of <list> times, <list> values
+    """
+    if method not in methods:
+        raise KeyError("unknown downsampling method %s, use one of %s" % (method, sorted(methods.keys())))
+    return methods[method](times, values, int(points))
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for KeyIndex Class
+
+inverted index over index_keys of TimeseriesArray and TimeseriesArrayStats,
+used to select keys by filterkeys without looking at every key
+"""
+import bisect
+import logging
+
+
+class KeyIndex(object):
+    """
+    inverted index of index_keys
+
+    index_keyname -> value -> [key_id, key_id, ...]
+
+    key_id is the position of the key in keys, the structure is stored
+    as key_index in tsa_*.json and tsastat_*.json files
+    """
+
+    def __init__(self, index_keynames, keys, data=None):
+        """
+        parameters:
+        index_keynames <tuple> names of index_keys
+        keys <list> of <tuple> all index_keys, order defines key_ids
+        data <dict> stored index from to_data(), will be built if None
+        """
+        self.__index_keynames = tuple(index_keynames)
+        self.__keys = [tuple(key) for key in keys]
+        self.__sorted_values = {} # index_keyname -> sorted values, for prefix search
+        if data is not None and set(data.keys()) == set(self.__index_keynames):
+            self.__index = data
+        else:
+            self.__index = dict(((index_keyname, {}) for index_keyname in self.__index_keynames))
+            for key_id, key in enumerate(self.__keys):
+                for index_keyname, value in zip(self.__index_keynames, key):
+                    self.__index[index_keyname].setdefault(value, []).append(key_id)
+
+    def __len__(self):
+        return len(self.__keys)
+
+    @property
+    def index_keynames(self):
+        """names of index_keys"""
+        return self.__index_keynames
+
+    @property
+    def keys(self):
+        """all index_keys in order of key_id"""
+        return self.__keys
+
+    def to_data(self):
+        """
+        return JSON serializable index
+
+        returns:
+        <dict> index_keyname -> value -> <list> of key_ids
+        """
+        return self.__index
+
+    def values(self, index_keyname):
+        """
+        return sorted distinct values of index_keyname
+
+        parameters:
+        index_keyname <str>
+
+        returns:
+        <list>
+        """
+        if index_keyname not in self.__sorted_values:
+            self.__sorted_values[index_keyname] = sorted(self.__index[index_keyname].keys())
+        return self.__sorted_values[index_keyname]
+
+    def __lookup(self, index_keyname, value, prefix):
+        """
+        return set of key_ids where index_keyname is value, or starts with value
+        """
+        if index_keyname not in self.__index:
+            raise KeyError("%s is not in index_keynames %s" % (index_keyname, self.__index_keynames))
+        entries = self.__index[index_keyname]
+        if not prefix:
+            return set(entries.get(value, ()))
+        key_ids = set()
+        values = self.values(index_keyname)
+        for position in range(bisect.bisect_left(values, value), len(values)):
+            if not values[position].startswith(value):
+                break
+            key_ids.update(entries[values[position]])
+        return key_ids
+
+    def match_ids(self, filterkeys, matchtype="and", prefix=False):
+        """
+        return key_ids matching filterkeys, same rules as TimeseriesArray.filtermatch
+
+        filterkeys with value None are ignored, if there are no other filterkeys
+        "and" matches every key and "or" none
+
+        parameters:
+        filterkeys <dict> index_keyname -> value, could be a part of index_keynames
+        matchtype <str> "and" every given value must match, "or" at least one must match
+        prefix <bool> values of filterkeys are prefixes of index_key values
+
+        returns:
+        <list> of <int> sorted key_ids
+        """
+        assert matchtype in ("and", "or")
+        matches = [self.__lookup(index_keyname, value, prefix) for index_keyname, value in filterkeys.items() if value is not None]
+        if len(matches) == 0:
+            return list(range(len(self.__keys))) if matchtype == "and" else []
+        if matchtype == "and":
+            matches.sort(key=len) # start with the smallest set
+            key_ids = matches[0].intersection(*matches[1:])
+        else:
+            key_ids = matches[0].union(*matches[1:])
+        logging.debug("%d of %d keys matched filterkeys %s", len(key_ids), len(self.__keys), filterkeys)
+        return sorted(key_ids)
+
+    def match(self, filterkeys, matchtype="and", prefix=False):
+        """
+        return index_keys matching filterkeys, see match_ids
+
+        returns:
+        <list> of <tuple> in order of keys
+        """
+        return [self.__keys[key_id] for key_id in self.match_ids(filterkeys, matchtype, prefix)]
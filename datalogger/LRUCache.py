@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for LRUCache Class
+
+bounded cache of loaded Timeseries objects, used by TimeseriesArray
+to avoid reading the same Timeseries from disk again and again
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    least recently used cache with an entry and/or byte budget
+
+    the same object can be used by many TimeseriesArray objects,
+    access is thread safe. cached objects are shared, so they should
+    not be modified by the caller
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """
+        parameters:
+        max_entries <int> maximum number of cached objects, None for no limit
+        max_bytes <int> maximum sum of object sizes, None for no limit
+        """
+        if max_entries is None and max_bytes is None:
+            raise ValueError("either max_entries or max_bytes has to be given")
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__data = OrderedDict() # key : (value, size), least recently used first
+        self.__lock = threading.Lock()
+        self.__nbytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    @property
+    def max_entries(self):
+        """maximum number of cached objects"""
+        return self.__max_entries
+
+    @property
+    def max_bytes(self):
+        """maximum sum of object sizes"""
+        return self.__max_bytes
+
+    @property
+    def nbytes(self):
+        """sum of sizes of all cached objects"""
+        return self.__nbytes
+
+    @property
+    def hits(self):
+        """number of successful get calls"""
+        return self.__hits
+
+    @property
+    def misses(self):
+        """number of unsuccessful get calls"""
+        return self.__misses
+
+    @property
+    def evictions(self):
+        """number of objects removed to stay in budget"""
+        return self.__evictions
+
+    @property
+    def stats(self):
+        """
+        return counters and usage
+
+        returns:
+        <dict>
+        """
+        return {
+            "entries" : len(self.__data),
+            "bytes" : self.__nbytes,
+            "hits" : self.__hits,
+            "misses" : self.__misses,
+            "evictions" : self.__evictions,
+        }
+
+    def get(self, key):
+        """
+        return cached object and mark it as recently used
+
+        parameters:
+        key <hashable>
+
+        returns:
+        <object> or None if not cached
+        """
+        with self.__lock:
+            try:
+                value, _ = self.__data[key]
+            except KeyError:
+                self.__misses += 1
+                return None
+            self.__data.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def put(self, key, value, size=0):
+        """
+        store object, and evict least recently used objects until
+        the cache is in budget again, objects bigger than max_bytes
+        are not stored at all
+
+        parameters:
+        key <hashable>
+        value <object> must not be None
+        size <int> size of object in bytes
+        """
+        assert value is not None
+        if self.__max_bytes is not None and size > self.__max_bytes:
+            logging.debug("object of %d bytes does not fit into cache", size)
+            return
+        with self.__lock:
+            if key in self.__data:
+                self.__nbytes -= self.__data.pop(key)[1]
+            self.__data[key] = (value, size)
+            self.__nbytes += size
+            while (self.__max_entries is not None and len(self.__data) > self.__max_entries) or (self.__max_bytes is not None and self.__nbytes > self.__max_bytes):
+                _, (_, evicted_size) = self.__data.popitem(last=False)
+                self.__nbytes -= evicted_size
+                self.__evictions += 1
+
+    def pop(self, key):
+        """remove object from cache, if cached"""
+        with self.__lock:
+            if key in self.__data:
+                self.__nbytes -= self.__data.pop(key)[1]
+
+    def clear(self):
+        """remove all objects, counters are not reset"""
+        with self.__lock:
+            self.__data.clear()
+            self.__nbytes = 0
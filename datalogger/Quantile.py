@@ -2,7 +2,9 @@
 # pylint: disable=line-too-long
 import json
 import os
+import ast
 import logging
+from collections import Counter
 # own modules
 from CustomExceptions import *
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
@@ -14,22 +16,55 @@ class QuantileArray(object):
     """
     __filename = "quantile.json"
 
-    def __init__(self, tsa, tsastats=None):
+    def __init__(self, tsa, tsastats=None, bins=5):
         """
-        the data will be calculated imediately
+        the data will be calculated imediately, in one pass over tsa,
+        every Timeseries is loaded only once for all value_keynames
 
         parameters:
         tsa <TimeseriesArray>
+        tsastats <TimeseriesArrayStats> of tsa, will be calculated if None
+        bins <int> number of quantiles
         """
         self.__data = {}
         self.__keys = tuple(tsa.keys())
         self.__value_keynames = tuple(tsa.value_keynames)
+        if len(tsa) == 0:
+            logging.error("EmptyTsaException detected, not possible to calculate anything with nothing, skipping all value_keys")
+            return
+        if tsastats is None:
+            tsastats = TimeseriesArrayStats(tsa)
+        # get min and max over all available timeseries
+        limits = {}
+        quantiles = {}
         for value_keyname in self.__value_keynames:
-            try:
-                self.__data[value_keyname] = Quantile(tsa, value_keyname, tsastats=tsastats)
-            except QuantileError as exc:
-                logging.exception(exc)
-                logging.error("skipping value_key %s", value_keyname)
+            maxx = max((tsstats[value_keyname]["max"] for key, tsstats in tsastats.items()))
+            minn = min((tsstats[value_keyname]["min"] for key, tsstats in tsastats.items()))
+            limits[value_keyname] = (minn, maxx)
+            # if __maxx is zero, the quantile values start with an entry for every quantile
+            quantiles[value_keyname] = dict.fromkeys(range(bins), 0) if maxx == 0.0 else {}
+        for key in self.__keys:
+            # if there is no timeseriesstats value for this particular tsa.
+            # skip it
+            if key not in tsastats.keys():
+                logging.debug("no timeseriesstats available for index_key = %s, skipping", key)
+                continue
+            timeseries = None
+            for value_keyname in self.__value_keynames:
+                try:
+                    tsastats[key][value_keyname]
+                except KeyError:
+                    logging.debug("no timeseriesstats available for index_key = %s and value_key = %s, skipping", key, value_keyname)
+                    continue
+                if timeseries is None:
+                    timeseries = tsa[key]
+                minn, maxx = limits[value_keyname]
+                try:
+                    quantiles[value_keyname][key] = Quantile.histogram(timeseries.get_column(value_keyname), minn, maxx, bins)
+                except QuantileError as exc:
+                    logging.error("%s, index_key = %s, value_key = %s, skipping", exc, key, value_keyname)
+        for value_keyname in self.__value_keynames:
+            self.__data[value_keyname] = Quantile.from_data(quantiles[value_keyname], limits[value_keyname][1])
 
     @property
     def keys(self):
@@ -141,22 +176,17 @@ class Quantile(object):
     """
     class to calulate and store quantile for one TimeseriesArray value_key
     """
-    __quants = {
-        0 : 0,
-        1 : 0,
-        2 : 0,
-        3 : 0,
-        4 : 0,
-    }
-    __width = 20
-
-    def __init__(self, tsa, value_key, tsastats):
+
+    def __init__(self, tsa, value_key, tsastats, bins=5):
         """
+        to calculate quantiles of all value_keys use QuantileArray,
+        which reads every Timeseries only once
+
         parameters:
         tsa <TimeseriesArray>
         value_key <str> must be a value_key of the Timeseries used in tsa
-        maxx    <None> to autoscale max value upon all given Timeseries in tsa
-                <float> for specific maximum value to use
+        tsastats <TimeseriesArrayStats> used to get minimum and maximum over all Timeseries
+        bins <int> number of quantiles
         """
         self.__quantile = {}
         self.__sortlist = None
@@ -165,28 +195,79 @@ class Quantile(object):
         # get min and max over all available timeseries
         self.__maxx = max((tsstats[value_key]["max"] for key, tsstats in tsastats.items()))
         self.__minn = min((tsstats[value_key]["min"] for key, tsstats in tsastats.items()))
-        # do the calculations
-        # width of each quantile
-        width = int(100 / (len(self.__quants.keys()) - 1))
-        # if __maxx or width is equal zero, empty Data
-        if (self.__maxx == 0.0) or  (width == 0):
-            self.__quantile = self.__quants.copy()
+        # if __maxx is equal zero, empty Data
+        if self.__maxx == 0.0:
+            self.__quantile = dict.fromkeys(range(bins), 0)
             logging.debug("either length of data or maximum is zero, so all quantile values will be zero")
-        try:
-            for key in tsa.keys():
-                try:
-                    # if there is no timeseriesstats value for this particular tsa.
-                    # skip it
-                    tsastats[key][value_key]
-                    self.__quantile[key] = self.__calculate(tsa[key][value_key])
-                except KeyError as exc:
-                    logging.debug("no timeseriesstats available for index_key = %s and value_key = %s, skipping", key, value_key)
-        except Exception as exc:
-            logging.exception(exc)
-            logging.error("an error occured with value_key %s", value_key)
-            raise exc
+        for key in tsa.keys():
+            try:
+                # if there is no timeseriesstats value for this particular tsa.
+                # skip it
+                tsastats[key][value_key]
+            except KeyError as exc:
+                logging.debug("no timeseriesstats available for index_key = %s and value_key = %s, skipping", key, value_key)
+                continue
+            try:
+                self.__quantile[key] = self.histogram(tsa[key].get_column(value_key), self.__minn, self.__maxx, bins)
+            except QuantileError as exc:
+                logging.error("%s, index_key = %s, value_key = %s, skipping", exc, key, value_key)
         # self.sort() # do initial sort
 
+    @staticmethod
+    def from_data(quantile, maxx):
+        """
+        create Quantile from already calculated data
+
+        parameters:
+        quantile <dict> index_key : <dict> quantile number : count
+        maxx <float> maximum over all Timeseries
+
+        returns:
+        <Quantile>
+        """
+        quantille = Quantile.__new__(Quantile)
+        quantille.__quantile = quantile
+        quantille.__maxx = maxx
+        quantille.__sortlist = None
+        return quantille
+
+    @staticmethod
+    def histogram(series, minn, maxx, bins=5):
+        """
+        count values of series in every of bins equally wide quantiles
+        between minn and maxx, values equal to maxx are counted in the
+        last quantile
+
+        parameters:
+        series <iterable> of <float>
+        minn <float> minimum over all Timeseries
+        maxx <float> maximum over all Timeseries
+        bins <int> number of quantiles
+
+        returns:
+        <dict> quantile number : count
+
+        raises:
+        QuantileError if some value is above maxx
+        """
+        quants = dict.fromkeys(range(bins), 0)
+        # the range from minn to maxx
+        # maxx and minn both can be negative
+        value_range = abs(maxx - minn)
+        # if value_range is zero, skip calculations
+        if value_range == 0.0:
+            return quants
+        width = 100.0 / bins
+        # Counter counts in C, only the quantile number is calculated per value
+        for quant, count in Counter([int((100 * abs(value - minn) / value_range) / width) for value in series]).items():
+            if quant < bins:
+                quants[quant] += count
+            elif quant == bins: # this is the case if value == maxx
+                quants[bins - 1] += count
+            else:
+                raise QuantileError("value out of range, quant = %s, maxx = %s, minn = %s" % (quant, maxx, minn))
+        return quants
+
     @property
     def quantile(self):
         """get internal data"""
@@ -212,10 +293,8 @@ class Quantile(object):
         """
         recreate object from data string in json format
         """
-        quantille = Quantile.__new__(Quantile)
-        quantille.__quantile, quantille.__maxx = eval(json.loads(data))
-        #quantille.sort()
-        return quantille
+        quantile, maxx = ast.literal_eval(json.loads(data))
+        return Quantile.from_data(quantile, maxx)
 
     def __eq__(self, other):
         try:
@@ -230,31 +309,6 @@ class Quantile(object):
     def __getitem__(self, key):
         return self.__quantile[key]
 
-    def __calculate(self, series):
-        """
-        actually do the calculations
-        """
-        quants = self.__quants.copy()
-        # TODO: Performance Optimization needed
-        # the range from __minn to __maxx
-        # __maxx and __minn both can be negative
-        value_range = abs(self.__maxx - self.__minn)
-        # if value_range is zero, skip calculations
-        if value_range == 0.0:
-            return quants
-        for value in series:
-            quant = (100 * abs(value - self.__minn) / value_range) / self.__width
-            try:
-                quants[int(quant)] += 1
-            except KeyError as exc:
-                # this is the case if value == __maxx
-                if int(quant) == len(quants):
-                    quants[int(quant) - 1] += 1
-                else:
-                    logging.error("quant = %s, value = %s, __maxx = %s, __minn = %s, width = %s", quant, value, self.__maxx, self.__minn, self.__width)
-                    raise exc
-        return quants
-
     def head(self, maxlines=10):
         """
         output head
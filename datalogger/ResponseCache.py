@@ -0,0 +1,354 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for ResponseCache Class
+
+on disk cache of serialized web responses, shared by all processes
+using the same directory, like the workers of mod_wsgi or gunicorn
+
+every entry is one file <cachedir>/<key[:2]>/<key>, the first line
+holds JSON meta data (etag, last_modified, text) padded to HEADER_SIZE
+bytes, the rest is the response itself. files are written to a temporary file first and
+renamed, so readers in other processes never see partial entries.
+the modification time of the file is the last access, the least
+recently used files are deleted if the size of all files exceeds maxsize
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from email.utils import formatdate, parsedate_tz, mktime_tz
+# own modules
+from AtomicFile import atomic_open as atomic_open
+from AtomicFile import get_tmpfilename as get_tmpfilename
+
+
+class ResponseCache(object):
+    """
+    size bounded, least recently used cache of web responses on disk
+    """
+    HEADER_SIZE = 256 # bytes of meta data line, so it could be written after the response
+    TMP_MAXAGE = 3600 # seconds, older temporary files are left from killed writers
+
+    def __init__(self, cachedir, maxsize=256 * 1024 * 1024):
+        """
+        parameters:
+        cachedir <str> directory to store entries, will be created
+        maxsize <int> maximum size of all entries in bytes
+        """
+        self.__cachedir = cachedir
+        self.__maxsize = maxsize
+        self.__written = maxsize # check size with first put
+        self.__hits = 0
+        self.__misses = 0
+        if not os.path.isdir(cachedir):
+            try:
+                os.makedirs(cachedir)
+            except OSError: # created by another process meanwhile
+                if not os.path.isdir(cachedir):
+                    raise
+
+    @property
+    def cachedir(self):
+        """directory of entries"""
+        return self.__cachedir
+
+    @property
+    def maxsize(self):
+        """maximum size of all entries in bytes"""
+        return self.__maxsize
+
+    @property
+    def hits(self):
+        """number of get calls of this object with entry found"""
+        return self.__hits
+
+    @property
+    def misses(self):
+        """number of get calls of this object without entry"""
+        return self.__misses
+
+    @staticmethod
+    def get_key(endpoint, args, generation=None):
+        """
+        return key of one response
+
+        parameters:
+        endpoint <str> name of called method
+        args <iterable> all arguments, like project, tablename, datestring and further
+        generation <str> stamp of underlying data, changes if the data changes
+
+        returns:
+        <str> hex digest
+        """
+        key = json.dumps([endpoint, [str(arg) for arg in args], generation])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def __get_filename(self, key):
+        """filename of entry"""
+        return os.path.join(self.__cachedir, key[:2], key)
+
+    def __pack_meta(self, meta):
+        """meta data line of HEADER_SIZE bytes"""
+        line = json.dumps(meta).encode("utf-8")
+        return line + b" " * (self.HEADER_SIZE - len(line) - 1) + b"\n"
+
+    def get(self, key):
+        """
+        return stored response, and mark it as recently used
+
+        parameters:
+        key <str> from get_key
+
+        returns:
+        <tuple> of <str> etag, <str> last_modified, data
+        or None if there is no entry
+        """
+        filename = self.__get_filename(key)
+        try:
+            with open(filename, "rb") as infile:
+                meta = json.loads(infile.readline().decode("utf-8"))
+                data = infile.read()
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError):
+            # missing, evicted meanwhile by another process, or broken
+            self.__misses += 1
+            return None
+        self.__hits += 1
+        if meta["text"]:
+            data = data.decode("utf-8")
+        return meta["etag"], meta["last_modified"], data
+
+    def put(self, key, data):
+        """
+        store response
+
+        parameters:
+        key <str> from get_key
+        data <str> or <bytes> serialized response
+
+        returns:
+        <tuple> of <str> etag, <str> last_modified
+        """
+        text = not isinstance(data, bytes)
+        payload = data.encode("utf-8") if text else data
+        meta = {
+            "etag" : '"%s"' % hashlib.md5(payload).hexdigest(),
+            "last_modified" : formatdate(time.time(), usegmt=True),
+            "text" : text,
+        }
+        filename = self.__get_filename(key)
+        self.__create_subdir(filename)
+        try:
+            with atomic_open(filename, "wb") as outfile:
+                outfile.write(self.__pack_meta(meta))
+                outfile.write(payload)
+        except (IOError, OSError):
+            # a failing cache must not break the response
+            logging.error("could not store response in %s", filename)
+        self.__written += len(payload)
+        if self.__written * 16 >= self.__maxsize:
+            self.evict()
+        return meta["etag"], meta["last_modified"]
+
+    @staticmethod
+    def __create_subdir(filename):
+        """create subdirectory of entry if necessary"""
+        if not os.path.isdir(os.path.dirname(filename)):
+            try:
+                os.makedirs(os.path.dirname(filename))
+            except OSError: # created by another process meanwhile
+                pass
+
+    def get_stream(self, key, chunksize=64 * 1024):
+        """
+        return stored response in chunks, and mark it as recently used,
+        memory usage is bounded by chunksize and not by size of response
+
+        the file is opened again on the first iteration, so a generator which
+        is never iterated, like for 304 Not Modified, holds no open file
+
+        parameters:
+        key <str> from get_key
+        chunksize <int> bytes per chunk
+
+        returns:
+        <tuple> of <str> etag, <str> last_modified, <generator> of <bytes>
+        or None if there is no entry
+        """
+        filename = self.__get_filename(key)
+        try:
+            with open(filename, "rb") as infile:
+                meta = json.loads(infile.readline().decode("utf-8"))
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError):
+            self.__misses += 1
+            return None
+        self.__hits += 1
+        def chunks():
+            """read file chunk by chunk, the file stays readable even if evicted meanwhile"""
+            try:
+                infile = open(filename, "rb")
+            except (IOError, OSError) as exc:
+                # deleted by another process since it was marked as recently used
+                logging.exception(exc)
+                logging.error("response %s was deleted before it was sent", filename)
+                return
+            with infile:
+                infile.readline() # meta data
+                chunk = infile.read(chunksize)
+                while chunk:
+                    yield chunk
+                    chunk = infile.read(chunksize)
+        return meta["etag"], meta["last_modified"], chunks()
+
+    def put_stream(self, key, chunks):
+        """
+        store response while it is sent, chunk by chunk,
+        the entry is only stored if all chunks were consumed
+
+        parameters:
+        key <str> from get_key
+        chunks <iterable> of <str> or <bytes>
+
+        returns:
+        <generator> of unchanged chunks
+        """
+        filename = self.__get_filename(key)
+        self.__create_subdir(filename)
+        tmpfilename = get_tmpfilename(filename)
+        checksum = hashlib.md5()
+        text = True
+        size = 0
+        complete = False
+        try:
+            outfile = open(tmpfilename, "wb")
+            outfile.write(b" " * self.HEADER_SIZE) # meta data is written at the end
+        except (IOError, OSError) as exc:
+            logging.exception(exc)
+            logging.error("could not store response in %s", filename)
+            outfile = None
+        try:
+            for chunk in chunks:
+                if outfile is not None:
+                    text = text and not isinstance(chunk, bytes)
+                    payload = chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+                    checksum.update(payload)
+                    size += len(payload)
+                    try:
+                        outfile.write(payload)
+                    except (IOError, OSError) as exc:
+                        logging.exception(exc)
+                        logging.error("could not store response in %s", filename)
+                        outfile.close()
+                        os.unlink(tmpfilename)
+                        outfile = None
+                yield chunk
+            complete = True
+        finally:
+            # also reached, if the client disconnects and the generator is closed
+            if outfile is not None:
+                try:
+                    if complete:
+                        outfile.seek(0)
+                        outfile.write(self.__pack_meta({
+                            "etag" : '"%s"' % checksum.hexdigest(),
+                            "last_modified" : formatdate(time.time(), usegmt=True),
+                            "text" : text,
+                        }))
+                    outfile.close()
+                    if complete:
+                        os.rename(tmpfilename, filename)
+                except (IOError, OSError) as exc:
+                    # temporary file deleted by clear of another process,
+                    # the response was sent, only not stored
+                    logging.exception(exc)
+                    logging.error("could not store response in %s", filename)
+                finally:
+                    if os.path.isfile(tmpfilename):
+                        os.unlink(tmpfilename)
+        self.__written += size
+        if self.__written * 16 >= self.__maxsize:
+            self.evict()
+
+    def evict(self):
+        """
+        delete least recently used entries, if all entries are bigger than maxsize,
+        afterwards there are at most 3/4 of maxsize left
+
+        returns:
+        <int> number of deleted entries
+        """
+        self.__written = 0
+        entries = []
+        total = 0
+        for absfilename, stat in self.__walk():
+            entries.append((stat.st_mtime, stat.st_size, absfilename))
+            total += stat.st_size
+        if total <= self.__maxsize:
+            return 0
+        deleted = 0
+        entries.sort()
+        for mtime, size, absfilename in entries:
+            if total <= self.__maxsize * 3 // 4:
+                break
+            try:
+                os.unlink(absfilename)
+                deleted += 1
+            except OSError: # deleted by another process
+                pass
+            total -= size
+        logging.info("deleted %d least recently used responses from %s", deleted, self.__cachedir)
+        return deleted
+
+    def clear(self):
+        """delete all entries"""
+        for absfilename, stat in self.__walk():
+            try:
+                os.unlink(absfilename)
+            except OSError:
+                pass
+
+    def __walk(self):
+        """
+        yield all stored entries, temporary files of running writers are skipped
+
+        returns:
+        <generator> of (<str> absfilename, <os.stat_result>)
+        """
+        tmp_limit = time.time() - self.TMP_MAXAGE
+        for dirpath, dirnames, filenames in os.walk(self.__cachedir):
+            for filename in filenames:
+                absfilename = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(absfilename)
+                except OSError: # deleted by another process
+                    continue
+                if filename.endswith(".tmp") and stat.st_mtime > tmp_limit:
+                    continue
+                yield absfilename, stat
+
+    @staticmethod
+    def is_not_modified(etag, last_modified, if_none_match=None, if_modified_since=None):
+        """
+        check conditional request headers against stored response
+
+        parameters:
+        etag <str> of stored response
+        last_modified <str> of stored response
+        if_none_match <str> value of request header If-None-Match or None
+        if_modified_since <str> value of request header If-Modified-Since or None
+
+        returns:
+        <bool> True if the client could use its copy, answer 304 Not Modified
+        """
+        if if_none_match is not None:
+            # If-Modified-Since is ignored if If-None-Match is given
+            return if_none_match.strip() == "*" or etag in [value.strip() for value in if_none_match.split(",")]
+        if if_modified_since is not None:
+            since = parsedate_tz(if_modified_since)
+            modified = parsedate_tz(last_modified)
+            if since is not None and modified is not None:
+                return mktime_tz(modified) <= mktime_tz(since)
+        return False
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for Rollup Class
+
+daily TimeseriesStats of all index_keys of one project/tablename for a
+longer period (week, month or year) in one single file, so long time
+queries do not have to open the tsastat files of every single day
+
+the data is stored in a TimeseriesArrayContainer, for every index_key one
+row per day with data, the timestamp column holds the date ordinal and
+there is one column for every value_keyname and stat_func_name, followed
+by one column for every value_keyname and StatsState value name, days
+without StatsState have NaN values there
+"""
+import os
+import math
+import datetime
+import logging
+# own modules
+from TimeseriesColumnar import TimeseriesColumnar as TimeseriesColumnar
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from TimeseriesStats import StatsState as StatsState
+from TimeseriesArrayContainer import TimeseriesArrayContainer as TimeseriesArrayContainer
+from CustomExceptions import *
+
+
+class Rollup(object):
+    """
+    read access to one stored rollup of one period
+
+    periodstrings look like 2018 (year), 2018-04 (month) or 2018-W13 (iso week)
+    """
+    periods = ("year", "month", "week") # coarsest first
+    ts_keyname = "date"
+
+    def __init__(self, filename):
+        """
+        parameters:
+        filename <str> rollup file, created by Rollup.write
+        """
+        self.__container = TimeseriesArrayContainer(filename)
+        meta = self.__container.meta
+        self.__periodstring = meta["periodstring"]
+        self.__dates = tuple(meta["dates"])
+        self.__complete = meta["complete"]
+        self.__value_keynames = tuple(meta["value_keynames"])
+        self.__stat_func_names = tuple(meta["stat_func_names"])
+        self.__state_value_names = tuple(meta["state_value_names"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """close rollup file"""
+        self.__container.close()
+
+    def __len__(self):
+        return len(self.__container)
+
+    def __contains__(self, key):
+        return key in self.__container
+
+    def keys(self):
+        """all stored index_keys"""
+        return self.__container.keys()
+
+    @property
+    def periodstring(self):
+        """period of this rollup like 2018, 2018-04 or 2018-W13"""
+        return self.__periodstring
+
+    @property
+    def dates(self):
+        """datestrings of all days with data"""
+        return self.__dates
+
+    @property
+    def complete(self):
+        """True if every day of this period was finished, when this rollup was written"""
+        return self.__complete
+
+    @property
+    def index_keynames(self):
+        """index_keynames of stored data"""
+        return self.__container.index_keynames
+
+    @property
+    def value_keynames(self):
+        """value_keynames of stored data"""
+        return self.__value_keynames
+
+    @property
+    def stat_func_names(self):
+        """stat_func_names of stored data"""
+        return self.__stat_func_names
+
+    def read(self, key):
+        """
+        return stored daily stats of one index_key
+
+        parameters:
+        key <tuple> index_key
+
+        returns:
+        <list> of (<str> datestring, <TimeseriesStats>) in order of date, with StatsState if stored
+        """
+        headers, times, columns = self.__container.read_columns(key)
+        columns = dict(zip(headers, columns))
+        column_names = [(value_keyname, [(stat_func_name, columns[self.get_colname(value_keyname, stat_func_name)]) for stat_func_name in self.__stat_func_names]) for value_keyname in self.__value_keynames]
+        state_columns = [(value_keyname, [columns[self.get_colname(value_keyname, value_name)] for value_name in self.__state_value_names]) for value_keyname in self.__value_keynames]
+        rows = []
+        for row, ordinal in enumerate(times):
+            tsstats = TimeseriesStats.__new__(TimeseriesStats)
+            tsstats.stats = dict(((value_keyname, dict(((stat_func_name, column[row]) for stat_func_name, column in stat_columns))) for value_keyname, stat_columns in column_names))
+            if not math.isnan(state_columns[0][1][0][row]):
+                tsstats.state = dict(((value_keyname, StatsState.from_values(tsstats[value_keyname], [column[row] for column in value_columns])) for value_keyname, value_columns in state_columns))
+            rows.append((datetime.date.fromordinal(int(ordinal)).isoformat(), tsstats))
+        return rows
+
+    @staticmethod
+    def get_colname(value_keyname, stat_func_name):
+        """name of stored column of value_keyname and stat_func_name"""
+        return "%s.%s" % (value_keyname, stat_func_name)
+
+    @staticmethod
+    def get_dumpfilename(rollupdir, periodstring):
+        """filename of rollup of this period"""
+        return os.path.join(rollupdir, "rollup_%s.tsc" % periodstring)
+
+    @staticmethod
+    def get_periodstring(period, datestring):
+        """
+        return periodstring of the period containing datestring
+
+        parameters:
+        period <str> one of Rollup.periods
+        datestring <str> like 2018-04-01
+
+        returns:
+        <str> like 2018, 2018-04 or 2018-W13
+        """
+        date = datetime.datetime.strptime(datestring, "%Y-%m-%d").date()
+        if period == "year":
+            return "%04d" % date.year
+        if period == "month":
+            return "%04d-%02d" % (date.year, date.month)
+        if period == "week":
+            year, week, _ = date.isocalendar()
+            return "%04d-W%02d" % (year, week)
+        raise KeyError("unknown period %s, use one of %s" % (period, Rollup.periods))
+
+    @staticmethod
+    def get_period(periodstring):
+        """return period of periodstring, one of Rollup.periods"""
+        if "-W" in periodstring:
+            return "week"
+        if "-" in periodstring:
+            return "month"
+        return "year"
+
+    @staticmethod
+    def get_period_dates(periodstring):
+        """
+        return first and last day of period
+
+        parameters:
+        periodstring <str> like 2018, 2018-04 or 2018-W13
+
+        returns:
+        <tuple> of <datetime.date> first, last
+        """
+        period = Rollup.get_period(periodstring)
+        if period == "year":
+            year = int(periodstring)
+            return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+        if period == "month":
+            year, month = (int(part) for part in periodstring.split("-"))
+            first = datetime.date(year, month, 1)
+            return first, (first + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(days=1)
+        year, week = (int(part) for part in periodstring.split("-W"))
+        # the 4th of january is always in the first iso week
+        jan4 = datetime.date(year, 1, 4)
+        first = jan4 - datetime.timedelta(days=jan4.weekday()) + datetime.timedelta(weeks=week - 1)
+        return first, first + datetime.timedelta(days=6)
+
+    @staticmethod
+    def write(filename, periodstring, index_keynames, value_keynames, stat_func_names, items, dates, complete):
+        """
+        write rollup file
+
+        parameters:
+        filename <str>
+        periodstring <str>
+        index_keynames <tuple>
+        value_keynames <tuple>
+        stat_func_names <tuple>
+        items <iterable> of (<tuple> key, <list> of (<str> datestring, <TimeseriesStats> or <dict> stats like TimeseriesStats)) in order of date
+        dates <list> of <str> datestrings with data
+        complete <bool> True if every day of this period is finished
+        """
+        state_value_names = StatsState.get_value_names()
+        colnames = [Rollup.get_colname(value_keyname, stat_func_name) for value_keyname in value_keynames for stat_func_name in stat_func_names]
+        colnames.extend((Rollup.get_colname(value_keyname, value_name) for value_keyname in value_keynames for value_name in state_value_names))
+        no_state = [float("nan")] * len(state_value_names)
+        def state_values(stats, value_keyname):
+            """StatsState of this day as list of floats, NaN if unknown"""
+            if isinstance(stats, TimeseriesStats) and stats.has_state:
+                return stats.state[value_keyname].to_values()
+            return no_state
+        def timeseries_items():
+            """convert rows of every key to TimeseriesColumnar"""
+            for key, rows in items:
+                times = [datetime.datetime.strptime(datestring, "%Y-%m-%d").date().toordinal() for datestring, stats in rows]
+                columns = [[float(stats[value_keyname][stat_func_name]) for datestring, stats in rows] for value_keyname in value_keynames for stat_func_name in stat_func_names]
+                for value_keyname in value_keynames:
+                    columns.extend((list(column) for column in zip(*[state_values(stats, value_keyname) for datestring, stats in rows])))
+                yield key, TimeseriesColumnar.from_columns(colnames, times, columns, Rollup.ts_keyname)
+        meta = {
+            "periodstring" : periodstring,
+            "dates" : list(dates),
+            "complete" : complete,
+            "value_keynames" : list(value_keynames),
+            "stat_func_names" : list(stat_func_names),
+            "state_value_names" : state_value_names,
+        }
+        TimeseriesArrayContainer.write(filename, index_keynames, colnames, Rollup.ts_keyname, timeseries_items(), meta=meta)
+        logging.info("written rollup %s with %d days of data to %s", periodstring, len(dates), filename)
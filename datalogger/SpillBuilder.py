@@ -0,0 +1,297 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for SpillBuilder Class
+
+builds the caches of one day (tsa with ts, tsastats with tsstat and
+quantile) for raw input files, which do not fit in memory as a whole
+
+    1. raw input is read chunk by chunk, the rows of every chunk are
+       grouped by index_key and appended to one of some partition files
+       on disk, every index_key is always in the same partition
+    2. every partition is read on its own, the rows of every index_key
+       are sorted by time and duplicates skipped, the Timeseries are
+       built, stored and statistics are calculated
+    3. the quantiles are calculated from the stored Timeseries, one
+       after another, with the minimum and maximum of all statistics
+
+raw input is parsed in chunks of at most memory_budget / PARSE_FACTOR
+bytes, the number of partitions is chosen to fit one partition in
+memory_budget, partition files which are bigger anyway, because the keys
+are not spread evenly, are split again by their size on disk, so peak
+memory depends on memory_budget, the size of the biggest single
+Timeseries and the statistics of all keys, but not on the size of the
+raw input file
+
+partition file layout, one record for every index_key of every chunk:
+    <4 bytes> unsigned int length of key
+    <4 bytes> unsigned int number of rows
+    <length of key bytes> JSON encoded index_key
+    <rows * (1 + number of value_keynames) doubles> timestamps, followed by every column
+"""
+import os
+import json
+import math
+import zlib
+import struct
+import shutil
+import logging
+import tempfile
+from array import array
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from Quantile import QuantileArray as QuantileArray
+from CustomExceptions import *
+
+
+class SpillBuilder(object):
+    """
+    out of core build of the daily caches of one DataLogger set up
+    to project/tablename/datestring
+    """
+    RECORD = struct.Struct("<II")
+    MEMORY_FACTOR = 8 # bytes in memory for every byte of raw input built in memory, measured 6.8
+    PARSE_FACTOR = 24 # bytes in memory for every byte of one parsed raw chunk, measured 20 - 23
+    PARTITION_FACTOR = 2 # bytes in memory for every byte of one partition file
+    GZIP_FACTOR = 8 # assumed compression ratio of gzipped raw input files
+
+    def __init__(self, datalogger, memory_budget=None, spilldir=None):
+        """
+        parameters:
+        datalogger <DataLogger> set up to project/tablename/datestring
+        memory_budget <int> bytes of memory to use, default DataLogger.memory_budget
+        spilldir <str> directory for partition files, default DataLogger.spilldir
+        """
+        self.__datalogger = datalogger
+        self.__memory_budget = memory_budget if memory_budget is not None else datalogger.memory_budget
+        self.__spilldir = spilldir if spilldir is not None else datalogger.spilldir
+        if not self.__memory_budget:
+            raise AttributeError("memory_budget must be set to use SpillBuilder")
+
+    @property
+    def memory_budget(self):
+        """bytes of memory to use"""
+        return self.__memory_budget
+
+    def get_raw_size(self):
+        """
+        return bytes of uncompressed raw input, estimated for gzipped files
+
+        returns:
+        <int>
+        """
+        raw_filename = self.__datalogger.raw_filename
+        if raw_filename is None:
+            raise DataLoggerRawFileMissing("raw input file of %s/%s/%s is missing" % (self.__datalogger.project, self.__datalogger.tablename, self.__datalogger.datestring))
+        size = os.stat(raw_filename).st_size
+        if raw_filename.endswith(".gz"):
+            size *= self.GZIP_FACTOR
+        return size
+
+    def get_estimated_size(self):
+        """
+        return estimated bytes of memory to build the caches in memory,
+        with raw input as a whole
+
+        returns:
+        <int>
+        """
+        return self.get_raw_size() * self.MEMORY_FACTOR
+
+    def is_needed(self):
+        """True if raw input does not fit in memory_budget"""
+        return self.get_estimated_size() > self.__memory_budget
+
+    def get_chunksize(self):
+        """bytes of raw input to parse at once, so that one parsed chunk fits in memory_budget"""
+        return max(1, min(self.__datalogger.raw_chunksize, self.__memory_budget // self.PARSE_FACTOR))
+
+    def get_partitions(self):
+        """number of partitions, so that one partition fits in memory_budget"""
+        return self.__get_partitions(self.get_raw_size())
+
+    def __get_partitions(self, size):
+        """number of partitions for size bytes, so that one partition fits in memory_budget"""
+        return max(1, int(math.ceil(size * self.PARTITION_FACTOR / float(self.__memory_budget))))
+
+    def run(self):
+        """
+        build and store tsa, tsastats and quantile caches
+
+        returns:
+        <dict> with number of processed partitions, keys, rows, reordered rows and skipped duplicate rows
+        """
+        datalogger = self.__datalogger
+        partitions = self.get_partitions()
+        if self.__spilldir is not None and not os.path.isdir(self.__spilldir):
+            os.makedirs(self.__spilldir)
+        workdir = tempfile.mkdtemp(prefix="spill_", dir=self.__spilldir)
+        logging.info("building %s/%s/%s with %d partitions in %s", datalogger.project, datalogger.tablename, datalogger.datestring, partitions, workdir)
+        try:
+            filenames = self.__partition(workdir, partitions)
+            stats = {}
+            counts = {"partitions" : 0, "keys" : 0, "rows" : 0, "reordered" : 0, "duplicates" : 0}
+            TimeseriesArray.write_items(datalogger.cachedir, datalogger.index_keynames, datalogger.value_keynames, "ts", self.__iter_timeseries(filenames, stats, counts), overwrite=True, container=datalogger.container, compress=datalogger.container_compress, converted=datalogger.datatypes if datalogger.converted_cache else None)
+        finally:
+            shutil.rmtree(workdir)
+        tsastats = TimeseriesArrayStats.from_stats(datalogger.index_keynames, datalogger.value_keynames, stats)
+        tsastats.dump(datalogger.cachedir, overwrite=True, container=datalogger.container)
+        # every stored Timeseries is loaded on its own, without keeping it
+        with TimeseriesArray.load(datalogger.cachedir, datalogger.index_keynames, datatypes=datalogger.datatypes, columnar=datalogger.columnar) as tsa:
+            QuantileArray(tsa, tsastats, bins=datalogger.quantile_bins).dump(datalogger.cachedir)
+        return counts
+
+    def __partition(self, workdir, partitions):
+        """
+        spread rows of raw input to partition files
+
+        returns:
+        <list> of <str> filenames of partition files
+        """
+        filenames = [os.path.join(workdir, "partition_%d" % number) for number in range(partitions)]
+        outfiles = [open(filename, "wb") for filename in filenames]
+        try:
+            for chunk in self.__datalogger.read_raw_chunks(self.get_chunksize()):
+                for index_key, (times, columns) in chunk.items():
+                    key_data = json.dumps(index_key).encode("utf-8")
+                    # crc32 is the same in every process, unlike hash
+                    outfile = outfiles[zlib.crc32(key_data) % partitions]
+                    data = array("d", times)
+                    for column in columns:
+                        data.extend(column)
+                    self.__write_record(outfile, key_data, len(times), data)
+        finally:
+            for outfile in outfiles:
+                outfile.close()
+        return filenames
+
+    def __split(self, filename, depth):
+        """
+        spread records of one partition file, which does not fit in
+        memory_budget, to smaller partition files, another crc32 seed
+        for every depth spreads the keys in another way
+
+        returns:
+        <list> of <str> filenames of non empty partition files
+        """
+        partitions = self.__get_partitions(os.stat(filename).st_size)
+        filenames = ["%s_%d" % (filename, number) for number in range(partitions)]
+        outfiles = [open(subfilename, "wb") for subfilename in filenames]
+        try:
+            for key_data, rows, data in self.__iter_records(filename):
+                self.__write_record(outfiles[zlib.crc32(key_data, depth) % partitions], key_data, rows, data)
+        finally:
+            for outfile in outfiles:
+                outfile.close()
+        os.unlink(filename)
+        ret_data = []
+        for subfilename in filenames:
+            if os.stat(subfilename).st_size:
+                ret_data.append(subfilename)
+            else:
+                os.unlink(subfilename)
+        return ret_data
+
+    def __write_record(self, outfile, key_data, rows, data):
+        """write one record to partition file"""
+        outfile.write(self.RECORD.pack(len(key_data), rows))
+        outfile.write(key_data)
+        data.tofile(outfile)
+
+    def __iter_records(self, filename):
+        """
+        yield records of one partition file, one after another
+
+        yields:
+        <tuple> of <bytes> JSON encoded index_key, <int> number of rows, <array> timestamps and columns
+        """
+        ncols = len(self.__datalogger.value_keynames) + 1
+        with open(filename, "rb") as infile:
+            while True:
+                header = infile.read(self.RECORD.size)
+                if not header:
+                    break
+                key_length, rows = self.RECORD.unpack(header)
+                key_data = infile.read(key_length)
+                data = array("d")
+                data.fromfile(infile, rows * ncols)
+                yield key_data, rows, data
+
+    def __read_partition(self, filename):
+        """
+        read one partition file
+
+        returns:
+        <dict> index_key : <list> of <array> blocks in order of raw input
+        """
+        blocks = {}
+        for key_data, _, data in self.__iter_records(filename):
+            index_key = tuple(json.loads(key_data.decode("utf-8")))
+            try:
+                blocks[index_key].append(data)
+            except KeyError:
+                blocks[index_key] = [data, ]
+        return blocks
+
+    def __iter_partitions(self, filenames):
+        """
+        yield filenames of partition files, which fit in memory_budget,
+        bigger ones are split first, a partition with a single index_key
+        bigger than memory_budget could not be split and is yielded anyway
+        """
+        max_size = self.__memory_budget // self.PARTITION_FACTOR
+        pending = [(filename, 1) for filename in reversed(filenames)]
+        while pending:
+            filename, depth = pending.pop()
+            size = os.stat(filename).st_size
+            if size > max_size:
+                subfilenames = self.__split(filename, depth)
+                if len(subfilenames) > 1:
+                    logging.info("partition %s of %d bytes split into %d partitions", filename, size, len(subfilenames))
+                    pending.extend((subfilename, depth + 1) for subfilename in reversed(subfilenames))
+                    continue
+                filename = subfilenames[0]
+                logging.warning("partition %s of %d bytes could not be split and does not fit in memory_budget %d", filename, size, self.__memory_budget)
+            yield filename
+
+    def __iter_timeseries(self, filenames, stats, counts):
+        """
+        yield stored Timeseries of every index_key, partition by partition,
+        TimeseriesStats of converted Timeseries are collected in stats
+        """
+        datalogger = self.__datalogger
+        nvalues = len(datalogger.value_keynames)
+        for filename in self.__iter_partitions(filenames):
+            blocks = self.__read_partition(filename)
+            os.unlink(filename) # free disk space early
+            counts["partitions"] += 1
+            for index_key in sorted(blocks.keys()):
+                # values stay in arrays of doubles, lists would need four times the memory
+                times = array("d")
+                columns = [array("d") for _ in range(nvalues)]
+                for data in blocks.pop(index_key):
+                    rows = len(data) // (nvalues + 1)
+                    times.extend(data[:rows])
+                    for number, column in enumerate(columns, 1):
+                        column.extend(data[number * rows:(number + 1) * rows])
+                # rows of one index_key could be spread over many chunks in any order
+                times, columns, reordered, duplicates = datalogger.sort_unique(times, columns)
+                counts["keys"] += 1
+                counts["rows"] += len(times)
+                counts["reordered"] += reordered
+                counts["duplicates"] += duplicates
+                tsa = TimeseriesArray(datalogger.index_keynames, datalogger.value_keynames, datatypes=datalogger.datatypes, columnar=datalogger.columnar)
+                tsa.add_columns(index_key, times, columns)
+                del times, columns
+                if not datalogger.converted_cache:
+                    # stored raw, converted in place afterwards
+                    yield index_key, tsa[index_key]
+                tsa.convert_datatypes()
+                try:
+                    stats[index_key] = TimeseriesStats(tsa[index_key])
+                except TimeseriesEmptyError:
+                    logging.info("Timeseries for key %s is length zero, skipping", index_key)
+                if datalogger.converted_cache:
+                    yield index_key, tsa[index_key]
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+functions to serialize big responses incrementally
+
+every function takes an iterable and returns a generator of chunks,
+nothing is collected in memory beyond one chunk of about chunksize
+bytes, so web frontends can send data as soon as the first chunk is
+ready (chunked transfer encoding)
+"""
+import json
+import zlib
+
+CHUNKSIZE = 64 * 1024 # bytes, approximate size of yielded chunks
+
+def buffered(parts, chunksize=CHUNKSIZE):
+    """
+    join small parts to chunks of at least chunksize characters
+
+    parameters:
+    parts <iterable> of <str>
+    chunksize <int>
+
+    returns:
+    <generator> of <str>
+    """
+    buf = []
+    size = 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= chunksize:
+            yield "".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield "".join(buf)
+
+def iter_json(data):
+    """
+    serialize data to JSON piece by piece, dicts and lists are
+    serialized item by item, generators are serialized as list
+    without creating the list
+
+    parameters:
+    data <object> json encodable, generators are allowed at any level
+
+    returns:
+    <generator> of <str> parts of JSON document
+    """
+    if isinstance(data, dict):
+        yield "{"
+        for number, (key, value) in enumerate(data.items()):
+            yield "%s%s: " % (", " if number else "", json.dumps(key))
+            for part in iter_json(value):
+                yield part
+        yield "}"
+    elif isinstance(data, (list, tuple)) or hasattr(data, "__next__") or hasattr(data, "next"):
+        yield "["
+        for number, value in enumerate(data):
+            if number:
+                yield ", "
+            for part in iter_json(value):
+                yield part
+        yield "]"
+    else:
+        yield json.dumps(data)
+
+def json_chunks(data, chunksize=CHUNKSIZE):
+    """
+    return JSON document of data in chunks
+
+    parameters:
+    data <object> json encodable, generators are allowed at any level
+    chunksize <int>
+
+    returns:
+    <generator> of <str>
+    """
+    return buffered(iter_json(data), chunksize)
+
+def csv_chunks(lines, delimiter=",", chunksize=CHUNKSIZE):
+    """
+    return csv document in chunks
+
+    parameters:
+    lines <iterable> of <str> lines without line ending or of <tuple> of values
+    delimiter <str> to join tuples
+    chunksize <int>
+
+    returns:
+    <generator> of <str>
+    """
+    def iter_lines():
+        """every line with line ending"""
+        for line in lines:
+            if isinstance(line, tuple):
+                line = delimiter.join((str(value) for value in line))
+            yield line + "\n"
+    return buffered(iter_lines(), chunksize)
+
+def gzip_chunks(chunks, compresslevel=6):
+    """
+    compress chunks to one gzip stream, compression is done chunk by chunk
+
+    parameters:
+    chunks <iterable> of <str> or <bytes>
+    compresslevel <int> 1 to 9
+
+    returns:
+    <generator> of <bytes> gzip data
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip header and trailer
+    for chunk in chunks:
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode("utf-8")
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -39,6 +39,33 @@ class Test(unittest.TestCase):
         assert len(tsa_total) == 1
         print(tsa_total[()])
 
+    def test_tsa_aggregate(self):
+        tsa = TimeseriesArray.load("testdata/fcIfC3AccountingTable", ["hostname", "ifDescr"], datatypes={})
+        start_ts, _ = DataLogger.get_ts_for_datestring("2018-04-01")
+        # reference, all rows of one hostname in aligned time slots
+        slots = {}
+        for key in tsa.keys():
+            for row in tsa[key]:
+                slot = float(round(start_ts + round((row[0] - start_ts) / 300) * 300))
+                slots.setdefault((key[0], ), {}).setdefault(slot, []).append(row[1:])
+        tsa_grouped = Advanced.tsa_aggregate(tsa, "2018-04-01", ("hostname", ), 300, aggregations=("sum", "max", "count"))
+        assert sorted(tsa_grouped.keys()) == sorted(slots.keys())
+        assert tsa_grouped.value_keynames[:3] == ["index_sum", "index_max", "index_count"]
+        for key, rows in slots.items():
+            times = sorted(rows.keys())
+            assert list(tsa_grouped[key].get_column("ts")) == times
+            for colnum, value_keyname in enumerate(tsa.value_keynames):
+                assert list(tsa_grouped[key].get_serie(value_keyname + "_max")) == [max((row[colnum] for row in rows[slot])) for slot in times]
+                assert list(tsa_grouped[key].get_serie(value_keyname + "_count")) == [float(len(rows[slot])) for slot in times]
+                for value, expected in zip(tsa_grouped[key].get_serie(value_keyname + "_sum"), [sum((row[colnum] for row in rows[slot])) for slot in times]):
+                    self.assertAlmostEqual(value, expected, delta=1e-9 * max(1.0, abs(expected)))
+        # single aggregation keeps value_keynames, also usable by tsa_group_by
+        tsa_total = Advanced.tsa_group_by(tsa, "2018-04-01", index_keynames=(), group_func="avg", interval=300)
+        assert list(tsa_total.keys()) == [()]
+        assert tsa_total.value_keynames == tsa.value_keynames
+        with self.assertRaises(KeyError):
+            Advanced.tsa_aggregate(tsa, "2018-04-01", (), 300, aggregations=("median", ))
+
     def test_tsastats_group_by(self):
         dl = DataLogger("testdata")
         dl.setup("sanportperf", "fcIfC3AccountingTable", "2018-04-01")
@@ -55,6 +82,24 @@ class Test(unittest.TestCase):
         assert isinstance(tsastats_total[('__total__',)], TimeseriesStats)
         print(tsastats_total[('__total__',)])
 
+    def test_tsastats_group_by_merged(self):
+        tsa = TimeseriesArray.load("testdata", ["hostname"], datatypes={})
+        tsastats = TimeseriesArrayStats(tsa)
+        tsastats_total = Advanced.tsastats_group_by(tsastats, index_keynames=())
+        assert list(tsastats_total.keys()) == [("__total__", )]
+        total = tsastats_total[("__total__", )]
+        for value_keyname in tsa.value_keynames:
+            # the same as calculated from all values together
+            values = [value for key in tsa.keys() for value in tsa[key].get_serie(value_keyname)]
+            assert total[value_keyname]["count"] == len(values)
+            assert total[value_keyname]["min"] == min(values)
+            assert total[value_keyname]["max"] == max(values)
+            self.assertAlmostEqual(total[value_keyname]["avg"], sum(values) / len(values), delta=1e-9 * max(1.0, abs(total[value_keyname]["avg"])))
+        # grouping by all index_keynames changes nothing
+        tsastats_grouped = Advanced.tsastats_group_by(tsastats, index_keynames=("hostname", ))
+        assert sorted(tsastats_grouped.keys()) == sorted(tsastats.keys())
+        assert tsastats_grouped.index_keynames == ("hostname", )
+
     def test_get_scatterdata(self):
         dl = DataLogger("testdata")
         dl.setup("sanportperf", "fcIfC3AccountingTable", "2018-04-01")
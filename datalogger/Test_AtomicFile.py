@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import os
+import shutil
+import tempfile
+import threading
+# own modules
+from AtomicFile import atomic_open as atomic_open
+from AtomicFile import get_tmpfilename as get_tmpfilename
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, "test.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_atomic_open(self):
+        with atomic_open(self.filename) as outfile:
+            outfile.write("complete")
+            assert not os.path.isfile(self.filename)
+        with open(self.filename, "rt") as infile:
+            assert infile.read() == "complete"
+        # broken writes leave the old file untouched
+        with self.assertRaises(ValueError):
+            with atomic_open(self.filename) as outfile:
+                outfile.write("partial")
+                raise ValueError("broken")
+        with open(self.filename, "rt") as infile:
+            assert infile.read() == "complete"
+        assert os.listdir(self.tempdir) == ["test.json"]
+
+    def test_get_tmpfilename(self):
+        tmpfilenames = [get_tmpfilename(self.filename)]
+        thread = threading.Thread(target=lambda: tmpfilenames.append(get_tmpfilename(self.filename)))
+        thread.start()
+        thread.join()
+        assert tmpfilenames[0] != tmpfilenames[1]
+        assert all((tmpfilename.startswith(self.filename) for tmpfilename in tmpfilenames))
+
+    def test_threads(self):
+        def write(number):
+            with atomic_open(self.filename, "wb") as outfile:
+                for _ in range(100):
+                    outfile.write(str(number).encode("ascii") * 1024)
+        threads = [threading.Thread(target=write, args=(number, )) for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(self.filename, "rb") as infile:
+            data = infile.read()
+        # one complete write wins
+        assert len(data) == 100 * 1024 and len(set(data)) == 1
+        assert os.listdir(self.tempdir) == ["test.json"]
+
+
+if __name__ == "__main__":
+    unittest.main()
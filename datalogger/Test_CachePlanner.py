@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import os
+import time
+# own modules
+from DataLogger import DataLogger as DataLogger
+from CachePlanner import CachePlanner as CachePlanner
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.datalogger = DataLogger("testdata")
+        self.datalogger.setup("mysql", "performance", "2018-04-01")
+        self.planner = CachePlanner(self.datalogger)
+
+    def test_plan_run(self):
+        self.datalogger.delete_caches()
+        assert self.planner.plan() == [["tsa"], ["tsastats"], ["quantile", "total_stats"]]
+        timings = self.planner.run()
+        assert sorted(timings.keys()) == sorted(CachePlanner.stages.keys())
+        assert self.planner.plan() == []
+        assert self.planner.run() == {}
+        status = self.planner.get_status()
+        assert all((status[stage]["exists"] for stage in CachePlanner.stages))
+        # outdated tsastats, only the stages depending on it
+        filename = status["tsastats"]["filename"]
+        os.utime(filename, (time.time() + 10, time.time() + 10))
+        assert self.planner.plan() == [["quantile", "total_stats"]]
+        assert self.planner.plan(rebuild=("tsastats", )) == [["tsastats"], ["quantile", "total_stats"]]
+        assert sorted(self.planner.run(rebuild=("tsastats", )).keys()) == ["quantile", "total_stats", "tsastats"]
+        assert self.planner.plan() == []
+        assert self.datalogger["tsastats"].keys()
+
+    def test_add_stage(self):
+        self.assertRaises(KeyError, CachePlanner.add_stage, "extra", ("unknown", ), None, "build_extra")
+        extrafilename = os.path.join(self.datalogger.cachedir, "extra.json")
+        def build_extra():
+            with open(extrafilename, "wt") as outfile:
+                outfile.write("{}")
+        self.datalogger.build_extra = build_extra
+        self.planner.run()
+        CachePlanner.add_stage("extra", ("tsastats", ), lambda datalogger: os.path.join(datalogger.cachedir, "extra.json"), "build_extra")
+        try:
+            # new stage is built from existing caches, without reading raw data again
+            assert self.planner.plan() == [["extra"]]
+            assert list(self.planner.run().keys()) == ["extra"]
+            assert self.planner.plan() == []
+        finally:
+            del CachePlanner.stages["extra"]
+            os.unlink(extrafilename)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import io
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from CorrelationMatrix import CorrelationMatrix as CorrelationMatrix
+from CorrelationMatrix import CorrelationMatrixArray as CorrelationMatrixArray
+from CorrelationMatrix import get_mse_sorted_norm as get_mse_sorted_norm
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tsa = TimeseriesArray.load("testdata", ["hostname"], datatypes={})
+        self.keys = list(self.tsa.keys())
+        self.value_key = "com_select"
+
+    def reference(self, value_key):
+        """every pair calculated with get_mse_sorted_norm, the later key is normalizing"""
+        matrix = dict(((key, {}) for key in self.keys))
+        for position, key in enumerate(self.keys):
+            for otherkey in self.keys[position:]:
+                matrix[key][otherkey] = matrix[otherkey][key] = get_mse_sorted_norm(self.tsa[otherkey][value_key], self.tsa[key][value_key])
+        return matrix
+
+    def assert_rows(self, rows, reference):
+        for key, row in rows.items():
+            for otherkey, mse in row.items():
+                self.assertAlmostEqual(mse, reference[key][otherkey], delta=1e-9 * max(1.0, reference[key][otherkey]))
+
+    def test_matrix(self):
+        cm = CorrelationMatrix(self.tsa, self.value_key)
+        reference = self.reference(self.value_key)
+        assert sorted(cm.keys()) == sorted(self.keys)
+        assert all((len(cm[key]) == len(self.keys) for key in self.keys))
+        self.assert_rows(cm.data, reference)
+        assert cm[self.keys[0], self.keys[1]] == cm[self.keys[1], self.keys[0]]
+        assert CorrelationMatrix.loads(cm.dumps()) == cm
+
+    def test_topk(self):
+        cm = CorrelationMatrix(self.tsa, self.value_key, topk=2)
+        reference = self.reference(self.value_key)
+        for key in self.keys:
+            assert len(cm[key]) == 2
+            assert key not in cm[key]
+            expected = sorted((mse for otherkey, mse in reference[key].items() if otherkey != key))[:2]
+            for mse, expected_mse in zip(cm[key].values(), expected):
+                self.assertAlmostEqual(mse, expected_mse, delta=1e-9 * max(1.0, expected_mse))
+
+    def test_stream(self):
+        cm = CorrelationMatrix(self.tsa, self.value_key)
+        for topk in (None, 2):
+            outfile = io.StringIO()
+            assert CorrelationMatrix.stream(self.tsa, self.value_key, outfile, topk=topk, chunksize=2) == len(self.keys)
+            outfile.seek(0)
+            rows = dict(CorrelationMatrix.load_rows(outfile))
+            assert sorted(rows.keys()) == sorted(self.keys)
+            self.assert_rows(rows, cm.data)
+            if topk is None:
+                assert rows == cm.data
+
+    def test_array(self):
+        cma = CorrelationMatrixArray(self.tsa)
+        assert sorted(cma.keys()) == sorted(self.tsa.value_keynames)
+        assert cma[self.value_key] == CorrelationMatrix(self.tsa, self.value_key)
+        outfile = io.StringIO()
+        cma.dump(outfile)
+        outfile.seek(0)
+        assert CorrelationMatrixArray.load(outfile) == cma
+
+
+if __name__ == "__main__":
+    unittest.main()
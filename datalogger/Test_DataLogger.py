@@ -7,6 +7,9 @@ import datetime
 import gzip
 import json
 import os
+import shutil
+import tempfile
+import threading
 # own modules
 from DataLogger import DataLogger as DataLogger
 from Timeseries import Timeseries as Timeseries
@@ -101,6 +104,49 @@ class Test(unittest.TestCase):
         tsastats = dl.load_tsastats()
         #print(tsa)
 
+    def test_load_tsa_inmemory(self):
+        dl = DataLogger("testdata")
+        dl.setup("mysql", "performance", "2018-04-01")
+        dl.delete_caches()
+        # built from raw data, converted in memory, stored in background
+        tsa = dl.load_tsa()
+        tsastats = dl.load_tsastats()
+        DataLogger.wait_dumps()
+        assert tsa == dl.load_tsa()
+        assert tsa == dl.load_tsa_raw().get_converted()
+        assert sorted(tsastats.keys()) == sorted(dl.load_tsastats().keys())
+        assert not [filename for filename in os.listdir(dl.cachedir) if filename.endswith(".tmp")]
+        # filtered results without stored caches
+        key = list(tsa.keys())[0]
+        dl.delete_caches()
+        assert list(dl.load_tsa(filterkeys={"hostname" : key[0]}).keys()) == [key]
+        assert list(dl.load_tsastats(filterkeys={"hostname" : key[0]}).keys()) == [key]
+        DataLogger.wait_dumps()
+        assert tsa == dl.load_tsa()
+
+    def test_load_tsa_threads(self):
+        dl = DataLogger("testdata")
+        dl.setup("mysql", "performance", "2018-04-01")
+        dl.delete_caches()
+        # raw data is read only once, if many threads need the same cache
+        calls = []
+        load_tsa_raw = dl.load_tsa_raw
+        def counting_load_tsa_raw():
+            calls.append(threading.current_thread().name)
+            return load_tsa_raw()
+        dl.load_tsa_raw = counting_load_tsa_raw
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(dl.load_tsastats())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        DataLogger.wait_dumps()
+        assert len(calls) == 1
+        assert len(results) == 4
+        assert all((sorted(tsastats.keys()) == sorted(results[0].keys()) for tsastats in results))
+        assert not [filename for filename in os.listdir(dl.cachedir) if filename.endswith(".tmp")]
+
     def test_load_quantiles(self):
         dl = DataLogger("testdata")
         dl.setup("sanportperf", "fcIfC3AccountingTable", "2018-04-01")
@@ -121,6 +167,33 @@ class Test(unittest.TestCase):
         tsa = dl.load_tsa()
         print(dl.get_caches())
 
+    def test_cache_generation(self):
+        basedir, meta = self.create_basedir({"value" : "asis"})
+        try:
+            dl = DataLogger(basedir)
+            dl.setup("test", "table", "2018-04-02")
+            cachedir = os.path.join(basedir, "cache", "2018-04-02")
+            assert dl.cache_generation == "0"
+            assert not os.path.exists(cachedir) # not created
+            dl.setup("test", "table", "2018-04-01")
+            with dl.load_tsa():
+                pass
+            assert dl.cache_generation != "0"
+            # generation of response cache entries
+            assert dl.get_generation(["test", "table", "2018-04-01", "a2V5"], 300) == dl.cache_generation
+            generation = dl.get_generation(["test", "table", "2018-03-31", "2018-04-02", "a2V5"], 300)
+            assert generation == dl.get_range_generation("2018-03-31", "2018-04-02")
+            assert generation != dl.get_range_generation("2018-04-02", "2018-04-02") # without the day with caches
+            assert dl.get_generation(["test", "table", "2018-04-01", datetime.date.today().isoformat()], 10 ** 9) == "1" # time based
+            assert dl.get_generation(["test", "unknown", "2018-04-01"], 10 ** 9) == "1"
+            # days without data are skipped, without creating cache directories
+            dl.setup("test", "table", "2018-04-01")
+            assert dl.update_rollups() == ["2018-W13", "2018-04", "2018"]
+            assert dl.get_tsastats_longtime("2018-03-25", "2018-04-02", ("host1", ), "value", "max") == [["2018-04-01", 10.0]]
+            assert sorted(os.listdir(os.path.join(basedir, "cache"))) == ["2018-04-01", "rollup"]
+        finally:
+            shutil.rmtree(basedir)
+
     def test_total_stats(self):
         dl = DataLogger("testdata")
         dl.setup("mysql", "performance", "2018-04-01")
@@ -128,6 +201,50 @@ class Test(unittest.TestCase):
         total_stats = dl.load_total_stats()
         print(json.dumps(total_stats, indent=4))
 
+    def test_rollups(self):
+        dl = DataLogger("testdata")
+        dl.setup("mysql", "performance", "2018-04-01")
+        key = ("nagios.tilak.cc",)
+        daily = dl.get_tsastats_longtime("2018-03-01", "2018-04-30", key, "uptime", "max")
+        assert daily == [["2018-04-01", dl["tsastats", key]["uptime"]["max"]]]
+        assert dl.update_rollups() == ["2018-W13", "2018-04", "2018"]
+        for datestring_start, datestring_stop, expected in (
+                ("2018-03-20", "2018-04-01", ["2018-03-%02d" % day for day in range(20, 26)] + ["2018-W13"]),
+                ("2018-03-26", "2018-04-30", ["2018-W13"] + ["2018-04-%02d" % day for day in range(2, 31)]),
+                ("2018-04-01", "2018-04-30", ["2018-04"]),
+                ("2018-01-01", "2018-12-31", ["2018"])):
+            plan = dl.get_rollup_plan(datestring_start, datestring_stop)
+            assert [periodstring for period, periodstring, rollup in plan] == expected
+            for period, periodstring, rollup in plan:
+                if rollup is not None:
+                    rollup.close()
+        assert dl.get_tsastats_longtime("2018-03-01", "2018-04-30", key, "uptime", "max") == daily
+        # merged from rollup, only one day of data
+        tsstats = dl.get_tsstats_longtime("2018-03-01", "2018-04-30", key)
+        for stat_func_name in ("min", "max", "count", "sum", "median", "first", "last"):
+            assert tsstats["uptime"][stat_func_name] == dl["tsastats", key]["uptime"][stat_func_name]
+        assert dl.get_tsstats_longtime("2018-03-01", "2018-03-20", key) is None
+        hc_data = dl.get_tsastats_longtime_hc("2018-04", key, "uptime")
+        assert hc_data["max"] == [("2018-04-01", daily[0][1])]
+        shutil.rmtree(dl.rollupdir)
+
+    def test_load_grid(self):
+        dl = DataLogger("testdata")
+        dl.setup("mysql", "performance", "2018-04-01")
+        grid = dl.load_grid(fill="previous")
+        start_ts, stop_ts = dl.get_ts_for_datestring(dl.datestring)
+        assert grid.start_ts == round(start_ts)
+        assert len(grid.times) == 288
+        assert grid.times[-1] <= stop_ts
+        assert sorted(grid.keys()) == sorted(dl["tsa"].keys())
+
+    def test_get_top_n(self):
+        dl = DataLogger("testdata")
+        dl.setup("mysql", "performance", "2018-04-01")
+        top_n = dl.get_top_n("bytes_sent", "max", n=2)
+        assert top_n == dl["tsastats"].top_n("bytes_sent", "max", n=2)
+        assert top_n[0] == (("nagios.tilak.cc",), dl["tsastats", ("nagios.tilak.cc",)]["bytes_sent"]["max"])
+
     def test_raw_reader(self):
         dl = DataLogger("testdata")
         dl.setup("mysql", "performance", "2018-04-01")
@@ -136,6 +253,152 @@ class Test(unittest.TestCase):
         assert row['bytes_received'] == '272517939'
 
 
+    def test_load_tsa_raw(self):
+        dl = DataLogger("testdata")
+        dl.setup("mysql", "performance", "2018-04-01")
+        tsa = dl.load_tsa_raw()
+        tsa_rowwise = dl.load_tsa_raw_rowwise()
+        assert list(tsa.keys()) == list(tsa_rowwise.keys())
+        for key in tsa.keys():
+            assert tsa[key].data == tsa_rowwise[key].data
+        # a lot of small chunks
+        dl.raw_chunksize = 2048
+        tsa = dl.load_tsa_raw()
+        for key in tsa.keys():
+            assert tsa[key].data == tsa_rowwise[key].data
+
+    def test_load_tsa_raw_malformed(self):
+        basedir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(basedir, "cache"))
+            os.makedirs(os.path.join(basedir, "test", "meta"))
+            os.makedirs(os.path.join(basedir, "test", "raw"))
+            with open(os.path.join(basedir, "datalogger.json"), "wt") as outfile:
+                json.dump({"user" : "nobody", "group" : "nogroup", "cachedir" : "cache", "projects" : {"test" : {"table" : "1"}}}, outfile)
+            with open(os.path.join(basedir, "test", "meta", "table.json"), "wt") as outfile:
+                json.dump({"blacklist" : [], "delimiter" : "\t", "headers" : ["ts", "hostname", "value"], "index_keynames" : ["hostname"], "interval" : 300, "ts_keyname" : "ts", "value_keynames" : {"value" : "asis"}}, outfile)
+            start_ts, _ = DataLogger.get_ts_for_datestring("2018-04-01")
+            start_ts = int(start_ts) + 60
+            with open(os.path.join(basedir, "test", "raw", "table_2018-04-01.csv"), "wt") as outfile:
+                outfile.write("ts\thostname\tvalue\n")
+                outfile.write("%d\thost1\t1.0\n" % start_ts)
+                outfile.write("# comment\n")
+                outfile.write("%d\thost1\t9.0\n" % start_ts) # duplicate timestamp
+                outfile.write("%d\thost2\t2,5\n" % (start_ts + 300)) # comma as decimal point
+                outfile.write("%d\thost1\n" % (start_ts + 600)) # missing column
+                outfile.write("%d\thost1\tnothing\n" % (start_ts + 600)) # not numeric
+                outfile.write("%d\thost1\t3.0\n" % (start_ts + 900))
+                outfile.write("%d\thost1\t4.0\n" % (start_ts - 300)) # other day
+            dl = DataLogger(basedir)
+            dl.setup("test", "table", "2018-04-01")
+            tsa = dl.load_tsa_raw()
+            tsa_rowwise = dl.load_tsa_raw_rowwise()
+            assert list(tsa.keys()) == [("host1", ), ("host2", )]
+            assert tsa[("host1", )].data == [[float(start_ts), 1.0], [float(start_ts + 900), 3.0]]
+            assert tsa[("host2", )].data == [[float(start_ts + 300), 2.5]]
+            for key in tsa.keys():
+                assert tsa[key].data == tsa_rowwise[key].data
+        finally:
+            shutil.rmtree(basedir)
+
+    def test_sort_unique(self):
+        times = [1.0, 2.0, 3.0]
+        columns = [[1.0, 2.0, 3.0]]
+        assert DataLogger.sort_unique(times, columns) == (times, columns, 0, 0)
+        # interleaved rows of threaded getters, the first of duplicate timestamps wins
+        times = [1.0, 3.0, 2.0, 4.0, 3.0, 0.5]
+        columns = [[1.0, 3.0, 2.0, 4.0, 9.0, 0.5], [10.0, 30.0, 20.0, 40.0, 90.0, 5.0]]
+        assert DataLogger.sort_unique(times, columns) == ([0.5, 1.0, 2.0, 3.0, 4.0], [[0.5, 1.0, 2.0, 3.0, 4.0], [5.0, 10.0, 20.0, 30.0, 40.0]], 2, 1)
+
+    def test_load_tsa_raw_unordered(self):
+        basedir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(basedir, "cache"))
+            os.makedirs(os.path.join(basedir, "test", "meta"))
+            os.makedirs(os.path.join(basedir, "test", "raw"))
+            with open(os.path.join(basedir, "datalogger.json"), "wt") as outfile:
+                json.dump({"user" : "nobody", "group" : "nogroup", "cachedir" : "cache", "projects" : {"test" : {"table" : "1"}}}, outfile)
+            with open(os.path.join(basedir, "test", "meta", "table.json"), "wt") as outfile:
+                json.dump({"blacklist" : [], "delimiter" : "\t", "headers" : ["ts", "hostname", "value"], "index_keynames" : ["hostname"], "interval" : 300, "ts_keyname" : "ts", "value_keynames" : {"value" : "asis"}}, outfile)
+            start_ts, _ = DataLogger.get_ts_for_datestring("2018-04-01")
+            start_ts = int(start_ts) + 60
+            with open(os.path.join(basedir, "test", "raw", "table_2018-04-01.csv"), "wt") as outfile:
+                outfile.write("ts\thostname\tvalue\n")
+                for offset, hostname, value in ((0, "host1", 1.0), (600, "host1", 3.0), (0, "host2", 1.0), (300, "host1", 2.0), (600, "host1", 9.0), (900, "host1", 4.0), (300, "host2", 2.0)):
+                    outfile.write("%d\t%s\t%s\n" % (start_ts + offset, hostname, value))
+            dl = DataLogger(basedir)
+            dl.setup("test", "table", "2018-04-01")
+            for tsa in (dl.load_tsa_raw(), dl.load_tsa_raw_rowwise()):
+                assert tsa[("host1", )].data == [[float(start_ts + offset), value] for offset, value in ((0, 1.0), (300, 2.0), (600, 3.0), (900, 4.0))]
+                assert tsa[("host2", )].data == [[float(start_ts), 1.0], [float(start_ts + 300), 2.0]]
+                assert dl.raw_counts == {"rows" : 6, "reordered" : 1, "duplicates" : 1}
+        finally:
+            shutil.rmtree(basedir)
+
+    @staticmethod
+    def create_basedir(value_keynames, converted_cache=True):
+        """
+        return temporary basedir with project test, tablename table and
+        raw input of one index_key for 2018-04-01, and the meta data of table
+        """
+        basedir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(basedir, "cache"))
+        os.makedirs(os.path.join(basedir, "test", "meta"))
+        os.makedirs(os.path.join(basedir, "test", "raw"))
+        with open(os.path.join(basedir, "datalogger.json"), "wt") as outfile:
+            json.dump({"user" : "nobody", "group" : "nogroup", "cachedir" : "cache", "converted_cache" : converted_cache, "projects" : {"test" : {"table" : "1"}}}, outfile)
+        meta = {"blacklist" : [], "delimiter" : "\t", "headers" : ["ts", "hostname", "value"], "index_keynames" : ["hostname"], "interval" : 300, "ts_keyname" : "ts", "value_keynames" : value_keynames}
+        with open(os.path.join(basedir, "test", "meta", "table.json"), "wt") as outfile:
+            json.dump(meta, outfile)
+        start_ts, _ = DataLogger.get_ts_for_datestring("2018-04-01")
+        start_ts = int(start_ts) + 60
+        with open(os.path.join(basedir, "test", "raw", "table_2018-04-01.csv"), "wt") as outfile:
+            outfile.write("ts\thostname\tvalue\n")
+            for offset, value in ((0, 1.0), (300, 4.0), (600, 10.0)):
+                outfile.write("%d\thost1\t%s\n" % (start_ts + offset, value))
+        return basedir, meta
+
+    def test_load_tsa_fallback(self):
+        for converted_cache in (False, True):
+            basedir, meta = self.create_basedir({"value" : "derive"}, converted_cache)
+            try:
+                dl = DataLogger(basedir)
+                dl.setup("test", "table", "2018-04-01")
+                expected = dl.load_tsa_raw().get_converted()[("host1", )].get_serie("value")
+                with dl.load_tsa(filterkeys={"hostname" : "host2"}) as tsa: # built, converted in place
+                    assert tsa.converted and len(tsa) == 0
+                dl.wait_dumps()
+                with dl.load_tsa() as tsa: # stored
+                    assert tsa[("host1", )].get_serie("value") == expected
+                dl.delete_caches()
+                with dl.load_tsa() as tsa:
+                    assert tsa[("host1", )].get_serie("value") == expected
+            finally:
+                shutil.rmtree(basedir)
+
+    def test_load_tsa_datatypes_changed(self):
+        basedir, meta = self.create_basedir({"value" : "asis"})
+        try:
+            dl = DataLogger(basedir)
+            dl.setup("test", "table", "2018-04-01")
+            with dl.load_tsa():
+                pass
+            with dl.load_tsa() as tsa: # stored converted to asis
+                assert tsa[("host1", )].get_serie("value") == (1.0, 4.0, 10.0)
+            meta["value_keynames"] = {"value" : "derive"}
+            with open(os.path.join(basedir, "test", "meta", "table.json"), "wt") as outfile:
+                json.dump(meta, outfile)
+            dl = DataLogger(basedir)
+            dl.setup("test", "table", "2018-04-01")
+            expected = dl.load_tsa_raw().get_converted()[("host1", )].get_serie("value")
+            assert expected != (1.0, 4.0, 10.0)
+            with dl.load_tsa() as tsa: # rebuilt from raw data
+                assert tsa[("host1", )].get_serie("value") == expected
+            with dl.load_tsa() as tsa: # stored converted to the new datatypes
+                assert tsa[("host1", )].get_serie("value") == expected
+        finally:
+            shutil.rmtree(basedir)
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
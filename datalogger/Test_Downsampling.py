@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import math
+# own modules
+import Downsampling
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.times = [float(number * 60) for number in range(1440)]
+        self.values = [math.sin(number / 100.0) * 10 + (number % 7) for number in range(1440)]
+        # one peak, which has to survive
+        self.values[700] = 100.0
+
+    def test_lttb(self):
+        times, values = Downsampling.lttb(self.times, self.values, 100)
+        assert len(times) == len(values) == 100
+        assert times[0] == self.times[0] and times[-1] == self.times[-1]
+        assert times == sorted(times)
+        assert all((self.values[int(ts / 60)] == value for ts, value in zip(times, values)))
+        assert 100.0 in values
+        # nothing to reduce
+        assert Downsampling.lttb(self.times[:50], self.values[:50], 100) == (self.times[:50], self.values[:50])
+
+    def test_minmax(self):
+        times, values = Downsampling.minmax(self.times, self.values, 100)
+        assert len(times) <= 100
+        assert times == sorted(times)
+        assert max(values) == max(self.values)
+        assert min(values) == min(self.values)
+        assert all((self.values[int(ts / 60)] == value for ts, value in zip(times, values)))
+
+    def test_downsample(self):
+        assert Downsampling.downsample(self.times, self.values, 100) == Downsampling.lttb(self.times, self.values, 100)
+        assert Downsampling.downsample(self.times, self.values, "100", "minmax") == Downsampling.minmax(self.times, self.values, 100)
+        self.assertRaises(KeyError, Downsampling.downsample, self.times, self.values, 100, "unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
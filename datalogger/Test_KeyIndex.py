@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import json
+# own modules
+from KeyIndex import KeyIndex as KeyIndex
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.index_keynames = ("hostname", "ifDescr")
+        filenames = TimeseriesArray.get_ts_filenames("testdata/fcIfC3AccountingTable", self.index_keynames)
+        self.keys = sorted(filenames.keys())
+        self.key_index = KeyIndex(self.index_keynames, self.keys)
+
+    def filtermatch(self, filterkeys, matchtype, prefix=False):
+        """reference result, testing every key"""
+        return [key for key in self.keys if TimeseriesArray.filtermatch(dict(zip(self.index_keynames, key)), filterkeys, matchtype, prefix)]
+
+    def test_match(self):
+        for filterkeys in ({"hostname" : "fca-sr2-8gb-21"}, {"hostname" : "fca-sr2-8gb-21", "ifDescr" : None}, {"hostname" : None, "ifDescr" : "port-channel 1"}, {"hostname" : "fca-sr2-8gb-21", "ifDescr" : "port-channel 1"}, {"hostname" : "unknown"}, {"hostname" : None}):
+            for matchtype in ("and", "or"):
+                assert self.key_index.match(filterkeys, matchtype) == self.filtermatch(filterkeys, matchtype)
+        assert len(self.key_index.match({"hostname" : "fca-sr2-8gb-21"})) > 0
+        assert len(self.key_index.match({"hostname" : None})) == len(self.keys)
+        assert self.key_index.match({"hostname" : None}, "or") == []
+
+    def test_prefix(self):
+        for filterkeys in ({"hostname" : "fca-sr2"}, {"hostname" : "fca-sr2", "ifDescr" : "port-channel"}, {"hostname" : ""}, {"hostname" : "zzz"}):
+            for matchtype in ("and", "or"):
+                assert self.key_index.match(filterkeys, matchtype, prefix=True) == self.filtermatch(filterkeys, matchtype, prefix=True)
+        assert 0 < len(self.key_index.match({"hostname" : "fca-sr2"}, prefix=True)) < len(self.keys)
+
+    def test_to_data(self):
+        data = json.loads(json.dumps(self.key_index.to_data()))
+        key_index = KeyIndex(self.index_keynames, self.keys, data)
+        assert key_index.match({"hostname" : "fca-sr2-8gb-21"}) == self.key_index.match({"hostname" : "fca-sr2-8gb-21"})
+        assert key_index.values("hostname") == sorted(set((key[0] for key in self.keys)))
+        with self.assertRaises(KeyError):
+            key_index.match({"unknown" : "value"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+# own modules
+from LRUCache import LRUCache as LRUCache
+
+
+class Test(unittest.TestCase):
+
+    def test_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1 # a is now most recently used
+        cache.put("c", 3)
+        assert "b" not in cache
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert len(cache) == 2
+        assert cache.stats == {"entries" : 2, "bytes" : 0, "hits" : 3, "misses" : 1, "evictions" : 1}
+
+    def test_max_bytes(self):
+        cache = LRUCache(max_bytes=100)
+        cache.put("a", 1, 40)
+        cache.put("b", 2, 40)
+        cache.put("a", 3, 50) # replaces a, a is most recently used
+        assert cache.nbytes == 90
+        cache.put("c", 4, 30)
+        assert "b" not in cache and cache.get("a") == 3
+        assert cache.nbytes == 80
+        cache.put("d", 5, 101) # too big, not stored
+        assert "d" not in cache and cache.nbytes == 80
+        cache.pop("a")
+        assert cache.nbytes == 30
+        cache.clear()
+        assert len(cache) == 0 and cache.nbytes == 0
+        assert cache.evictions == 1
+
+    def test_no_budget(self):
+        with self.assertRaises(ValueError):
+            LRUCache()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import os
+import shutil
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from Quantile import QuantileArray as QuantileArray
+from Quantile import Quantile as Quantile
+from CustomExceptions import *
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tsa = TimeseriesArray.load("testdata/fcIfC3AccountingTable", ["hostname", "ifDescr"], datatypes={})
+        self.tsastats = TimeseriesArrayStats(self.tsa)
+        self.outdir = "testdata/quantile_test"
+
+    def tearDown(self):
+        if os.path.isdir(self.outdir):
+            shutil.rmtree(self.outdir)
+
+    def test_histogram(self):
+        assert Quantile.histogram([0.0, 10.0, 50.0, 99.0, 100.0], 0.0, 100.0) == {0 : 2, 1 : 0, 2 : 1, 3 : 0, 4 : 2}
+        assert Quantile.histogram([-10.0, 0.0, 10.0], -10.0, 10.0, bins=2) == {0 : 1, 1 : 2}
+        assert Quantile.histogram([1.0, 1.0], 1.0, 1.0) == {0 : 0, 1 : 0, 2 : 0, 3 : 0, 4 : 0}
+        with self.assertRaises(QuantileError):
+            Quantile.histogram([200.0], 0.0, 100.0)
+
+    def test_quantile_array(self):
+        qa = QuantileArray(self.tsa, self.tsastats)
+        assert qa.value_keynames == tuple(self.tsa.value_keynames)
+        for value_keyname in self.tsa.value_keynames:
+            # every value_keyname has to be the same as calculated alone
+            quantile = Quantile(self.tsa, value_keyname, self.tsastats)
+            assert qa[value_keyname] == quantile
+            if quantile.maxx == 0.0: # all values zero, nothing is counted
+                continue
+            for key in self.tsa.keys():
+                assert sum(quantile[key].values()) == len(self.tsa[key])
+        # tsastats will be calculated if not given
+        assert QuantileArray(self.tsa) == qa
+
+    def test_bins(self):
+        qa = QuantileArray(self.tsa, self.tsastats, bins=10)
+        key = list(self.tsa.keys())[0]
+        value_keyname = "index"
+        assert sorted(qa[value_keyname][key].keys()) == list(range(10))
+        assert sum(qa[value_keyname][key].values()) == len(self.tsa[key])
+
+    def test_dump_load(self):
+        qa = QuantileArray(self.tsa, self.tsastats)
+        os.mkdir(self.outdir)
+        qa.dump(self.outdir)
+        assert QuantileArray.load(self.outdir) == qa
+        value_keyname = self.tsa.value_keynames[0]
+        assert Quantile.loads(qa[value_keyname].dumps()) == qa[value_keyname]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import os
+import shutil
+import time
+from email.utils import formatdate
+# own modules
+from ResponseCache import ResponseCache as ResponseCache
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.cachedir = "testdata/cache/response"
+        self.cache = ResponseCache(self.cachedir, maxsize=64 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def test_put_get(self):
+        key = ResponseCache.get_key("get_tsa", ["project", "tablename", "2018-04-01"], "1")
+        assert key != ResponseCache.get_key("get_tsa", ["project", "tablename", "2018-04-01"], "2")
+        assert key != ResponseCache.get_key("get_tsastats", ["project", "tablename", "2018-04-01"], "1")
+        assert self.cache.get(key) is None
+        etag, last_modified = self.cache.put(key, u"{\"data\" : \"ä\"}")
+        assert self.cache.get(key) == (etag, last_modified, u"{\"data\" : \"ä\"}")
+        # an other object on the same directory, like in an other process
+        other = ResponseCache(self.cachedir)
+        assert other.get(key) == (etag, last_modified, u"{\"data\" : \"ä\"}")
+        # same content, same etag
+        key2 = ResponseCache.get_key("get_tsa", ["project", "tablename", "2018-04-02"])
+        assert self.cache.put(key2, b"{\"data\" : \"\xc3\xa4\"}")[0] == etag
+        assert self.cache.get(key2)[2] == b"{\"data\" : \"\xc3\xa4\"}"
+        assert self.cache.hits == 2
+        assert self.cache.misses == 1
+
+    def test_put_get_stream(self):
+        key = ResponseCache.get_key("get_ts", ["project", "tablename", "2018-04-01", "a2V5"])
+        chunks = ["[", "1, 2", ", 3", "]"]
+        # stored only after the last chunk was sent
+        stream = self.cache.put_stream(key, iter(chunks))
+        assert next(stream) == "["
+        assert self.cache.get(key) is None
+        assert list(stream) == chunks[1:]
+        etag, last_modified, data = self.cache.get(key)
+        assert data == "[1, 2, 3]"
+        assert etag == self.cache.put(key, "[1, 2, 3]")[0]
+        etag, last_modified, stream = self.cache.get_stream(key, chunksize=2)
+        assert b"".join(stream) == b"[1, 2, 3]"
+        # no open file, if the stream is not used at all
+        if os.path.isdir("/proc/self/fd"):
+            fds = len(os.listdir("/proc/self/fd"))
+            etag, last_modified, stream = self.cache.get_stream(key)
+            assert len(os.listdir("/proc/self/fd")) == fds
+        # broken stream is not stored
+        key2 = ResponseCache.get_key("get_ts", ["project", "tablename", "2018-04-02", "a2V5"])
+        stream = self.cache.put_stream(key2, iter(chunks))
+        next(stream)
+        stream.close()
+        assert self.cache.get_stream(key2) is None
+        assert os.listdir(os.path.join(self.cachedir, key2[:2])) in ([], [key]) # no temporary files left
+
+    def test_clear_while_writing(self):
+        key = ResponseCache.get_key("get_ts", ["project", "tablename", "2018-04-01", "a2V5"])
+        chunks = ["[", "1, 2", ", 3", "]"]
+        # temporary files of running writers are kept
+        stream = self.cache.put_stream(key, iter(chunks))
+        next(stream)
+        ResponseCache(self.cachedir).clear()
+        assert list(stream) == chunks[1:]
+        assert self.cache.get(key)[2] == "[1, 2, 3]"
+        # temporary file deleted anyway, the response is sent but not stored
+        self.cache.clear()
+        stream = self.cache.put_stream(key, iter(chunks))
+        next(stream)
+        for filename in os.listdir(os.path.join(self.cachedir, key[:2])):
+            os.unlink(os.path.join(self.cachedir, key[:2], filename))
+        assert list(stream) == chunks[1:]
+        assert self.cache.get(key) is None
+        # temporary files of killed writers are deleted
+        stale = os.path.join(self.cachedir, key[:2], key + ".1.1.tmp")
+        with open(stale, "wb") as outfile:
+            outfile.write(b"[")
+        os.utime(stale, (0, 0))
+        self.cache.clear()
+        assert not os.path.exists(stale)
+
+    def test_evict(self):
+        keys = [ResponseCache.get_key("get_ts", [str(number)]) for number in range(16)]
+        # big enough to hold all entries
+        filler = ResponseCache(self.cachedir, maxsize=1024 * 1024)
+        for number, key in enumerate(keys):
+            filler.put(key, "x" * 8 * 1024)
+            # set last access explicitly, filesystem timestamps may be coarse
+            os.utime(os.path.join(self.cachedir, key[:2], key), (number, number))
+        # the first entries were used recently
+        for key in keys[:2]:
+            self.cache.get(key)
+        self.cache.evict()
+        present = [key for key in keys if self.cache.get(key) is not None]
+        assert len(present) * 8 * 1024 <= self.cache.maxsize
+        assert keys[0] in present and keys[1] in present
+        assert keys[2] not in present
+        assert keys[-1] in present
+
+    def test_is_not_modified(self):
+        etag = "\"abc\""
+        last_modified = formatdate(time.time() - 60, usegmt=True)
+        assert ResponseCache.is_not_modified(etag, last_modified) is False
+        assert ResponseCache.is_not_modified(etag, last_modified, if_none_match="\"abc\"") is True
+        assert ResponseCache.is_not_modified(etag, last_modified, if_none_match="\"xyz\", \"abc\"") is True
+        assert ResponseCache.is_not_modified(etag, last_modified, if_none_match="\"xyz\"") is False
+        assert ResponseCache.is_not_modified(etag, last_modified, if_modified_since=formatdate(time.time(), usegmt=True)) is True
+        assert ResponseCache.is_not_modified(etag, last_modified, if_modified_since=formatdate(time.time() - 3600, usegmt=True)) is False
+        # If-None-Match wins
+        assert ResponseCache.is_not_modified(etag, last_modified, if_none_match="\"xyz\"", if_modified_since=formatdate(time.time(), usegmt=True)) is False
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import datetime
+import os
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from Rollup import Rollup as Rollup
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tsastats = TimeseriesArrayStats.load("testdata", ["hostname"])
+        self.stat_func_names = tuple(TimeseriesStats.stat_funcs.keys())
+        self.filename = Rollup.get_dumpfilename("testdata", "2018-W13")
+
+    def tearDown(self):
+        if os.path.isfile(self.filename):
+            os.unlink(self.filename)
+
+    def test_periods(self):
+        assert Rollup.get_periodstring("year", "2018-04-01") == "2018"
+        assert Rollup.get_periodstring("month", "2018-04-01") == "2018-04"
+        assert Rollup.get_periodstring("week", "2018-04-01") == "2018-W13"
+        assert Rollup.get_periodstring("week", "2018-12-31") == "2019-W01"
+        assert Rollup.get_period_dates("2018") == (datetime.date(2018, 1, 1), datetime.date(2018, 12, 31))
+        assert Rollup.get_period_dates("2018-02") == (datetime.date(2018, 2, 1), datetime.date(2018, 2, 28))
+        assert Rollup.get_period_dates("2018-12") == (datetime.date(2018, 12, 1), datetime.date(2018, 12, 31))
+        assert Rollup.get_period_dates("2018-W13") == (datetime.date(2018, 3, 26), datetime.date(2018, 4, 1))
+        assert Rollup.get_period_dates("2019-W01") == (datetime.date(2018, 12, 31), datetime.date(2019, 1, 6))
+        for periodstring in ("2018", "2018-04", "2018-W13"):
+            first, last = Rollup.get_period_dates(periodstring)
+            assert Rollup.get_periodstring(Rollup.get_period(periodstring), first.isoformat()) == periodstring
+            assert Rollup.get_periodstring(Rollup.get_period(periodstring), last.isoformat()) == periodstring
+
+    def test_write_read(self):
+        dates = ["2018-03-31", "2018-04-01"]
+        # the same stats for two days, one key only on the second day
+        keys = list(self.tsastats.keys())
+        items = [(key, [(datestring, self.tsastats[key]) for datestring in dates if key != keys[0] or datestring == dates[1]]) for key in keys]
+        Rollup.write(self.filename, "2018-W13", self.tsastats.index_keynames, self.tsastats.value_keynames, self.stat_func_names, items, dates, True)
+        with Rollup(self.filename) as rollup:
+            assert rollup.periodstring == "2018-W13"
+            assert rollup.dates == tuple(dates)
+            assert rollup.complete is True
+            assert sorted(rollup.keys()) == sorted(keys)
+            assert rollup.stat_func_names == self.stat_func_names
+            rows = rollup.read(keys[1])
+            assert [datestring for datestring, stats in rows] == dates
+            for value_keyname in self.tsastats.value_keynames:
+                assert rows[1][1][value_keyname] == dict(self.tsastats[keys[1]][value_keyname])
+            assert [datestring for datestring, stats in rollup.read(keys[0])] == dates[1:]
+        self.assertRaises(ValueError, rollup.read, keys[1])
+
+    def test_state(self):
+        with TimeseriesArray.load("testdata", ["hostname"], datatypes={}) as tsa:
+            tsastats = TimeseriesArrayStats(tsa)
+        key = list(tsastats.keys())[0]
+        # first day without StatsState, like older dumps
+        items = [(key, [("2018-03-31", dict(tsastats[key].stats)), ("2018-04-01", tsastats[key])])]
+        Rollup.write(self.filename, "2018-W13", tsastats.index_keynames, tsastats.value_keynames, self.stat_func_names, items, ["2018-03-31", "2018-04-01"], True)
+        with Rollup(self.filename) as rollup:
+            rows = rollup.read(key)
+        assert not rows[0][1].has_state
+        assert rows[1][1].has_state
+        assert rows[1][1].state == tsastats[key].state
+
+
+if __name__ == "__main__":
+    unittest.main()
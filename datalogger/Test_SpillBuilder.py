@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import os
+# own modules
+from DataLogger import DataLogger as DataLogger
+from SpillBuilder import SpillBuilder as SpillBuilder
+
+
+class OnePartitionSpillBuilder(SpillBuilder):
+    """SpillBuilder, which spreads raw input to one partition only"""
+
+    def get_partitions(self):
+        return 1
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.datalogger = DataLogger("testdata")
+        self.datalogger.setup("mysql", "performance", "2018-04-01")
+
+    def test_partitions(self):
+        self.assertRaises(AttributeError, SpillBuilder, self.datalogger)
+        raw_size = SpillBuilder(self.datalogger, 1).get_raw_size()
+        size = SpillBuilder(self.datalogger, 1).get_estimated_size()
+        assert size == raw_size * SpillBuilder.MEMORY_FACTOR
+        assert SpillBuilder(self.datalogger, size).is_needed() is False
+        assert SpillBuilder(self.datalogger, size - 1).is_needed() is True
+        assert SpillBuilder(self.datalogger, raw_size * SpillBuilder.PARTITION_FACTOR).get_partitions() == 1
+        assert SpillBuilder(self.datalogger, raw_size * SpillBuilder.PARTITION_FACTOR // 4).get_partitions() == 4
+        assert SpillBuilder(self.datalogger, self.datalogger.raw_chunksize * SpillBuilder.PARSE_FACTOR).get_chunksize() == self.datalogger.raw_chunksize
+        assert SpillBuilder(self.datalogger, 240000).get_chunksize() == 240000 // SpillBuilder.PARSE_FACTOR
+
+    def test_run(self):
+        # built in memory
+        self.datalogger.delete_caches()
+        tsa = self.datalogger.load_tsa()
+        tsastats = self.datalogger.load_tsastats()
+        quantile = self.datalogger.load_quantile()
+        data = dict(((key, str(tsa[key].data)) for key in tsa.keys()))
+        # built out of core, more partitions than keys
+        self.datalogger.delete_caches()
+        budget = SpillBuilder(self.datalogger, 1).get_raw_size() * SpillBuilder.PARTITION_FACTOR // 16
+        counts = SpillBuilder(self.datalogger, budget).run()
+        assert counts["partitions"] >= 16
+        self.check_caches(tsa, tsastats, quantile, data, counts)
+        # partition files bigger than memory_budget are split
+        self.datalogger.delete_caches()
+        counts = OnePartitionSpillBuilder(self.datalogger, budget).run()
+        assert counts["partitions"] > 1
+        self.check_caches(tsa, tsastats, quantile, data, counts)
+
+    def check_caches(self, tsa, tsastats, quantile, data, counts):
+        assert counts["keys"] == len(tsa)
+        assert counts["rows"] == sum((len(tsa[key]) for key in tsa.keys()))
+        assert not os.listdir(self.datalogger.spilldir) # partition files are removed
+        tsa1 = self.datalogger.load_tsa()
+        assert sorted(tsa1.keys()) == sorted(tsa.keys())
+        for key in tsa.keys():
+            assert str(tsa1[key].data) == data[key]
+        tsastats1 = self.datalogger.load_tsastats()
+        for key in tsastats.keys():
+            for value_keyname in self.datalogger.value_keynames:
+                assert tsastats1[key][value_keyname] == tsastats[key][value_keyname]
+        quantile1 = self.datalogger.load_quantile()
+        for value_keyname in self.datalogger.value_keynames:
+            assert quantile1[value_keyname] == quantile[value_keyname]
+
+if __name__ == "__main__":
+    unittest.main()
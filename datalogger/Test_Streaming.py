@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import gzip
+import json
+# own modules
+import Streaming
+
+
+class Test(unittest.TestCase):
+
+    def test_json_chunks(self):
+        data = {
+            "index_keynames" : ("hostname", ),
+            "rows" : ({"ts" : number, "value" : number / 3.0} for number in range(1000)),
+            "empty" : (value for value in []),
+            "nested" : [[1, 2], {"a" : None}],
+        }
+        chunks = list(Streaming.json_chunks(data, chunksize=1024))
+        assert len(chunks) > 1
+        # every chunk but the last is at least chunksize, but not much more
+        assert all((1024 <= len(chunk) < 1024 + 64 for chunk in chunks[:-1]))
+        result = json.loads("".join(chunks))
+        assert result["index_keynames"] == ["hostname"]
+        assert result["rows"] == [{"ts" : number, "value" : number / 3.0} for number in range(1000)]
+        assert result["empty"] == []
+        assert result["nested"] == [[1, 2], {"a" : None}]
+
+    def test_csv_chunks(self):
+        lines = ["a,b"] + [("x", number) for number in range(100)]
+        text = "".join(Streaming.csv_chunks(lines, chunksize=64))
+        assert text.splitlines() == ["a,b"] + ["x,%d" % number for number in range(100)]
+
+    def test_gzip_chunks(self):
+        chunks = Streaming.json_chunks(({"ts" : number} for number in range(1000)), chunksize=512)
+        compressed = b"".join(Streaming.gzip_chunks(chunks))
+        assert json.loads(gzip.decompress(compressed).decode("utf-8")) == [{"ts" : number} for number in range(1000)]
+
+
+if __name__ == "__main__":
+    unittest.main()
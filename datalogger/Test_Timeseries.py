@@ -147,6 +147,29 @@ class Test(unittest.TestCase):
         ts2.convert("com_select", "counterreset", "com_select_counterreset")
         print(ts2)
 
+    def test_convert_batch(self):
+        print("testing column wise datatype converters against row wise ones")
+        times = [0.0, 10.0, 20.0, 20.0, 30.0, 40.0, 50.0]
+        series_list = [
+            self.app.get_serie("com_select"),
+            self.app.get_serie("uptime"),
+            [5.0, 10.0, 2.0**32 - 5.0, 2.0**32 - 5.0, 7.0, 7.0, 20.0], # wrap around and zero duration
+            [5.0, 10.0, 3.0, 3.0, 0.0, 8.0, 8.0], # resets
+            [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        ]
+        for series in series_list:
+            series_times = times if len(series) == len(times) else self.app.get_column("ts")
+            for datatype, func in Timeseries.datatype_mapper.items():
+                rowwise = Timeseries.datatype_mapper_rowwise[datatype]
+                assert list(func(series_times, series)) == list(rowwise(series_times, series))
+        # values out of range raise the same error in both implementations
+        for datatype, series in (("counter32", [1.0, 2.0**32 + 1]), ("counter64", [1.0, -2.0]), ("gauge32", [1.0, -2.0])):
+            for mapper in (Timeseries.datatype_mapper, Timeseries.datatype_mapper_rowwise):
+                try:
+                    mapper[datatype]([0.0, 1.0], series)
+                    assert False
+                except AssertionError as exc:
+                    assert "out of range at time 1.000000" in str(exc)
 
     def test_add_calc_col_single(self):
         print("testing load, slove, add_calc_col_single, add_calc_col_full")
@@ -8,8 +8,11 @@ import gzip
 import os
 # own modules
 from Timeseries import Timeseries as Timeseries
+from TimeseriesColumnar import TimeseriesColumnar as TimeseriesColumnar
 from TimeseriesArray import TimeseriesArray as TimeseriesArray
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from LRUCache import LRUCache as LRUCache
+from CustomExceptions import *
 
 meta2 = {
     "blacklist": [],
@@ -157,6 +160,31 @@ class Test(unittest.TestCase):
         # this test app is initialized without caching
         assert self.app.cache == False
 
+    def test_lru_cache(self):
+        print("testing shared LRUCache")
+        cache = LRUCache(max_entries=3)
+        tsa = TimeseriesArray.load("testdata/", meta["index_keynames"], datatypes=meta["value_keynames"])
+        tsa.cache = cache
+        keys = list(tsa.keys())
+        assert len(keys) > 3
+        for key in keys:
+            assert tsa[key] == self.app[key]
+        assert len(cache) == 3 and cache.misses == len(keys) and cache.evictions == len(keys) - 3
+        # shared with other objects of the same stored data and datatypes
+        tsa1 = TimeseriesArray.load("testdata/", meta["index_keynames"], datatypes=meta["value_keynames"])
+        tsa1.cache = cache
+        timeseries = tsa1[keys[-1]]
+        assert cache.hits == 1
+        assert timeseries is tsa[keys[-1]]
+        # other datatypes are cached separately
+        tsa2 = TimeseriesArray.load("testdata/", meta["index_keynames"], datatypes={})
+        tsa2.cache = cache
+        assert tsa2[keys[-1]] is not timeseries
+        assert cache.hits == 2 and cache.misses == len(keys) + 1
+        # modifications need full caching
+        with self.assertRaises(AttributeError):
+            tsa.convert("uptime", "persecond", "uptime_persecond")
+
     def set_group_keyname(self, index_keyname, group_func):
         pass
 
@@ -227,6 +255,14 @@ class Test(unittest.TestCase):
         # check latets uptime value
         assert tsa[('nagios.tilak.cc',)][-1][1] == 13439433.0
 
+    def test_columnar(self):
+        print("testing load with columnar storage")
+        tsa = TimeseriesArray.load("testdata/", meta["index_keynames"], datatypes=meta["value_keynames"], columnar=True)
+        assert tsa.columnar is True
+        assert isinstance(tsa[('nagios.tilak.cc',)], TimeseriesColumnar)
+        for key in self.app.keys():
+            assert tsa[key] == self.app[key]
+
     def test_export(self):
         print("testing export, add")
         tsa = TimeseriesArray(meta["index_keynames"], meta["value_keynames"], "ts", datatypes=meta["value_keynames"])
@@ -234,6 +270,16 @@ class Test(unittest.TestCase):
             tsa.add(entry)
         assert tsa == self.app
 
+    def test_to_csv(self):
+        print("testing to_csv")
+        lines = list(self.app.to_csv())
+        assert lines[0] == ",".join(list(self.app.index_keynames) + [self.app.ts_key] + list(self.app.value_keynames))
+        assert len(lines) == 1 + sum((len(self.app[key]) for key in self.app.keys()))
+        key = list(self.app.keys())[0]
+        first = lines[1].split(",")
+        assert tuple(first[:len(key)]) == tuple(str(value) for value in key)
+        assert len(first) == len(key) + 1 + len(self.app.value_keynames)
+
     def test_dump(self):
         print("testing dump, get_ts_dumpfilename, __eq__")
         testdir = "testdata/tsa_testdump"
@@ -243,6 +289,106 @@ class Test(unittest.TestCase):
         tsa.dump(testdir, overwrite=True)
         tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes=meta2["value_keynames"], filterkeys=None, index_pattern=None, matchtype="and")
         assert tsa == tsa1
+        # keys are read from tsa file, or decoded from filenames of older dumps
+        filenames = TimeseriesArray.get_ts_filenames(testdir, meta2["index_keynames"])
+        assert sorted(filenames.keys()) == sorted(TimeseriesArray.get_ts_filenames("testdata/fcIfC3AccountingTable", meta2["index_keynames"]).keys())
+        # stored key_index gives the same result as older dumps without
+        for filterkeys, matchtype, prefix in (({"hostname" : "fca-sr2-8gb-21", "ifDescr" : None}, "and", False), ({"hostname" : "fca-sr2-8gb-21", "ifDescr" : "port-channel 1"}, "or", False), ({"hostname" : "fca-sr2"}, "and", True)):
+            filenames = TimeseriesArray.get_ts_filenames(testdir, meta2["index_keynames"], filterkeys, matchtype, prefix)
+            assert len(filenames) > 0
+            assert sorted(filenames.keys()) == sorted(TimeseriesArray.get_ts_filenames("testdata/fcIfC3AccountingTable", meta2["index_keynames"], filterkeys, matchtype, prefix).keys())
+
+    def test_dump_container(self):
+        print("testing dump and load with container")
+        testdir = "testdata/tsa_testdump_container"
+        if not os.path.isdir(testdir):
+            os.mkdir(testdir)
+        # load without datatype conversion, to store raw data
+        tsa = TimeseriesArray.load("testdata/fcIfC3AccountingTable", meta2["index_keynames"], datatypes={})
+        tsa.dump(testdir, container=True)
+        assert os.path.isfile(os.path.join(testdir, TimeseriesArray.get_containerfilename(tsa.index_keynames)))
+        assert not any((filename.startswith("ts_") for filename in os.listdir(testdir)))
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes={})
+        assert list(tsa1.keys()) == list(tsa.keys())
+        for key in tsa.keys():
+            assert tsa1[key] == tsa[key]
+        # datatypes are converted the same way
+        tsa = TimeseriesArray.load("testdata/fcIfC3AccountingTable", meta2["index_keynames"], datatypes=meta2["value_keynames"])
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes=meta2["value_keynames"], columnar=True)
+        for key in tsa.keys():
+            assert tsa1[key].data == tsa[key].data
+        # filter while loading
+        filterkeys = {"hostname" : "fca-sr2-8gb-21", "ifDescr" : None}
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes={}, filterkeys=filterkeys)
+        assert len(tsa1) > 0
+        for key in tsa1.keys():
+            assert key[0] == "fca-sr2-8gb-21"
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes={}, filterkeys={"hostname" : "fca-sr2"}, prefix=True)
+        assert 0 < len(tsa1) < len(tsa)
+        for key in tsa1.keys():
+            assert key[0].startswith("fca-sr2")
+        # uncompressed, memory mapped container
+        TimeseriesArray.load("testdata/fcIfC3AccountingTable", meta2["index_keynames"], datatypes={}).dump(testdir, container=True, compress=False)
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes=meta2["value_keynames"], columnar=True)
+        for key in tsa.keys():
+            assert tsa1[key].data == tsa[key].data
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "counts open file descriptors in /proc")
+    def test_close(self):
+        print("testing close of container loaded TimeseriesArray")
+        testdir = "testdata/tsa_testdump_container"
+        if not os.path.isdir(testdir):
+            os.mkdir(testdir)
+        TimeseriesArray.load("testdata/fcIfC3AccountingTable", meta2["index_keynames"], datatypes={}).dump(testdir, overwrite=True, container=True)
+        fds = len(os.listdir("/proc/self/fd"))
+        with TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes={}) as tsa:
+            key = list(tsa.keys())[0]
+            timeseries = tsa[key]
+            assert len(os.listdir("/proc/self/fd")) == fds + 1
+        assert len(os.listdir("/proc/self/fd")) == fds
+        assert len(timeseries) > 0
+        self.assertRaises(ValueError, tsa.__getitem__, list(tsa.keys())[1])
+        self.app.close() # nothing to close without container
+
+    def test_dump_converted(self):
+        print("testing dump and load of Timeseries stored converted to datatypes")
+        testdir = "testdata/tsa_testdump_converted"
+        if not os.path.isdir(testdir):
+            os.mkdir(testdir)
+        tsa = TimeseriesArray.load("testdata/fcIfC3AccountingTable", meta2["index_keynames"], datatypes=meta2["value_keynames"])
+        assert tsa.converted is True
+        # raw Timeseries in memory, like read from raw data, are converted while dumping
+        stored = TimeseriesArray.load("testdata/fcIfC3AccountingTable", meta2["index_keynames"], datatypes={})
+        raw = TimeseriesArray(stored.index_keynames, stored.value_keynames, datatypes=meta2["value_keynames"])
+        for key in stored.keys():
+            raw[key] = stored[key]
+        assert raw.converted is False
+        for container in (False, True):
+            raw.dump(testdir, overwrite=True, container=container, converted=True)
+            tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes=meta2["value_keynames"])
+            assert tsa1.converted is True
+            assert list(tsa1.keys()) == list(tsa.keys())
+            for key in tsa.keys():
+                assert str(tsa1[key].data) == str(tsa[key].data)
+            # stored as they are, even without datatypes
+            tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes={})
+            assert tsa1.datatypes == meta2["value_keynames"]
+            assert str(tsa1[key].data) == str(tsa[key].data)
+            # other datatypes could not be applied anymore
+            with self.assertRaises(DataFormatError):
+                TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes=dict.fromkeys(meta2["value_keynames"], "asis"))
+        # converted objects are always stored converted, the raw Timeseries are not changed
+        tsa.dump(testdir, overwrite=True)
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes=meta2["value_keynames"])
+        for key in tsa.keys():
+            assert str(tsa1[key].data) == str(tsa[key].data)
+        raw.dump(testdir, overwrite=True)
+        tsa1 = TimeseriesArray.load(testdir, meta2["index_keynames"], datatypes={})
+        assert tsa1.converted is False
+        assert str(tsa1[key].data) == str(stored[key].data)
+        # get_converted of converted objects copies only
+        assert str(tsa.get_converted()[key].data) == str(tsa[key].data)
+        assert str(raw.get_converted()[key].data) == str(tsa[key].data)
 
     def test_load(self):
         print("testing load, get_ts_filename, filtermatch, get_dumpfilename")
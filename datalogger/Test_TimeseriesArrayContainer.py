@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import gzip
+import os
+# own modules
+from Timeseries import Timeseries as Timeseries
+from TimeseriesColumnar import TimeseriesColumnar as TimeseriesColumnar
+from TimeseriesArrayContainer import TimeseriesArrayContainer as TimeseriesArrayContainer
+from CustomExceptions import *
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.testfile = "testdata/ts_KHUnc3J2d2Vic3FsMi50aWxhay5jYycsKQ==.csv.gz"
+        with gzip.open(self.testfile, "rt") as infile:
+            self.ts = Timeseries.load(infile)
+        self.filename = "testdata/tsa_testcontainer.tsc"
+        self.items = [(("srvwebsql2.tilak.cc", ), self.ts), (("empty", ), Timeseries(self.ts.headers))]
+        TimeseriesArrayContainer.write(self.filename, ("hostname", ), self.ts.headers, "ts", self.items)
+
+    def tearDown(self):
+        if os.path.isfile(self.filename):
+            os.unlink(self.filename)
+
+    def test_keys(self):
+        container = TimeseriesArrayContainer(self.filename)
+        assert list(container.keys()) == [("srvwebsql2.tilak.cc", ), ("empty", )]
+        assert len(container) == 2
+        assert ("empty", ) in container
+        assert container.index_keynames == ("hostname", )
+        assert container.value_keynames == self.ts.headers
+        assert container.ts_key == "ts"
+        assert container.meta == {}
+        TimeseriesArrayContainer.write(self.filename, ("hostname", ), self.ts.headers, "ts", self.items, meta={"periodstring" : "2018"})
+        assert TimeseriesArrayContainer(self.filename).meta == {"periodstring" : "2018"}
+
+    def test_read(self):
+        container = TimeseriesArrayContainer(self.filename)
+        timeseries = container.read(("srvwebsql2.tilak.cc", ), Timeseries)
+        assert timeseries == self.ts
+        timeseries = container.read(("srvwebsql2.tilak.cc", ), TimeseriesColumnar)
+        assert timeseries.data == self.ts.data
+        assert len(container.read(("empty", ), Timeseries)) == 0
+
+    def test_read_columns(self):
+        container = TimeseriesArrayContainer(self.filename)
+        headers, times, columns = container.read_columns(("srvwebsql2.tilak.cc", ))
+        assert headers == self.ts.headers
+        assert list(times) == list(self.ts.get_column("ts"))
+        assert list(columns[0]) == list(self.ts.get_column(headers[0]))
+
+    def test_mmap(self):
+        TimeseriesArrayContainer.write(self.filename, ("hostname", ), self.ts.headers, "ts", self.items, compress=False)
+        container = TimeseriesArrayContainer(self.filename)
+        assert container.compress is False
+        headers, times, columns = container.read_columns(("srvwebsql2.tilak.cc", ))
+        assert isinstance(times, memoryview) and times.readonly
+        assert list(times) == list(self.ts.get_column("ts"))
+        assert list(columns[-1]) == list(self.ts.get_column(headers[-1]))
+        assert container.read(("srvwebsql2.tilak.cc", ), Timeseries) == self.ts
+        timeseries = container.read(("srvwebsql2.tilak.cc", ), TimeseriesColumnar)
+        assert isinstance(timeseries.get_column("ts"), memoryview)
+        assert timeseries.data == self.ts.data
+        assert len(container.read(("empty", ), TimeseriesColumnar)) == 0
+        # views are copied on modification
+        timeseries.add(times[-1] + 60.0, [1.0] * len(headers))
+        assert len(timeseries) == len(self.ts) + 1
+        assert len(times) == len(self.ts)
+        # rewritten files do not affect opened containers
+        TimeseriesArrayContainer.write(self.filename, ("hostname", ), self.ts.headers, "ts", self.items[1:])
+        assert container.read(("srvwebsql2.tilak.cc", ), TimeseriesColumnar).data == self.ts.data
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "counts open file descriptors in /proc")
+    def test_close(self):
+        fds = len(os.listdir("/proc/self/fd"))
+        with TimeseriesArrayContainer(self.filename) as container:
+            assert container.read(("srvwebsql2.tilak.cc", ), Timeseries) == self.ts
+        assert len(os.listdir("/proc/self/fd")) == fds
+        self.assertRaises(ValueError, container.read_columns, ("srvwebsql2.tilak.cc", ))
+        # views read before stay valid after close
+        TimeseriesArrayContainer.write(self.filename, ("hostname", ), self.ts.headers, "ts", self.items, compress=False)
+        with TimeseriesArrayContainer(self.filename) as container:
+            timeseries = container.read(("srvwebsql2.tilak.cc", ), TimeseriesColumnar)
+        assert timeseries.data == self.ts.data
+        del timeseries
+        assert len(os.listdir("/proc/self/fd")) == fds
+
+    def test_unsorted(self):
+        timeseries = TimeseriesColumnar.from_columns(("a", ), [300.0, 100.0, 200.0], [[3.0, 1.0, 2.0]])
+        with self.assertRaises(DataFormatError):
+            TimeseriesArrayContainer.write(self.filename, ("hostname", ), ("a", ), "ts", [(("unsorted", ), timeseries)])
+        assert TimeseriesArrayContainer(self.filename).keys() # existing file is kept
+
+    def test_magic(self):
+        with self.assertRaises(DataFormatError):
+            TimeseriesArrayContainer(self.testfile)
+
+
+if __name__ == "__main__":
+    unittest.main()
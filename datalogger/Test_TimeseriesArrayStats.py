@@ -12,6 +12,9 @@ from Timeseries import Timeseries as Timeseries
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
 from TimeseriesArray import TimeseriesArray as TimeseriesArray
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesArrayStats import b64decode_key as b64decode_key
+from TimeseriesArray import b64encode as b64encode
+from CustomExceptions import *
 
 def calllogger(func):
     def wrapper(*args, **kwds):
@@ -145,6 +148,7 @@ class Test(unittest.TestCase):
     def test_slice(self):
         tsastats = self.tsastats.slice(("bytes_sent", "bytes_received"))
         assert tsastats.value_keynames == ("bytes_sent", "bytes_received")
+        assert tsastats[('nagios.tilak.cc',)]["bytes_sent"] == self.tsastats[('nagios.tilak.cc',)]["bytes_sent"]
         print(tsastats)
 
     def test_get_stats(self):
@@ -158,6 +162,42 @@ class Test(unittest.TestCase):
         self.tsastats.dump(outdir, overwrite=True)
         tsastats = TimeseriesArrayStats.load(outdir, meta["index_keynames"], filterkeys=None, matchtype="and")
         assert tsastats == self.tsastats
+        # keys are stored in tsastat file
+        with open(os.path.join(outdir, TimeseriesArrayStats.get_dumpfilename(meta["index_keynames"])), "rt") as infile:
+            data = json.load(infile)
+        assert [tuple(key) for key in data["keys"]] == list(self.tsastats.keys())
+        # StatsState is stored in tsstate files beside the unchanged tsstat files
+        for key, tsstats in tsastats.items():
+            assert tsstats.has_state
+            assert tsstats.state == self.tsastats[key].state
+
+    def test_dump_container(self):
+        outdir = "testdata/tsastat_testdump_container"
+        if not os.path.isdir(outdir):
+            os.mkdir(outdir)
+        self.tsastats.dump(outdir, container=True)
+        assert os.path.isfile(os.path.join(outdir, TimeseriesArrayStats.get_containerfilename(meta["index_keynames"])))
+        tsastats = TimeseriesArrayStats.load(outdir, meta["index_keynames"], filterkeys=None, matchtype="and")
+        assert tsastats == self.tsastats
+        tsastats = TimeseriesArrayStats.load(outdir, meta["index_keynames"], filterkeys={"hostname" : "nagios.tilak.cc"}, matchtype="and")
+        assert list(tsastats.keys()) == [("nagios.tilak.cc", )]
+        assert tsastats[("nagios.tilak.cc", )] == self.tsastats[("nagios.tilak.cc", )]
+
+    def test_top_n(self):
+        values = sorted((tsstats["bytes_sent"]["max"] for tsstats in self.tsastats.values()), reverse=True)
+        assert [value for key, value in self.tsastats.top_n("bytes_sent", "max", n=2)] == values[:2]
+        assert [value for key, value in self.tsastats.top_n("bytes_sent", "max", n=2, reverse=False)] == values[::-1][:2]
+        assert self.tsastats.top_n("bytes_sent", "max", n=1)[0] == (('nagios.tilak.cc',), 42969066.8)
+        assert len(self.tsastats.filter("bytes_sent", "max", minimum=values[2])) == 3
+
+    def test_b64decode_key(self):
+        for key in (("nagios.tilak.cc", ), ("fca-sr2-8gb-21", "port 1, slot 2"), ("it's", ), ("", "")):
+            assert b64decode_key(b64encode(key)) == key
+        # python 2 representation with escaped unicode
+        assert b64decode_key("KHUnTVx4ZmNsbGVyJywgdScxJyk=") == ("M\xfcller", "1")
+        for encoded in ("X19pbXBvcnRfXygib3MiKQ==", "WzFd"): # __import__("os"), [1]
+            with self.assertRaises(DataFormatError):
+                b64decode_key(encoded)
 
     def filtermatch(key_dict, filterkeys, matchtype):
         pass
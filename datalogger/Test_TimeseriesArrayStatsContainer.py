@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import os
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesArrayStatsContainer import TimeseriesArrayStatsContainer as TimeseriesArrayStatsContainer
+from CustomExceptions import *
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tsastats = TimeseriesArrayStats.load("testdata", ["hostname"])
+        self.filename = "testdata/tsastat_test.tss"
+        TimeseriesArrayStatsContainer.write(self.filename, self.tsastats)
+        self.container = TimeseriesArrayStatsContainer(self.filename)
+
+    def tearDown(self):
+        if os.path.isfile(self.filename):
+            os.unlink(self.filename)
+
+    def test_read(self):
+        assert len(self.container) == len(self.tsastats)
+        assert list(self.container.keys()) == list(self.tsastats.keys())
+        assert self.container.index_keynames == self.tsastats.index_keynames
+        assert self.container.value_keynames == self.tsastats.value_keynames
+        for key in self.tsastats.keys():
+            assert key in self.container
+            assert self.container[key] == self.tsastats[key]
+            for value_keyname in self.tsastats.value_keynames:
+                assert self.container[key][value_keyname] == self.tsastats[key][value_keyname]
+        assert ("unknown", ) not in self.container
+        # stats loaded from json files without tsstate files
+        assert not self.container[list(self.tsastats.keys())[0]].has_state
+
+    def test_state(self):
+        with TimeseriesArray.load("testdata", ["hostname"], datatypes={}) as tsa:
+            tsastats = TimeseriesArrayStats(tsa)
+        TimeseriesArrayStatsContainer.write(self.filename, tsastats)
+        with TimeseriesArrayStatsContainer(self.filename) as container:
+            for key in tsastats.keys():
+                assert container[key] == tsastats[key]
+                assert container[key].has_state
+                assert container[key].state == tsastats[key].state
+            # columns of statistical values are not moved by the states
+            assert container.top_n("bytes_sent", "max", n=3) == tsastats.top_n("bytes_sent", "max", n=3)
+
+    def test_top_n(self):
+        for value_keyname in self.tsastats.value_keynames:
+            for stat_func_name in ("max", "avg", "min"):
+                assert self.container.top_n(value_keyname, stat_func_name, n=3) == self.tsastats.top_n(value_keyname, stat_func_name, n=3)
+                assert self.container.top_n(value_keyname, stat_func_name, n=3, reverse=False) == self.tsastats.top_n(value_keyname, stat_func_name, n=3, reverse=False)
+        with self.assertRaises(KeyError):
+            self.container.top_n("unknown", "max")
+
+    def test_filter(self):
+        values = sorted((value for key, value in self.tsastats.top_n("bytes_sent", "avg", n=len(self.tsastats))))
+        result = self.container.filter("bytes_sent", "avg", minimum=values[1], maximum=values[-2])
+        assert sorted((value for key, value in result)) == values[1:-1]
+        assert len(self.container.filter("bytes_sent", "avg")) == len(self.tsastats)
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "counts open file descriptors in /proc")
+    def test_close(self):
+        self.container.close()
+        fds = len(os.listdir("/proc/self/fd"))
+        with TimeseriesArrayStatsContainer(self.filename) as container:
+            column = container.get_column("bytes_sent", "avg")
+        assert len(column) == len(self.tsastats)
+        del column
+        assert len(os.listdir("/proc/self/fd")) == fds
+        self.assertRaises(ValueError, container.read, list(self.tsastats.keys())[0])
+
+    def test_format(self):
+        with open(self.filename, "r+b") as outfile:
+            outfile.write(b"NOTDLTSS")
+        with self.assertRaises(DataFormatError):
+            TimeseriesArrayStatsContainer(self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+import unittest
+import logging
+import gzip
+import json
+from array import array
+# own modules
+from Timeseries import Timeseries as Timeseries
+from TimeseriesColumnar import TimeseriesColumnar as TimeseriesColumnar
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+
+
+class Test(unittest.TestCase):
+
+
+    def setUp(self):
+        self.testfile = "testdata/ts_KHUnc3J2d2Vic3FsMi50aWxhay5jYycsKQ==.csv.gz"
+        with gzip.open(self.testfile, "rt") as infile:
+            self.app = TimeseriesColumnar.load(infile)
+        with gzip.open(self.testfile, "rt") as infile:
+            self.ts = Timeseries.load(infile)
+
+    def test_headers(self):
+        assert self.app.headers == self.ts.headers
+        assert self.app.colnames == self.ts.colnames
+        assert self.app.ts_keyname == "ts"
+
+    def test_start_stop_ts(self):
+        assert self.app.start_ts == 1521500402.0
+        assert self.app.stop_ts == 1521586501.0
+        assert self.app.interval == self.ts.interval
+
+    def test_data(self):
+        assert len(self.app) == len(self.ts)
+        assert self.app.data == self.ts.data
+        assert list(self.app) == list(self.ts)
+        assert self.app == self.ts
+
+    def test_getitem(self):
+        assert self.app[0] == self.ts[0]
+        assert self.app[(0, 1)] == 89169365.0
+        assert self.app[1521500402.0] == self.ts[1521500402.0]
+        assert self.app["ts"] == self.ts["ts"]
+        assert self.app[(10, "com_select")] == 89359228.0 == self.app[(10, 1)] == self.app[10][1]
+        assert self.app[(1521586501.0, 1)] == 99254355.0 == self.app[(-1, 1)] == self.app[-1][1]
+        assert self.app[(-1, -1)] == self.ts[(-1, -1)]
+        try:
+            self.app[1.0]
+            assert False
+        except KeyError:
+            pass
+
+    def test_add(self):
+        ts = TimeseriesColumnar(("a", "b"))
+        ts.add(1.0, (1.0, 2.0))
+        ts.add(3.0, (3.0, 4.0))
+        ts.add(3.0, (5.0, 6.0)) # duplicate timestamp is skipped
+        ts.add(2.0, (7.0, 8.0)) # not steadily increasing, but added
+        assert len(ts) == 3
+        assert ts[2.0] == [2.0, 7.0, 8.0]
+        ts.add(2.0, (9.0, 9.0))
+        assert len(ts) == 3
+
+    def test_group_add(self):
+        with gzip.open(self.testfile, "rt") as infile:
+            ts = TimeseriesColumnar.load(infile)
+        for row in self.app:
+            ts.group_add(row[0], row[1:], lambda a, b : a + b)
+        ts1 = ts.slice(("bytes_received",))
+        ts1.append("bytes_received_org", self.app.get_serie("bytes_received"))
+        assert ts1[0][1] == ts1[0][2] + ts1[0][2]
+
+    def test_to_csv(self):
+        assert list(self.app.to_csv(value_keynames=("uptime", "com_select"))) == list(self.ts.to_csv(value_keynames=("uptime", "com_select")))
+
+    def test_to_data(self):
+        assert list(self.app.to_data()) == list(self.ts.to_data())
+        data_json = json.dumps(list(self.app.to_data(("uptime", ))))
+        assert isinstance(data_json, str)
+
+    def test_get_serie(self):
+        assert self.app.get_serie("com_select") == self.ts.get_serie("com_select") == self.app["com_select"]
+        assert tuple(self.app.get_column("com_select")) == self.app.get_serie("com_select")
+
+    def test_slice(self):
+        assert self.app.slice(("com_select", "uptime")) == self.ts.slice(("com_select", "uptime"))
+
+    def test_convert(self):
+        ts1 = self.app.slice(("uptime", "com_select"))
+        ts2 = self.ts.slice(("uptime", "com_select"))
+        for datatype in ("derive", "percent", "persecond", "counter32", "counter64", "gauge32", "counterreset"):
+            ts1.convert("com_select", datatype, "com_select_%s" % datatype)
+            ts2.convert("com_select", datatype, "com_select_%s" % datatype)
+        ts1.convert("uptime", "persecond")
+        ts2.convert("uptime", "persecond")
+        assert ts1 == ts2
+
+    def test_calc_cols(self):
+        ts = self.app.slice(("bytes_sent", "bytes_received"))
+        ts.add_calc_col_single("bytes_sent", "kbytes_sent", lambda a : a / 8)
+        ts.add_calc_col_full("kbytes", lambda row : (row["bytes_sent"] + row["bytes_received"])/ 8)
+        assert ts[0][1] == ts[0][3] * 8
+        assert ts[0][4] == (ts[0][1] + ts[0][2]) / 8
+
+    def test_remove_col(self):
+        ts = self.app.slice(('com_select', 'uptime'))
+        assert ts[0][2] == 926326.0
+        ts.remove_col("com_select")
+        assert ts[0][1] == 926326.0
+        assert ts.headers == ["uptime"]
+
+    def test_stats(self):
+        assert self.app.stats == TimeseriesStats(self.ts)
+
+    def test_dump(self):
+        with gzip.open("testdata/ts_test.csv.gz", "wt") as outfile:
+            self.app.dump(outfile)
+        with gzip.open("testdata/ts_test.csv.gz", "rt") as infile:
+            ts = Timeseries.load(infile)
+        assert ts == self.ts
+
+    def test_from_columns(self):
+        columns = [self.app.get_column(colname) for colname in self.app.headers]
+        ts = TimeseriesColumnar.from_columns(self.app.headers, self.app.get_column("ts"), columns)
+        assert ts == self.app
+        ts = Timeseries.from_columns(self.app.headers, self.app.get_column("ts"), columns)
+        assert ts == self.ts
+
+    def test_from_columns_unsorted(self):
+        ts = TimeseriesColumnar.from_columns(("a",), [300.0, 100.0, 200.0], [[3.0, 1.0, 2.0]])
+        assert ts[100.0] == [100.0, 1.0]
+        assert ts[200.0, "a"] == 2.0
+        self.assertRaises(KeyError, ts.__getitem__, 400.0)
+        # duplicate timestamps are skipped like in Timeseries, the first one wins
+        args = (("a",), [300.0, 100.0, 300.0, 200.0], [[3.0, 1.0, 4.0, 2.0]])
+        ts = TimeseriesColumnar.from_columns(*args)
+        assert len(ts) == 3
+        assert ts[300.0] == [300.0, 3.0]
+        assert ts.data == Timeseries.from_columns(*args).data
+
+    def test_from_views(self):
+        views = (memoryview(array("d", [100.0, 200.0, 300.0])), [memoryview(array("d", [1.0, 2.0, 3.0]))])
+        ts = TimeseriesColumnar.from_views(("a",), *views)
+        assert ts[200.0] == [200.0, 2.0]
+        self.assertRaises(KeyError, ts.__getitem__, 400.0)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    unittest.main()
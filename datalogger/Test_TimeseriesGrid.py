@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import math
+# own modules
+from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesGrid import TimeseriesGrid as TimeseriesGrid
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tsa = TimeseriesArray.load("testdata", ["hostname"], datatypes={})
+        # small tsa with gaps and timestamps slightly off the grid
+        self.gaps = TimeseriesArray(("hostname", ), ("value", "other"))
+        self.gaps.add_columns(("a", ), [1000.0, 1301.0, 1895.0, 2500.0], [[1.0, 2.0, 4.0, 6.0], [0.0, 0.0, 0.0, 0.0]])
+        self.gaps.add_columns(("b", ), [1310.0, 1590.0], [[10.0, 20.0], [1.0, 2.0]])
+
+    def test_align(self):
+        grid = self.tsa.align(300)
+        assert grid.keys() == list(self.tsa.keys())
+        assert grid.start_ts % 300 == 0
+        for key in self.tsa.keys():
+            timeseries = self.tsa[key]
+            for value_keyname in ("com_select", "uptime"):
+                row = grid.get_row(key, value_keyname)
+                assert len(row) == len(grid.times)
+                values = [value for value in row if not math.isnan(value)]
+                # every value is in grid, timestamps are nearly on grid already
+                assert values == list(timeseries.get_serie(value_keyname))
+        slot = grid.get_slot("uptime", grid.times[10])
+        assert list(slot) == [grid.get_row(key, "uptime")[10] for key in grid.keys()]
+
+    def test_fill(self):
+        grid = TimeseriesGrid(self.gaps, 300, start_ts=900.0, stop_ts=2700.0)
+        assert grid.times == (900.0, 1200.0, 1500.0, 1800.0, 2100.0, 2400.0, 2700.0)
+        nan = [math.isnan(value) for value in grid.get_row(("a", ), "value")]
+        assert nan == [False, False, True, False, True, False, True]
+        # snapped to nearest slot, 1000 -> 900, 1301 -> 1200, 1895 -> 1800, 2500 -> 2400
+        assert [grid.get_row(("a", ), "value")[index] for index in (0, 1, 3, 5)] == [1.0, 2.0, 4.0, 6.0]
+        grid = TimeseriesGrid(self.gaps, 300, start_ts=900.0, stop_ts=2700.0, fill="previous")
+        assert list(grid.get_row(("a", ), "value")) == [1.0, 2.0, 2.0, 4.0, 4.0, 6.0, 6.0]
+        assert math.isnan(grid.get_row(("b", ), "value")[0])
+        assert list(grid.get_row(("b", ), "value"))[1:] == [10.0, 20.0, 20.0, 20.0, 20.0, 20.0]
+        grid = TimeseriesGrid(self.gaps, 300, start_ts=900.0, stop_ts=2700.0, fill="linear")
+        assert list(grid.get_row(("a", ), "value"))[:6] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+        assert math.isnan(grid.get_row(("a", ), "value")[6])
+        assert list(grid.get_matrix("other"))[7:14][1:3] == [1.0, 2.0]
+        with self.assertRaises(KeyError):
+            TimeseriesGrid(self.gaps, 300, fill="spline")
+
+    def test_nearest(self):
+        # both 1301 and 1310 snap to 1200, the nearest one wins
+        tsa = TimeseriesArray(("hostname", ), ("value", ))
+        tsa.add_columns(("a", ), [1290.0, 1301.0], [[1.0, 2.0]])
+        grid = tsa.align(300, start_ts=1200.0)
+        assert grid.times == (1200.0, )
+        assert list(grid.get_row(("a", ), "value")) == [1.0]
+
+
+if __name__ == "__main__":
+    unittest.main()
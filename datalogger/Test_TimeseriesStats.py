@@ -9,6 +9,9 @@ import json
 # own modules
 from Timeseries import Timeseries as Timeseries
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from TimeseriesStats import series_stats as series_stats
+from TimeseriesStats import series_stats_state as series_stats_state
+from TimeseriesStats import StatsState as StatsState
 
 
 class Test(unittest.TestCase):
@@ -83,6 +86,100 @@ class Test(unittest.TestCase):
         tsstat = TimeseriesStats.from_json(self.tsstat.to_json())
         assert tsstat == self.tsstat
 
+    def test_series_stats(self):
+        with gzip.open(self.testfile, "rt") as infile:
+            ts = Timeseries.load(infile)
+        for key in ts.headers:
+            series = ts.get_serie(key)
+            # must be the same as calling every single stat_func
+            expected = dict((func_name, func(series)) for func_name, func in TimeseriesStats.stat_funcs.items())
+            assert json.dumps(series_stats(series)) == json.dumps(expected)
+        assert series_stats([1.0, 3.0, 2.0, 2.0])["median"] == 2.0
+        assert series_stats([1.0, 3.0, 2.0, 2.0])["inc"] == 2.0
+        assert series_stats([1.0, 3.0, 2.0, 2.0])["dec"] == 1.0
+
+    def assert_stats(self, stats, expected, exact=("min", "max", "count", "first", "last")):
+        for stat_func_name, value in expected.items():
+            if stat_func_name in exact:
+                assert stats[stat_func_name] == value
+            elif stat_func_name != "median":
+                self.assertAlmostEqual(stats[stat_func_name], value, delta=1e-9 * max(1.0, abs(value)))
+
+    def test_state(self):
+        state = StatsState.from_stats(series_stats([1.0, 3.0, 2.0, 2.0]))
+        assert state.count == 4
+        assert state.sketch == [[2.0, 4]]
+        stats, state = series_stats_state([1.0, 3.0, 2.0, 2.0], 10.0, 40.0)
+        assert (state.first_ts, state.last_ts) == (10.0, 40.0)
+        assert state.sketch == [[1.0, 1], [2.0, 1], [2.0, 1], [3.0, 1]]
+        assert state.get_stats() == stats
+        assert StatsState.from_data(state.to_data()) == state
+        values = state.to_values()
+        assert len(values) == len(StatsState.get_value_names())
+        assert StatsState.from_values(stats, values) == state
+        state = StatsState.from_stats(stats)
+        assert StatsState.from_values(stats, state.to_values()) == state
+        # sketch is limited to sketch_size centroids
+        sketch = StatsState.get_sketch([float(value) for value in range(100)], size=10)
+        assert len(sketch) == 10
+        assert sum((weight for value, weight in sketch)) == 100
+        assert len(StatsState.compress_sketch(sorted(sketch + sketch), size=10)) <= 10
+
+    def test_merge(self):
+        with gzip.open(self.testfile, "rt") as infile:
+            ts = Timeseries.load(infile)
+        rows = list(ts)
+        first = Timeseries(ts.headers)
+        second = Timeseries(ts.headers)
+        for row in rows[:100]:
+            first.add(row[0], list(row[1:]))
+        for row in rows[100:]:
+            second.add(row[0], list(row[1:]))
+        # following series, the order of merge does not matter
+        for merged in (TimeseriesStats(first).merge(TimeseriesStats(second)), TimeseriesStats(second).merge(TimeseriesStats(first))):
+            for key in ts.headers:
+                self.assert_stats(merged[key], self.tsstat[key])
+                assert abs(merged[key]["median"] - self.tsstat[key]["median"]) <= (self.tsstat[key]["max"] - self.tsstat[key]["min"]) / 10.0
+        # parallel series, all values pooled
+        merged = TimeseriesStats(ts).merge(TimeseriesStats(first))
+        for key in ts.headers:
+            pooled = series_stats(list(ts.get_serie(key)) + list(first.get_serie(key)))
+            pooled = dict(((stat_func_name, pooled[stat_func_name]) for stat_func_name in ("min", "max", "count", "first", "sum", "avg", "std")))
+            self.assert_stats(merged[key], pooled)
+            assert merged[key]["inc"] == self.tsstat[key]["inc"] + TimeseriesStats(first)[key]["inc"]
+        # small series, median is exact
+        first = Timeseries(["value"])
+        second = Timeseries(["value"])
+        for timestamp, value in ((300.0, 5.0), (600.0, 1.0), (900.0, 4.0)):
+            first.add(timestamp, [value])
+        for timestamp, value in ((1200.0, 2.0), (1500.0, 7.0)):
+            second.add(timestamp, [value])
+        merged = TimeseriesStats(first).merge(TimeseriesStats(second))
+        assert merged["value"]["median"] == 4.0
+        assert merged["value"]["inc"] == 3.0 + 5.0
+        assert merged["value"]["dec"] == 4.0 + 2.0
+        assert merged["value"]["diff"] == 2.0
+
+    def test_dump_state(self):
+        with open("testdata/tsstat_testdump.json", "wt") as outfile:
+            self.tsstat.dump(outfile)
+        with open("testdata/tsstat_testdump.json", "rt") as infile:
+            assert list(json.load(infile).keys()) == list(self.tsstat.keys()) # statistical values only
+        with open("testdata/tsstate_testdump.json", "wt") as outfile:
+            self.tsstat.dump_state(outfile)
+        with open("testdata/tsstat_testdump.json", "rt") as infile:
+            tsstat = TimeseriesStats.load(infile, "testdata/tsstate_testdump.json")
+        assert list(tsstat.keys()) == list(self.tsstat.keys())
+        assert tsstat.has_state
+        assert tsstat.state == self.tsstat.state
+        assert TimeseriesStats.from_json(self.tsstat.to_json()) == self.tsstat
+        # older dumps without state
+        with open("testdata/tsstat_KHUnc3J2d2Vic3FsMi50aWxhay5jYycsKQ==.json", "rt") as infile:
+            tsstat = TimeseriesStats.load(infile, "testdata/tsstate_missing.json")
+        assert not tsstat.has_state
+        assert tsstat.state["com_select"].count == tsstat["com_select"]["count"]
+        assert tsstat.state["com_select"].first_ts is None
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     unittest.main()
@@ -1,7 +1,10 @@
 #!/usr/bin/python
 # pylint: disable=line-too-long
 """Module for class Timeseries"""
+import sys
 import logging
+import math
+from itertools import islice
 # own modules
 from CustomExceptions import *
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
@@ -202,6 +205,146 @@ def datatype_gauge32(times, series):
             new_series.append(0.0)
     return new_series
 
+def _pairs(times, series):
+    """
+    zip consecutive entries of times and series together
+
+    yields:
+    <tuple> (previous ts, actual ts, previous value, actual value)
+    """
+    return zip(times, islice(times, 1, None), series, islice(series, 1, None))
+
+def _assert_in_range(times, series, minimum, maximum=None):
+    """
+    check if every value of series is between minimum and maximum (if given)
+    using min() and max() over the whole column, only if this fails
+    search for the first value out of range and raise AssertionError with
+    the same message as the row wise implementations
+    """
+    if len(series) == 0:
+        return
+    if min(series) >= minimum and (maximum is None or max(series) <= maximum) and not any(map(math.isnan, series)):
+        return
+    for index, value in enumerate(series):
+        if (value >= minimum) and (maximum is None or value <= maximum):
+            continue
+        msg = "counter %f out of range at time %f" % (value, times[index])
+        if maximum is not None:
+            msg += ", max_value: %f " % maximum
+        logging.error(msg)
+        raise AssertionError(msg)
+
+def datatype_percent_batch(times, series):
+    """
+    column wise implementation of datatype_percent
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float> percent between 0.0 and 1.0
+    """
+    max_value = max(series)
+    if max_value == 0.0:
+        return [0.0, ] * len(series)
+    return [value / max_value for value in series]
+
+def datatype_derive_batch(times, series):
+    """
+    column wise implementation of datatype_derive
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    new_series = [0.0, ]
+    new_series.extend([value - last_value for last_value, value in zip(series, islice(series, 1, None))])
+    return new_series
+
+def __datatype_counter_batch(times, series, max_value):
+    """
+    column wise implementation of __datatype_counter
+    do not use directly, use counter32_batch, counter64_batch instead
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    _assert_in_range(times, series, 0.0, max_value)
+    new_series = [0.0, ]
+    new_series.extend([((value - last_value) if value >= last_value else (max_value - last_value + value)) / (ts - last_ts) if ts > last_ts else 0.0 for last_ts, ts, last_value, value in _pairs(times, series)])
+    return new_series
+
+def datatype_counter32_batch(times, series):
+    """
+    column wise implementation of datatype_counter32
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    return __datatype_counter_batch(times, series, 2.0**32)
+
+def datatype_counter64_batch(times, series):
+    """
+    column wise implementation of datatype_counter64
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    return __datatype_counter_batch(times, series, 2.0**64)
+
+def datatype_persecond_batch(times, series):
+    """
+    column wise implementation of datatype_persecond
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    new_series = [0.0, ]
+    new_series.extend([(value - last_value) / (ts - last_ts) if ts > last_ts else 0.0 for last_ts, ts, last_value, value in _pairs(times, series)])
+    return new_series
+
+def datatype_counterreset_batch(times, series):
+    """
+    column wise implementation of datatype_counterreset
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    new_series = [0.0, ]
+    new_series.extend([(value - last_value) if value >= last_value else value for last_value, value in zip(series, islice(series, 1, None))])
+    return new_series
+
+def datatype_gauge32_batch(times, series):
+    """
+    column wise implementation of datatype_gauge32
+
+    parameters:
+    series <array> of <float>
+
+    returns:
+    <list> of <float>
+    """
+    _assert_in_range(times, series, 0.0)
+    new_series = [0.0, ]
+    new_series.extend([((value - last_value) if value >= last_value else value) / (ts - last_ts) if ts > last_ts else 0.0 for last_ts, ts, last_value, value in _pairs(times, series)])
+    return new_series
 
 
 class Timeseries(object):
@@ -217,7 +360,19 @@ class Timeseries(object):
     ts value has to be integer
     """
 
+    # column wise implementations, used by convert
     datatype_mapper = {
+        "derive" : datatype_derive_batch,
+        "counter32" : datatype_counter32_batch,
+        "gauge32" : datatype_gauge32_batch,
+        "counter64" : datatype_counter64_batch,
+        "counterreset" : datatype_counterreset_batch,
+        "percent" : datatype_percent_batch,
+        "persecond" : datatype_persecond_batch,
+    }
+
+    # value by value reference implementations
+    datatype_mapper_rowwise = {
         "derive" : datatype_derive,
         "counter32" : datatype_counter32,
         "gauge32" : datatype_gauge32,
@@ -242,6 +397,35 @@ class Timeseries(object):
         # define new data
         self.data = []
 
+    @classmethod
+    def from_columns(cls, headers, times, columns, ts_keyname="ts"):
+        """
+        create new object from column oriented data
+
+        parameters:
+        headers <list> column names of values
+        times <iterable> of <float> timestamps, strictly increasing
+        columns <list> of <iterable> of <float> one for every header
+        ts_keyname <str> name of timestamp column
+
+        returns:
+        <Timeseries>
+        """
+        timeseries = cls(headers, ts_keyname)
+        times = list(times)
+        rows = [list(row) for row in zip(times, *columns)]
+        if len(set(times)) != len(times):
+            # let __add skip duplicate timestamps
+            for row in rows:
+                timeseries.__add(row[0], row[1:])
+            return timeseries
+        timeseries.data = rows
+        timeseries.__ts_index = dict(zip(times, range(len(times))))
+        timeseries.__index = len(times)
+        return timeseries
+    # row storage always copies
+    from_views = from_columns
+
     @property
     def ts_keyname(self):
         """name of timestamp key"""
@@ -294,6 +478,15 @@ class Timeseries(object):
     def datatypes(self):
         return list(self.datatype_mapper.keys())
 
+    @property
+    def nbytes(self):
+        """
+        return approximate memory usage in bytes, one list of float objects per row
+        """
+        ncols = len(self.__headers) + 1
+        row_size = sys.getsizeof([0.0] * ncols) + ncols * sys.getsizeof(0.0)
+        return sys.getsizeof(self.data) + len(self.data) * row_size + sys.getsizeof(self.__ts_index)
+
     def __eq__(self, other):
         if self.__headers != other.headers:
             raise AssertionError("headers are different")
@@ -519,6 +712,20 @@ class Timeseries(object):
         """
         return self.__headers.index(colname) + 1
 
+    def get_column(self, colname):
+        """
+        return all values of given column, ts_keyname is also accepted
+
+        parameters:
+        colname <str> must be in self.colnames
+
+        returns:
+        <tuple> of <float>
+        """
+        if colname == self.__ts_keyname:
+            return tuple(self.__get_col(0))
+        return self.get_serie(colname)
+
     def resample(self, time_interval, func):
         """
         resample data to time interval given
@@ -11,8 +11,16 @@ import json
 import os
 import gzip
 # own modules
+from AtomicFile import atomic_open as atomic_open
 from Timeseries import Timeseries as Timeseries
+from TimeseriesColumnar import TimeseriesColumnar as TimeseriesColumnar
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesArrayStats import b64decode_key as b64decode_key
+from TimeseriesArrayContainer import TimeseriesArrayContainer as TimeseriesArrayContainer
+from TimeseriesGrid import TimeseriesGrid as TimeseriesGrid
+from KeyIndex import KeyIndex as KeyIndex
+from LRUCache import LRUCache as LRUCache
+from CustomExceptions import *
 
 
 #################### hack begin ##########################
@@ -71,18 +79,26 @@ class TimeseriesArray(object):
         "len" : len,
     }
 
-    def __init__(self, index_keynames, value_keynames, ts_key="ts", datatypes=None, cache=False):
+    def __init__(self, index_keynames, value_keynames, ts_key="ts", datatypes=None, cache=False, columnar=False):
         """
         index_keys <tuple> column names of index columns
         value_keys <tuple> column names of value columns
         ts_key <str> name of timestamp column
         datatypes <list> list of used datatypes
         cache <bool> should already loaded timeseries be cached, useful to calculate quantiles
+            or <LRUCache> to cache loaded timeseries within this budget, could be shared
+        columnar <bool> use array backed TimeseriesColumnar instead of Timeseries
         """
         self.__index_keynames = tuple([value for value in index_keynames])
         self.__value_keynames = list([value for value in value_keynames])
         self.__ts_key = ts_key
         self.__cache = cache
+        self.__columnar = columnar
+        self.__ts_class = TimeseriesColumnar if columnar else Timeseries
+        self.__container = None # TimeseriesArrayContainer to autoload from
+        self.__converted = False # True if Timeseries of this object are converted to datatypes
+        self.__stored_converted = False # True if autoloaded Timeseries are stored converted
+        self.__cache_id = None # identifies stored version in shared LRUCache
         # define instance data
         self.__debug = False
         self.__data = {} # holds data
@@ -110,9 +126,33 @@ class TimeseriesArray(object):
         }
         return json.dumps(outbuffer, indent=4, sort_keys=True)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        close TimeseriesArrayContainer this object was loaded from,
+        Timeseries loaded before stay valid, the others cannot be
+        autoloaded afterwards
+        """
+        if self.__container is not None:
+            self.__container.close()
+
     def __getitem__(self, key):
         """mimic dict, honor lazy reloading of Timeseries if value is None"""
         if self.__data[key] is None:
+            if isinstance(self.__cache, LRUCache):
+                # the loaded timeseries depends also on stored version, class and datatypes
+                datatypes = tuple(sorted(self.datatypes.items())) if self.datatypes else None
+                cache_key = (self.__cache_id, self.ts_autoload.get(key), key, self.__ts_class.__name__, datatypes)
+                timeseries = self.__cache.get(cache_key)
+                if timeseries is None:
+                    timeseries = self.__autoload_ts(key)
+                    self.__cache.put(cache_key, timeseries, timeseries.nbytes)
+                return timeseries
             # auto load data if None
             timeseries = self.__autoload_ts(key)
             if self.__cache is False:
@@ -203,15 +243,28 @@ class TimeseriesArray(object):
 
     @property
     def cache(self):
-        """True if timeseries will be cached in memory"""
+        """True if timeseries will be cached in memory, or LRUCache in use"""
         return self.__cache
 
     @cache.setter
     def cache(self, value):
-        """set to True if every loaded timeseries should be cached in memory"""
-        assert isinstance(value, bool)
+        """
+        set to True if every loaded timeseries should be cached in memory,
+        or to LRUCache object to cache within budget
+        """
+        assert isinstance(value, (bool, LRUCache))
         self.__cache = value
 
+    @property
+    def columnar(self):
+        """True if Timeseries are stored in columnar format"""
+        return self.__columnar
+
+    @property
+    def converted(self):
+        """True if Timeseries of this object are already converted to datatypes"""
+        return self.__converted
+
     def set_group_keyname(self, index_keyname, group_func):
         """
         set index_keyname to group values for
@@ -286,7 +339,7 @@ class TimeseriesArray(object):
             if index_key not in self.keys():
                 # if this key is new, create empty Timeseries object
                 logging.debug("first entry for index_key : %s", index_key)
-                self[index_key] = Timeseries(self.__value_keynames)
+                self[index_key] = self.__ts_class(self.__value_keynames)
             if group_func is not None:
                 self[index_key].group_add(ts, values, group_func)
             else:
@@ -302,6 +355,22 @@ class TimeseriesArray(object):
                 logging.error(exc)
                 logging.error("some value_keys or ts_keyname are not numeric and float convertible, skipping this dataset: %s", data)
 
+    def add_columns(self, index_key, times, columns):
+        """
+        add whole columns of one new index_key at once, used for bulk loading
+        of already parsed raw data
+
+        parameters:
+        index_key <tuple> of <str> must not exist already
+        times <list> of <float> unique timestamps
+        columns <list> of <list> of <float> one for every value_keyname, same order
+        """
+        if index_key in self.__data:
+            raise KeyError("index_key %s exists already" % str(index_key))
+        if len(columns) != len(self.__value_keynames):
+            raise DataFormatError("there must be one column for every value_keyname %s" % self.__value_keynames)
+        self.__data[index_key] = self.__ts_class.from_columns(self.__value_keynames, times, columns)
+
     def group_add(self, data, group_func):
         """wrapper to be api consistent, DEPRECATED"""
         return self.add(data, group_func)
@@ -312,7 +381,8 @@ class TimeseriesArray(object):
         timeserie <Timeseries> object that holds the data
 
         append whole timeserie to existing data
-        data length must be the same, but start_ts and stop_ts can be slightly different for each key
+        data length must be the same, but start_ts and stop_ts can be slightly different for each key,
+        use align to get all Timeseries on one common time grid
         """
         #logging.debug("new start : %s, stop: %s, length %s", timeserie[0][0], timeserie[-1][0], len(timeserie))
         assert key not in self.keys()
@@ -327,6 +397,21 @@ class TimeseriesArray(object):
             logging.debug("this is the first timeseries")
         self[key] = timeserie
 
+    def align(self, interval, start_ts=None, stop_ts=None, fill="nan"):
+        """
+        return all Timeseries aligned to one common time grid
+
+        parameters:
+        interval <int> seconds between two time slots
+        start_ts <float> first time slot, defaults to first timestamp rounded down to interval
+        stop_ts <float> no time slot after stop_ts, defaults to last timestamp
+        fill <str> how to fill gaps, one of TimeseriesGrid.fill_policies
+
+        returns:
+        <TimeseriesGrid>
+        """
+        return TimeseriesGrid(self, interval, start_ts, stop_ts, fill)
+
     def old_groupby(self, fieldnum, group_func, time_func="avg"):
         """
         fieldnum <int>
@@ -371,7 +456,7 @@ class TimeseriesArray(object):
         """
         call convert method of every stored Timeseries, with given parameter
         """
-        if self.__cache is False:
+        if self.__cache is not True:
             raise AttributeError("operation only applicable in cache mode, set <TimeseriesArray>.cache=True")
         if colname not in self.__value_keynames:
             raise KeyError("colname %s not in defined columns" % colname)
@@ -402,7 +487,7 @@ class TimeseriesArray(object):
         return:
         None
         """
-        if self.__cache is False:
+        if self.__cache is not True:
             raise AttributeError("operation only applicable in cache mode, set <TimeseriesArray>.cache=True")
         if colname not in self.__value_keynames:
             raise KeyError("colname %s not in defined columns" % colname)
@@ -424,7 +509,7 @@ class TimeseriesArray(object):
         returns:
         None
         """
-        if self.__cache is False:
+        if self.__cache is not True:
             raise AttributeError("operation only applicable in cache mode, set <TimeseriesArray>.cache=True")
         if newcolname in self.__value_keynames:
             raise KeyError("newcolname %s already in defined columns" % newcolname)
@@ -442,7 +527,7 @@ class TimeseriesArray(object):
         returns:
         None
         """
-        if self.__cache is False:
+        if self.__cache is not True:
             raise AttributeError("operation only applicable in cache mode, set <TimeseriesArray>.cache=True")
         if colname not in self.__value_keynames:
             raise KeyError("colname %s not in defined columns" % colname)
@@ -460,7 +545,7 @@ class TimeseriesArray(object):
         returns:
         TimeseriesArray
         """
-        ret_data = TimeseriesArray(index_keynames=self.__index_keynames, value_keynames=colnames, ts_key=self.__ts_key)
+        ret_data = TimeseriesArray(index_keynames=self.__index_keynames, value_keynames=colnames, ts_key=self.__ts_key, columnar=self.__columnar)
         for key in self.keys():
             ret_data[key] = self[key].slice(colnames)
         return ret_data
@@ -481,11 +566,26 @@ class TimeseriesArray(object):
             key_dict = self.get_index_dict(key)
             # dump timeseries as dictionary and spice dict up with
             # key_dict
-            for row in self[key].to_dict():
+            for row in self[key].to_data():
                 row.update(key_dict)
                 yield row
 
-    def dump(self, outpath, overwrite=False):
+    def to_csv(self, headers=True, delimiter=","):
+        """
+        return all data csv formatted, one line for every row of every Timeseries,
+        starting with the values of index_keynames, lines are generated one by one
+
+        headers <bool> add header row or not, default True
+        delimiter <str> delimiter to use for csv, default ','
+        """
+        if headers is True:
+            yield delimiter.join(self.__index_keynames + (self.__ts_key, ) + tuple(self.__value_keynames))
+        for key in self.keys():
+            prefix = delimiter.join((str(value) for value in key))
+            for line in self[key].to_csv(self.__value_keynames, headers=False, delimiter=delimiter):
+                yield "%s%s%s" % (prefix, delimiter, line)
+
+    def dump(self, outpath, overwrite=False, container=False, compress=True, converted=False):
         """
         dump all data to directory in csv format, filename will be auto generated
 
@@ -493,29 +593,82 @@ class TimeseriesArray(object):
         outpath <str> must be existing directory
         overwrite <bool> overwrite existing Timeseries files, or not
             the TimeseriesArray file is witten nonetheless if this options is set or not
+        container <bool> store all Timeseries in one single TimeseriesArrayContainer file
+            instead of one csv file for every key, the container is always written
+        compress <bool> compress container, otherwise the container is memory mapped on load
+        converted <bool> store Timeseries converted to datatypes, so loading skips conversion,
+            Timeseries of converted objects are always stored converted
+        """
+        convert = converted and not self.__converted and bool(self.datatypes)
+        def items():
+            """Timeseries to store, converted copies if necessary"""
+            for key in self.keys():
+                timeseries = self[key]
+                if convert:
+                    timeseries = self.__convert(timeseries.slice(timeseries.headers))
+                yield key, timeseries
+        # stored Timeseries are converted with these datatypes
+        converted_datatypes = self.datatypes if convert or self.__converted else None
+        self.write_items(outpath, self.__index_keynames, self.__value_keynames, self.__ts_key, items(), overwrite, container, compress, converted_datatypes)
+
+    @staticmethod
+    def write_items(outpath, index_keynames, value_keynames, ts_key, items, overwrite=False, container=False, compress=True, converted=None):
         """
-        tsa_filename = self.get_dumpfilename(self.__index_keynames)
+        store Timeseries like dump, but read one by one from items, so the whole
+        TimeseriesArray has not to be in memory
+
+        parameters:
+        outpath <str> must be existing directory
+        index_keynames <tuple>
+        value_keynames <list>
+        ts_key <str>
+        items <iterable> of (<tuple> index_key, <Timeseries>)
+        overwrite <bool> overwrite existing Timeseries files, or not
+        container <bool> store all Timeseries in one single TimeseriesArrayContainer file
+        compress <bool> compress container, otherwise the container is memory mapped on load
+        converted <dict> datatypes the Timeseries are converted to, or None if stored raw
+        """
+        index_keynames = tuple(index_keynames)
+        tsa_filename = TimeseriesArray.get_dumpfilename(index_keynames)
         logging.debug("tsa_filename: %s", tsa_filename)
         tsa_outfilename = os.path.join(outpath, tsa_filename)
         outbuffer = {
-            "index_keys" : self.__index_keynames,
-            "value_keys" : self.__value_keynames,
-            "ts_key" : self.__ts_key,
-            "ts_filenames" : []
+            "index_keys" : index_keynames,
+            "value_keys" : list(value_keynames),
+            "ts_key" : ts_key,
+            "ts_filenames" : [],
+            "keys" : [] # decoded keys in order of ts_filenames, or container
         }
-        for key in self.keys():
-            timeseries = self[key]
-            ts_filename = self.get_ts_dumpfilename(key)
+        if converted is not None:
+            outbuffer["converted"] = converted
+        if container is True:
+            container_filename = TimeseriesArray.get_containerfilename(index_keynames)
+            logging.debug("dumping all keys to container %s", container_filename)
+            def container_items():
+                """remember keys while writing"""
+                for key, timeseries in items:
+                    outbuffer["keys"].append(key)
+                    yield key, timeseries
+            TimeseriesArrayContainer.write(os.path.join(outpath, container_filename), index_keynames, value_keynames, ts_key, container_items(), compress)
+            outbuffer["container"] = container_filename
+            outbuffer["key_index"] = KeyIndex(index_keynames, outbuffer["keys"]).to_data()
+            with atomic_open(tsa_outfilename) as outfile:
+                json.dump(outbuffer, outfile)
+            return
+        for key, timeseries in items:
+            ts_filename = TimeseriesArray.get_ts_dumpfilename(key)
             # skip dump, if file exists, and overwrite=False
             ts_outfilename = os.path.join(outpath, ts_filename)
             if not os.path.isfile(ts_outfilename) or overwrite:
                 logging.debug("dumping key %s to filename %s", key, ts_filename)
-                with gzip.open(ts_outfilename, "wt") as outfile:
+                with atomic_open(ts_outfilename, opener=gzip.open) as outfile:
                     timeseries.dump(outfile)
             outbuffer["ts_filenames"].append(ts_filename)
-        with open(tsa_outfilename, "wt") as outfile:
+            outbuffer["keys"].append(key)
+        outbuffer["key_index"] = KeyIndex(index_keynames, outbuffer["keys"]).to_data()
+        # written last, readers see the TimeseriesArray only if all Timeseries are complete
+        with atomic_open(tsa_outfilename) as outfile:
             json.dump(outbuffer, outfile)
-            outfile.flush()
     dump_split = dump
 
     @staticmethod
@@ -545,7 +698,20 @@ class TimeseriesArray(object):
         return "tsa_%s.json" % b64encode(index_keys)
 
     @staticmethod
-    def filtermatch(key_dict, filterkeys, matchtype):
+    def get_containerfilename(index_keys):
+        """
+        return filename of TimeseriesArrayContainer file
+
+        parameters:
+        index_keys <tuple> of particular index_keys of this Timeseries
+
+        returns:
+        <str>
+        """
+        return "tsa_%s.tsc" % b64encode(index_keys)
+
+    @staticmethod
+    def filtermatch(key_dict, filterkeys, matchtype, prefix=False):
         """
         key_dict is the whole index key, aka
         {hostname : test, instance:1, other:2}
@@ -554,7 +720,9 @@ class TimeseriesArray(object):
         {hostname : test}
         {hostname : test, instance: None, other: None}
 
-        TODO: to be improved
+        to select many keys use KeyIndex.match, which gives the same result
+
+        prefix <bool> values of filterkeys are prefixes
         """
         assert matchtype in ("and", "or")
         matched = 0
@@ -563,7 +731,7 @@ class TimeseriesArray(object):
                 if matchtype == "and": # and count them as matched
                     matched += 1
                 continue
-            if key_dict[key] == filterkeys[key]:
+            if key_dict[key] == filterkeys[key] or (prefix and key_dict[key].startswith(filterkeys[key])):
                 matched += 1
         # every key must match at AND
         if (matchtype == "and") and (matched == len(filterkeys.keys())):
@@ -574,10 +742,10 @@ class TimeseriesArray(object):
         return False
 
     @staticmethod
-    def get_ts_filenames(path, index_keys, filterkeys=None, matchtype="and"):
+    def get_ts_filenames(path, index_keys, filterkeys=None, matchtype="and", prefix=False):
         """
         filterkeys could be a part of existing index_keys
-        all matching keys will be used
+        all matching keys will be used, see KeyIndex.match_ids
         """
         tsa_filename = TimeseriesArray.get_dumpfilename(index_keys)
         logging.debug("tsa_filename: %s", tsa_filename)
@@ -588,53 +756,74 @@ class TimeseriesArray(object):
         logging.debug("value_keys: %s", data["value_keys"])
         logging.debug("ts_key: %s", data["ts_key"])
         logging.debug("number of ts files: %s", len(data["ts_filenames"]))
-        filenames = {}
-        for filename in data["ts_filenames"]:
-            logging.debug("parsing Timeseries filename %s", filename)
-            enc_key = filename.split(".")[0][3:] # only this pattern ts_(.*).csv.gz
-            key = eval(b64decode(enc_key))
-            key_dict = dict(zip(index_keys, key))
-            if filterkeys is not None:
-                if TimeseriesArray.filtermatch(key_dict, filterkeys, matchtype):
-                    logging.debug("adding tsa key : %s", key)
-                    filenames[key] = os.path.join(path, filename)
-            else:
-                # no filterkeys means every file is loaded
-                logging.debug("adding tsa key : %s", key)
-                filenames[key] = os.path.join(path, filename)
-        return filenames
+        if "keys" in data:
+            keys = [tuple(key) for key in data["keys"]]
+        else:
+            # older dumps, decode keys from filenames of pattern ts_(.*).csv.gz
+            keys = [b64decode_key(filename.split(".")[0][3:]) for filename in data["ts_filenames"]]
+        if filterkeys is None:
+            # no filterkeys means every file is loaded
+            key_ids = range(len(keys))
+        else:
+            # older dumps have no stored key_index, build one
+            key_ids = KeyIndex(index_keys, keys, data.get("key_index")).match_ids(filterkeys, matchtype, prefix)
+        return dict(((keys[key_id], os.path.join(path, data["ts_filenames"][key_id])) for key_id in key_ids))
 
     @staticmethod
-    def load(path, index_keys, filterkeys=None, index_pattern=None, matchtype="and", datatypes=None):
+    def load(path, index_keys, filterkeys=None, index_pattern=None, matchtype="and", datatypes=None, columnar=False, prefix=False):
         """
         load stored tsa data from directory <path>
 
         filterkeys could be a part of existing index_keys
-        all matching keys will be used
+        all matching keys will be used, selected with the stored KeyIndex
 
         index_keys <tuple> * required
         filterkeys <tuple> default None
         matchtype <str> default "and"
-        index_pattern <str> for use in re.compile(index_pattern)
+        index_pattern <str> for use in re.compile(index_pattern), only matched by filterkeys are tested
+        prefix <bool> values of filterkeys are prefixes
+        columnar <bool> load Timeseries as TimeseriesColumnar
+
+        Timeseries stored converted are not converted again, if datatypes
+        are given they have to match the stored ones
 
         return:
         <TimeseriesArray>
         """
         # get filename and load json structure
-        tsa_filename = TimeseriesArray.get_dumpfilename(index_keys)
-        with open(os.path.join(path, tsa_filename), "rt") as infile:
+        tsa_filename = os.path.abspath(os.path.join(path, TimeseriesArray.get_dumpfilename(index_keys)))
+        with open(tsa_filename, "rt") as infile:
             data = json.load(infile)
+            # every dump rewrites this file, so cached Timeseries of older versions are not used
+            cache_id = (tsa_filename, os.fstat(infile.fileno()).st_mtime_ns)
+        stored_converted = data.get("converted")
+        if stored_converted is not None:
+            if datatypes and datatypes != stored_converted:
+                raise DataFormatError("%s is stored converted to other datatypes %s" % (tsa_filename, stored_converted))
+            datatypes = stored_converted
         # create object
-        tsa = TimeseriesArray(data["index_keys"], data["value_keys"], data["ts_key"], datatypes=datatypes)
+        tsa = TimeseriesArray(data["index_keys"], data["value_keys"], data["ts_key"], datatypes=datatypes, columnar=columnar)
+        tsa.__cache_id = cache_id
+        tsa.__stored_converted = stored_converted is not None
+        tsa.__converted = bool(datatypes) # converted while autoloading if not stored converted
+        if "container" in data:
+            # all Timeseries in one file, read only the index now
+            tsa.__container = TimeseriesArrayContainer(os.path.join(path, data["container"]))
+            keys = [tuple(key) for key in data["keys"]] if data.get("keys") else list(tsa.__container.keys())
+            if filterkeys is not None:
+                keys = KeyIndex(index_keys, keys, data.get("key_index")).match(filterkeys, matchtype, prefix)
+            ts_filenames = dict.fromkeys(keys, tsa.__container.filename)
+        else:
+            ts_filenames = tsa.get_ts_filenames(path, index_keys, filterkeys, matchtype, prefix)
         # load full or filter some keys
         if index_pattern is None:
-            for key, filename in tsa.get_ts_filenames(path, index_keys, filterkeys, matchtype).items():
+            for key, filename in ts_filenames.items():
                 tsa.ts_autoload[key] = filename
                 tsa[key] = None
         else:
             logging.info("using index_pattern %s to filter index_keys", index_pattern)
             rex = re.compile(index_pattern)
-            for key, filename in tsa.get_ts_filenames(path, index_keys, filterkeys, matchtype).items():
+            for key, filename in ts_filenames.items():
                 m = rex.match(str(key))
                 if m is not None:
                     tsa.ts_autoload[key] = filename
@@ -655,15 +844,74 @@ class TimeseriesArray(object):
         if key in self.ts_autoload:
             filename = self.ts_autoload[key]
             logging.debug("auto-loading Timeseries from file %s", filename)
-            with gzip.open(filename, "rt") as infile:
-                timeseries = Timeseries.load_from_csv(infile)
-            # convert raw timeseries to datatype
-            for colname, datatype in self.datatypes.items():
-                if datatype == "asis":
-                    continue
-                timeseries.convert(colname, datatype, None)
-            return timeseries
+            if self.__container is not None:
+                timeseries = self.__container.read(key, self.__ts_class)
+            else:
+                with gzip.open(filename, "rt") as infile:
+                    timeseries = self.__ts_class.load_from_csv(infile)
+            if self.__stored_converted:
+                return timeseries
+            return self.__convert(timeseries)
         else:
             raise KeyError("key %s not in TimeseriesArray", key)
 
+    def __convert(self, timeseries):
+        """convert raw timeseries to datatypes, in place"""
+        for colname, datatype in self.datatypes.items():
+            if datatype == "asis":
+                continue
+            timeseries.convert(colname, datatype, None)
+        return timeseries
+
+    def get_converted(self, keys=None):
+        """
+        return new TimeseriesArray with copies of Timeseries converted to datatypes,
+        like TimeseriesArray.load does it with stored raw data, this object is not changed,
+        Timeseries of already converted objects are only copied
+
+        parameters:
+        keys <iterable> of index_keys to use, default all
+
+        returns:
+        <TimeseriesArray>
+        """
+        ret_data = TimeseriesArray(self.__index_keynames, self.__value_keynames, ts_key=self.__ts_key, datatypes=self.datatypes, columnar=self.__columnar)
+        ret_data.__converted = True
+        for key in (self.keys() if keys is None else keys):
+            timeseries = self[key]
+            if self.__converted:
+                ret_data[key] = timeseries.slice(timeseries.headers)
+            else:
+                ret_data[key] = self.__convert(timeseries.slice(timeseries.headers))
+        return ret_data
+
+    def select(self, keys):
+        """
+        return new TimeseriesArray with Timeseries of keys only, like
+        get_converted, but the Timeseries are shared with this object, not copied
+
+        parameters:
+        keys <iterable> of index_keys to use
+
+        returns:
+        <TimeseriesArray>
+        """
+        ret_data = TimeseriesArray(self.__index_keynames, self.__value_keynames, ts_key=self.__ts_key, datatypes=self.datatypes, columnar=self.__columnar)
+        ret_data.__converted = self.__converted
+        for key in keys:
+            ret_data[key] = self[key]
+        return ret_data
+
+    def convert_datatypes(self):
+        """
+        convert all Timeseries of this object to datatypes in place,
+        like get_converted, but without copies, already converted objects
+        are not changed
+        """
+        if self.__converted:
+            return
+        for key in self.keys():
+            self.__convert(self[key])
+        self.__converted = True
+
 TimeseriesArrayLazy = TimeseriesArray
@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for TimeseriesArrayContainer Class
+
+single file storage of all Timeseries of one TimeseriesArray,
+instead of one ts_<key>.csv.gz file for every index_key
+
+file layout:
+    <8 bytes> MAGIC
+    <8 bytes> unsigned long long offset of index
+    <8 bytes> unsigned long long length of index
+    blocks, one for every Timeseries, little endian doubles
+        all timestamps, followed by every column in order of headers
+        zlib compressed, or uncompressed and aligned to 8 bytes
+    index, zlib compressed JSON
+        {
+            "index_keys" : <list>,
+            "value_keys" : <list>,
+            "ts_key" : <str>,
+            "compress" : <bool>, missing in older files means True
+            "meta" : <dict> free usable by the writer, missing in older files means {}
+            "entries" : [[<list> key, <int> offset, <int> length, <int> rows, <list> headers, <str> ts_keyname], ...]
+        }
+
+uncompressed containers are memory mapped, the columns are handed out
+as read only memoryview slices of the mapping without copying
+
+timestamps of every block are strictly increasing, this is checked once
+by write, so readers do not have to check it again
+"""
+import sys
+import os
+import json
+import zlib
+import mmap
+import struct
+import logging
+from array import array
+from operator import lt
+from itertools import islice
+# own modules
+from AtomicFile import atomic_open as atomic_open
+from CustomExceptions import *
+
+
+class TimeseriesArrayContainer(object):
+    """
+    read access to one container file, only the index is read at
+    initialization, every Timeseries is read on request,
+    or sliced out of the memory mapped file if uncompressed
+    """
+    MAGIC = b"DLTSA\x00\x00\x01"
+    HEADER = struct.Struct("<8sQQ")
+
+    def __init__(self, filename):
+        """
+        parameters:
+        filename <str> container file, created by TimeseriesArrayContainer.write
+        """
+        self.__filename = filename
+        # the file stays open, so a rewritten container file does not affect this object
+        self.__file = open(filename, "rb")
+        magic, index_offset, index_length = self.HEADER.unpack(self.__file.read(self.HEADER.size))
+        if magic != self.MAGIC:
+            self.__file.close()
+            raise DataFormatError("%s is no TimeseriesArrayContainer file" % filename)
+        index = json.loads(zlib.decompress(os.pread(self.__file.fileno(), index_length, index_offset)).decode("utf-8"))
+        self.__compress = index.get("compress", True)
+        self.__mmap = None
+        self.__view = None
+        if not self.__compress:
+            # the mapping stays valid as long as any view exists
+            self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__view = memoryview(self.__mmap)
+            self.__file.close()
+        self.__index_keynames = tuple(index["index_keys"])
+        self.__value_keynames = list(index["value_keys"])
+        self.__ts_key = index["ts_key"]
+        self.__meta = index.get("meta", {})
+        self.__entries = {}
+        for key, offset, length, rows, headers, ts_keyname in index["entries"]:
+            self.__entries[tuple(key)] = (offset, length, rows, headers, ts_keyname)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        close container file, Timeseries of uncompressed containers
+        read before stay valid, the mapping is released with the last of them
+        """
+        if self.__view is not None:
+            self.__view.release()
+            self.__view = None
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                logging.debug("%s is still referenced by Timeseries", self.__filename)
+            self.__mmap = None
+        self.__file.close()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def keys(self):
+        """index_keys of all stored Timeseries, in stored order"""
+        return self.__entries.keys()
+
+    @property
+    def filename(self):
+        """filename of container"""
+        return self.__filename
+
+    @property
+    def compress(self):
+        """True if blocks are zlib compressed, False if memory mapped"""
+        return self.__compress
+
+    @property
+    def index_keynames(self):
+        """index_keynames of stored TimeseriesArray"""
+        return self.__index_keynames
+
+    @property
+    def value_keynames(self):
+        """value_keynames of stored TimeseriesArray"""
+        return self.__value_keynames
+
+    @property
+    def ts_key(self):
+        """ts_key of stored TimeseriesArray"""
+        return self.__ts_key
+
+    @property
+    def meta(self):
+        """additional information stored by the writer"""
+        return self.__meta
+
+    def read_columns(self, key):
+        """
+        read one Timeseries in column format
+
+        of uncompressed containers read only memoryviews of format "d"
+        are returned instead of arrays, without copying any data
+
+        parameters:
+        key <tuple> index_key
+
+        returns:
+        <tuple> (<list> headers, <array> timestamps, <list> of <array> one for every header)
+        """
+        offset, length, rows, headers, _ = self.__entries[key]
+        if self.__view is not None and sys.byteorder == "little":
+            data = self.__view[offset:offset + length].cast("d")
+        elif self.__view is not None:
+            data = array("d", self.__view[offset:offset + length].tobytes())
+            data.byteswap()
+        else:
+            # pread is thread safe, there is no shared file position
+            data = array("d")
+            data.frombytes(zlib.decompress(os.pread(self.__file.fileno(), length, offset)))
+            if sys.byteorder == "big":
+                data.byteswap()
+        if len(data) != rows * (len(headers) + 1):
+            raise DataFormatError("block of key %s in %s is corrupt" % (str(key), self.__filename))
+        columns = [data[num * rows:(num + 1) * rows] for num in range(1, len(headers) + 1)]
+        return headers, data[:rows], columns
+
+    def read(self, key, ts_class):
+        """
+        read one Timeseries, TimeseriesColumnar objects of uncompressed
+        containers reference the memory mapped data
+
+        parameters:
+        key <tuple> index_key
+        ts_class <class> Timeseries or TimeseriesColumnar
+
+        returns:
+        <ts_class>
+        """
+        headers, times, columns = self.read_columns(key)
+        if isinstance(times, memoryview):
+            return ts_class.from_views(headers, times, columns, self.__entries[key][4])
+        return ts_class.from_columns(headers, times, columns, self.__entries[key][4])
+
+    @staticmethod
+    def write(filename, index_keynames, value_keynames, ts_key, items, compress=True, meta=None):
+        """
+        write container file, the file is written to a temporary file first,
+        and renamed afterwards, so existing memory mappings of an older
+        version of this file stay valid
+
+        parameters:
+        filename <str>
+        index_keynames <tuple>
+        value_keynames <list>
+        ts_key <str>
+        items <iterable> of (<tuple> key, <Timeseries>) Timeseries or TimeseriesColumnar objects,
+            timestamps strictly increasing, otherwise DataFormatError is raised
+        compress <bool> zlib compress blocks, otherwise store them uncompressed to be memory mapped
+        meta <dict> JSON serializable additional information, available as meta property
+        """
+        header = TimeseriesArrayContainer.HEADER
+        entries = []
+        with atomic_open(filename, "wb") as outfile:
+            outfile.write(header.pack(TimeseriesArrayContainer.MAGIC, 0, 0))
+            for key, timeseries in items:
+                headers = list(timeseries.headers)
+                data = array("d", timeseries.get_column(timeseries.ts_keyname))
+                if not all(map(lt, data, islice(data, 1, None))):
+                    raise DataFormatError("timestamps of key %s are not strictly increasing" % str(key))
+                rows = len(data)
+                for colname in headers:
+                    data.extend(timeseries.get_column(colname))
+                if sys.byteorder == "big":
+                    data.byteswap()
+                if compress:
+                    block = zlib.compress(data.tobytes())
+                else:
+                    block = data.tobytes()
+                    # align to 8 bytes, to cast the memory mapped block to doubles
+                    outfile.write(b"\x00" * (-outfile.tell() % 8))
+                entries.append((list(key), outfile.tell(), len(block), rows, headers, timeseries.ts_keyname))
+                outfile.write(block)
+            index = {
+                "index_keys" : list(index_keynames),
+                "value_keys" : list(value_keynames),
+                "ts_key" : ts_key,
+                "compress" : compress,
+                "meta" : meta if meta is not None else {},
+                "entries" : entries
+            }
+            index_block = zlib.compress(json.dumps(index).encode("utf-8"))
+            index_offset = outfile.tell()
+            outfile.write(index_block)
+            outfile.seek(0)
+            outfile.write(header.pack(TimeseriesArrayContainer.MAGIC, index_offset, len(index_block)))
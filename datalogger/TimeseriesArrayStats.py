@@ -7,12 +7,17 @@ automatically calculates all TimeseriesStats for every Timeseries in TimeseriesA
 at initialization
 """
 import sys
+import ast
 import json
 import base64
 import os
 import logging
+import heapq
 # own modules
+from AtomicFile import atomic_open as atomic_open
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from TimeseriesArrayStatsContainer import TimeseriesArrayStatsContainer as TimeseriesArrayStatsContainer
+from KeyIndex import KeyIndex as KeyIndex
 from CustomExceptions import *
 
 #################### hack begin ##########################
@@ -39,6 +44,43 @@ def _b64decode(encoded):
     #print("%s -> %s" % (encoded, decoded))
     return decoded
 
+def b64decode_key(encoded):
+    """
+    decode key tuple from base64 encoded part of filename,
+    safe replacement for eval(b64decode(encoded))
+
+    strings written by b64encode are split directly, everything else,
+    like escaped python 2 unicode representations, goes to ast.literal_eval
+
+    parameters:
+    encoded <str> or <bytes> urlsafe or standard base64
+
+    returns:
+    <tuple>
+
+    raises:
+    DataFormatError if encoded is not a representation of a tuple
+    """
+    try:
+        decoded = base64.urlsafe_b64decode(encoded).decode("utf-8")
+    except (TypeError, ValueError) as exc:
+        raise DataFormatError("%s is not base64 encoded: %s" % (encoded, exc))
+    if decoded.startswith("(u'") and decoded.endswith("',)"):
+        # single value, quotes are not escaped by b64encode
+        if "\\" not in decoded:
+            return (decoded[3:-3], )
+    elif decoded.startswith("(u'") and decoded.endswith("')"):
+        parts = decoded[3:-2].split("', u'")
+        if not any(("'" in part or "\\" in part) for part in parts):
+            return tuple(parts)
+    try:
+        key = ast.literal_eval(decoded)
+    except (SyntaxError, ValueError) as exc:
+        raise DataFormatError("%s is not a valid key representation: %s" % (decoded, exc))
+    if not isinstance(key, tuple):
+        raise DataFormatError("%s is not a tuple" % decoded)
+    return key
+
 
 if sys.version_info < (3,0):
     print("using python 2 coding funtions")
@@ -73,6 +115,25 @@ class TimeseriesArrayStats(object):
             except TimeseriesEmptyError as exc:
                 logging.info("Timeseries for key %s is length zero, skipping", index_key)
 
+    @staticmethod
+    def from_stats(index_keynames, value_keynames, stats):
+        """
+        create TimeseriesArrayStats from existing TimeseriesStats objects
+
+        parameters:
+        index_keynames <tuple>
+        value_keynames <tuple>
+        stats <dict> index_key : <TimeseriesStats>
+
+        returns:
+        <TimeseriesArrayStats>
+        """
+        tsastats = TimeseriesArrayStats.__new__(TimeseriesArrayStats)
+        tsastats.__index_keynames = tuple(index_keynames)
+        tsastats.__value_keynames = tuple(value_keynames)
+        tsastats.__stats = dict(stats)
+        return tsastats
+
     def __str__(self):
         return json.dumps(self.to_data(), indent=4, sort_keys=True)
 
@@ -145,7 +206,7 @@ class TimeseriesArrayStats(object):
             data = {}
             for value_key in value_keys:
                 data[value_key] = tsstat[value_key]
-            tsstat_data.append((key, json.dumps(data)))
+            tsstat_data.append((key, data))
         outdata.append(tsstat_data)
         new_tsastat = TimeseriesArrayStats.from_json(json.dumps(outdata))
         return new_tsastat
@@ -173,6 +234,41 @@ class TimeseriesArrayStats(object):
                 ret_data[key] = t_stat.stats[value_key]
         return ret_data
 
+    def top_n(self, value_key, stat_func_name, n=10, reverse=True):
+        """
+        return the n keys with highest values of value_key and stat_func_name,
+        same as TimeseriesArrayStatsContainer.top_n
+
+        parameters:
+        value_key <str>
+        stat_func_name <str>
+        n <int> number of keys to return
+        reverse <bool> True for highest values, False for lowest values
+
+        returns:
+        <list> of (<tuple> key, <float> value) best first
+        """
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return select(n, ((key, tsstats[value_key][stat_func_name]) for key, tsstats in self.__stats.items()), key=lambda item: item[1])
+
+    def filter(self, value_key, stat_func_name, minimum=None, maximum=None):
+        """
+        return keys with minimum <= value <= maximum of value_key and stat_func_name,
+        same as TimeseriesArrayStatsContainer.filter
+
+        parameters:
+        value_key <str>
+        stat_func_name <str>
+        minimum <float> None for no lower limit
+        maximum <float> None for no upper limit
+
+        returns:
+        <list> of (<tuple> key, <float> value)
+        """
+        lower = float("-inf") if minimum is None else minimum
+        upper = float("inf") if maximum is None else maximum
+        return [(key, tsstats[value_key][stat_func_name]) for key, tsstats in self.__stats.items() if lower <= tsstats[value_key][stat_func_name] <= upper]
+
     @staticmethod
     def _get_tsstat_dumpfilename(key):
         """
@@ -188,6 +284,20 @@ class TimeseriesArrayStats(object):
         """
         return "tsstat_%s.json" % b64encode(key)
 
+    @staticmethod
+    def _get_tsstate_dumpfilename(key):
+        """
+        create filename for StatsState data of stored TimeseriesStats objects
+        from given key, see TimeseriesStats.dump_state
+
+        parameters:
+        key <tuple>
+
+        returns:
+        <str>
+        """
+        return "tsstate_%s.json" % b64encode(key)
+
     @staticmethod
     def get_dumpfilename(index_keys):
         """
@@ -203,7 +313,20 @@ class TimeseriesArrayStats(object):
         """
         return "tsastat_%s.json" % b64encode(index_keys)
 
-    def dump(self, outpath, overwrite=False):
+    @staticmethod
+    def get_containerfilename(index_keys):
+        """
+        return filename of TimeseriesArrayStatsContainer file
+
+        parameters:
+        index_keys <tuple>
+
+        returns:
+        <str>
+        """
+        return "tsastat_%s.tss" % b64encode(index_keys)
+
+    def dump(self, outpath, overwrite=False, container=False):
         """
         dump internal data to json file
         the filename is automatically created from index_keys
@@ -211,51 +334,50 @@ class TimeseriesArrayStats(object):
         parameters:
         outpath <str> path wehere json file will be placed
         overwrite <bool> wheter or not a existing file should be overwritten
+        container <bool> store all TimeseriesStats in one single TimeseriesArrayStatsContainer file
+            instead of one json file for every key, the container is always written
         """
         #logging.info("index_keys: %s", self.__index_keynames)
         outfilename = os.path.join(outpath, self.get_dumpfilename(self.__index_keynames))
         outdata = {
             "index_keys" : self.__index_keynames,
             "value_keys" : self.__value_keynames,
-            "tsstat_filenames" : []
+            "tsstat_filenames" : [],
+            "keys" : [] # decoded keys in order of tsstat_filenames
         }
-        for key, tsstats in self.__stats.items():
-            filename = self._get_tsstat_dumpfilename(key)
-            fullfilename = os.path.join(outpath, filename)
-            if (not os.path.isfile(fullfilename)) or (overwrite is True):
-                with open(fullfilename, "wt") as outfile:
-                    tsstats.dump(outfile)
-            outdata["tsstat_filenames"].append(filename)
-        with open(outfilename, "wt") as outfile:
+        if container is True:
+            container_filename = self.get_containerfilename(self.__index_keynames)
+            TimeseriesArrayStatsContainer.write(os.path.join(outpath, container_filename), self)
+            outdata["container"] = container_filename
+            outdata["keys"] = list(self.__stats.keys())
+        else:
+            for key, tsstats in self.__stats.items():
+                filename = self._get_tsstat_dumpfilename(key)
+                fullfilename = os.path.join(outpath, filename)
+                if (not os.path.isfile(fullfilename)) or (overwrite is True):
+                    with atomic_open(fullfilename) as outfile:
+                        tsstats.dump(outfile)
+                    state_filename = os.path.join(outpath, self._get_tsstate_dumpfilename(key))
+                    if tsstats.has_state:
+                        with atomic_open(state_filename) as outfile:
+                            tsstats.dump_state(outfile)
+                    elif os.path.isfile(state_filename):
+                        os.unlink(state_filename) # left from a former dump
+                outdata["tsstat_filenames"].append(filename)
+                outdata["keys"].append(key)
+        outdata["key_index"] = KeyIndex(self.__index_keynames, outdata["keys"]).to_data()
+        # written last, readers see the TimeseriesArrayStats only if all TimeseriesStats are complete
+        with atomic_open(outfilename) as outfile:
             json.dump(outdata, outfile)
 
     @staticmethod
-    def _filtermatch(key_dict, filterkeys, matchtype):
-        """
-        key_dict is the whole index key, aka
-        {hostname : test, instance:1, other:2}
-
-        filterkey is part
-        {hostname : test}
-        """
-        assert matchtype in ("and", "or")
-        matched = 0
-        for key in filterkeys.keys():
-            if key_dict[key] == filterkeys[key]:
-                matched += 1
-        # every key must match at AND
-        if (matchtype == "and") and (matched == len(filterkeys.keys())):
-            return True
-        # at least one key must match at OR
-        elif (matchtype == "or") and (matched > 0):
-            return True
-        return False
-
-    @staticmethod
-    def _get_load_filenames(path, index_keys, filterkeys=None, matchtype="and"):
+    def _get_load_keys(path, index_keys, filterkeys=None, matchtype="and", prefix=False):
         """
         filterkeys could be a part of existing index_keys
-        all matching keys will be used
+        all matching keys will be used, see KeyIndex.match_ids
+
+        returns:
+        <tuple> of <dict> stored json data, <list> of <tuple> keys, <iterable> of <int> matching positions in keys
         """
         tsastat_filename = TimeseriesArrayStats.get_dumpfilename(index_keys)
         logging.debug("tsastat_filename: %s", tsastat_filename)
@@ -265,30 +387,44 @@ class TimeseriesArrayStats(object):
         logging.debug("index_keys: %s", data["index_keys"])
         logging.debug("value_keys: %s", data["value_keys"])
         logging.debug("number of ts files: %s", len(data["tsstat_filenames"]))
-        filenames = {}
-        for filename in data["tsstat_filenames"]:
-            logging.debug("reading key for tsstat from file %s", filename)
-            enc_key = filename.split(".")[0][7:] # only this pattern tsstat_(.*).json
-            key = eval(b64decode(str(enc_key))) # must be str not unicode
-            key_dict = dict(zip(index_keys, key))
-            if filterkeys is not None:
-                if TimeseriesArrayStats._filtermatch(key_dict, filterkeys, matchtype):
-                    logging.debug("adding tsastat key : %s", key)
-                    filenames[key] = os.path.join(path, filename)
-            else:
-                # no filterkeys means every file is added
-                logging.debug("adding tsa key : %s", key)
-                filenames[key] = os.path.join(path, filename)
-        return filenames
+        if "keys" in data:
+            keys = [tuple(key) for key in data["keys"]]
+        else:
+            # older dumps, decode keys from filenames of pattern tsstat_(.*).json
+            keys = [b64decode_key(filename.split(".")[0][7:]) for filename in data["tsstat_filenames"]]
+        if filterkeys is None:
+            # no filterkeys means every file is added
+            key_ids = range(len(keys))
+        else:
+            # older dumps have no stored key_index, build one
+            key_ids = KeyIndex(index_keys, keys, data.get("key_index")).match_ids(filterkeys, matchtype, prefix)
+        return data, keys, key_ids
+
+    @staticmethod
+    def _get_load_filenames(path, index_keys, filterkeys=None, matchtype="and", prefix=False):
+        """
+        filterkeys could be a part of existing index_keys
+        all matching keys will be used, see KeyIndex.match_ids
+
+        dumps with container have no single files, every key
+        will point to the container file
+        """
+        data, keys, key_ids = TimeseriesArrayStats._get_load_keys(path, index_keys, filterkeys, matchtype, prefix)
+        if "container" in data:
+            return dict(((keys[key_id], os.path.join(path, data["container"])) for key_id in key_ids))
+        return dict(((keys[key_id], os.path.join(path, data["tsstat_filenames"][key_id])) for key_id in key_ids))
 
     @staticmethod
-    def load(path, index_keys, filterkeys=None, matchtype="and"):
+    def load(path, index_keys, filterkeys=None, matchtype="and", prefix=False):
         """
         load stored json file (with dump() created) and return TimeseriesArrayStats object
 
         parameters:
         path <str> path to search for stored json file, the filename is automatically created from given index_keys
         index_keys <tuple> list of index_keys
+        filterkeys <dict> load only matching keys, None values are ignored
+        matchtype <str> "and" or "or"
+        prefix <bool> values of filterkeys are prefixes
 
         returns:
         <TimeseriesArray>
@@ -296,8 +432,7 @@ class TimeseriesArrayStats(object):
         #logging.info("index_keys: %s", index_keys)
         infilename = os.path.join(path, TimeseriesArrayStats.get_dumpfilename(index_keys))
         try:
-            fh = open(infilename, "rb")
-            indata = json.load(fh)
+            indata, keys, key_ids = TimeseriesArrayStats._get_load_keys(path, index_keys, filterkeys, matchtype, prefix)
         except Exception as exc:
             logging.exception(exc)
             logging.error("something went wrong while loading %s", infilename)
@@ -307,11 +442,17 @@ class TimeseriesArrayStats(object):
         tsastats.__index_keynames = tuple(indata["index_keys"])
         tsastats.__value_keynames = tuple(indata["value_keys"])
         tsastats.__stats = {}
-        #for filename in indata["tsstat_filenames"]:
-        for key, filename in tsastats._get_load_filenames(path, index_keys, filterkeys, matchtype).items():
+        if "container" in indata:
+            # only the matching keys are read from container
+            with TimeseriesArrayStatsContainer(os.path.join(path, indata["container"])) as container:
+                for key_id in key_ids:
+                    tsastats.__stats[keys[key_id]] = container.read(keys[key_id])
+            return tsastats
+        for key_id in key_ids:
             #logging.info("loading TimeseriesStats object from %s", fullfilename)
-            with open(filename, "rt") as infile:
-                tsastats.__stats[key] = TimeseriesStats.load(infile)
+            state_filename = os.path.join(path, TimeseriesArrayStats._get_tsstate_dumpfilename(keys[key_id]))
+            with open(os.path.join(path, indata["tsstat_filenames"][key_id]), "rt") as infile:
+                tsastats.__stats[keys[key_id]] = TimeseriesStats.load(infile, state_filename)
         return tsastats
 
     def to_data(self):
@@ -0,0 +1,266 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for TimeseriesArrayStatsContainer Class
+
+single file storage of all TimeseriesStats of one TimeseriesArrayStats,
+instead of one tsstat_<key>.json file for every index_key
+
+file layout:
+    <8 bytes> MAGIC
+    <8 bytes> unsigned long long offset of index
+    <8 bytes> unsigned long long length of index
+    block of little endian doubles, one column for every
+        value_keyname and stat_func_name, every column has one value
+        for every key in order of keys
+    optional block of little endian doubles, one column for every
+        value_keyname and state_value_name, the StatsState of every key,
+        see StatsState.to_values
+    index, zlib compressed JSON
+        {
+            "index_keys" : <list>,
+            "value_keys" : <list>,
+            "stat_func_names" : <list>,
+            "int_stat_func_names" : <list> stat_func_names with integer values,
+            "state_value_names" : <list> names of state columns, missing if there is no state block,
+            "keys" : <list> of <list> key
+        }
+
+the file is memory mapped, queries on one value_keyname and stat_func_name
+like top_n read only one column, TimeseriesStats are only created on request
+"""
+import sys
+import os
+import json
+import zlib
+import mmap
+import heapq
+import struct
+import logging
+from array import array
+# own modules
+from AtomicFile import atomic_open as atomic_open
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from TimeseriesStats import StatsState as StatsState
+from CustomExceptions import *
+
+
+class TimeseriesArrayStatsContainer(object):
+    """
+    read access to one stats container file
+    """
+    MAGIC = b"DLTSS\x00\x00\x01"
+    HEADER = struct.Struct("<8sQQ")
+
+    def __init__(self, filename):
+        """
+        parameters:
+        filename <str> container file, created by TimeseriesArrayStatsContainer.write
+        """
+        self.__filename = filename
+        with open(filename, "rb") as infile:
+            magic, index_offset, index_length = self.HEADER.unpack(infile.read(self.HEADER.size))
+            if magic != self.MAGIC:
+                raise DataFormatError("%s is no TimeseriesArrayStatsContainer file" % filename)
+            infile.seek(index_offset)
+            index = json.loads(zlib.decompress(infile.read(index_length)).decode("utf-8"))
+            # the mapping stays valid as long as any view exists
+            self.__mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__view = memoryview(self.__mmap)[self.HEADER.size:index_offset]
+        if sys.byteorder == "little":
+            self.__view = self.__view.cast("d")
+        else:
+            values = array("d", self.__view.tobytes())
+            values.byteswap()
+            self.__view = memoryview(values)
+        self.__index_keynames = tuple(index["index_keys"])
+        self.__value_keynames = tuple(index["value_keys"])
+        self.__stat_func_names = tuple(index["stat_func_names"])
+        self.__int_stat_func_names = frozenset(index["int_stat_func_names"])
+        self.__state_value_names = tuple(index.get("state_value_names", ())) # older containers have no states
+        self.__keys = [tuple(key) for key in index["keys"]]
+        self.__key_ids = dict(((key, key_id) for key_id, key in enumerate(self.__keys)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        release the mapping of container file, columns returned by
+        get_column before stay valid, the mapping is released with the last of them
+        """
+        self.__view.release()
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                logging.debug("%s is still referenced by columns", self.__filename)
+            self.__mmap = None
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __contains__(self, key):
+        return key in self.__key_ids
+
+    def __getitem__(self, key):
+        return self.read(key)
+
+    def keys(self):
+        """index_keys of all stored TimeseriesStats, in stored order"""
+        return self.__keys
+
+    @property
+    def filename(self):
+        """filename of container"""
+        return self.__filename
+
+    @property
+    def index_keynames(self):
+        """index_keynames of stored TimeseriesArrayStats"""
+        return self.__index_keynames
+
+    @property
+    def value_keynames(self):
+        """value_keynames of stored TimeseriesArrayStats"""
+        return self.__value_keynames
+
+    @property
+    def stat_func_names(self):
+        """names of stored statistical functions"""
+        return self.__stat_func_names
+
+    def get_column(self, value_keyname, stat_func_name):
+        """
+        return values of one value_keyname and stat_func_name for every key
+
+        parameters:
+        value_keyname <str>
+        stat_func_name <str>
+
+        returns:
+        <memoryview> of <float> in order of keys
+        """
+        try:
+            colnum = self.__value_keynames.index(value_keyname) * len(self.__stat_func_names) + self.__stat_func_names.index(stat_func_name)
+        except ValueError:
+            raise KeyError("value_keyname %s or stat_func_name %s not stored" % (value_keyname, stat_func_name))
+        return self.__view[colnum * len(self.__keys):(colnum + 1) * len(self.__keys)]
+
+    def read(self, key):
+        """
+        return TimeseriesStats of one key
+
+        parameters:
+        key <tuple>
+
+        returns:
+        <TimeseriesStats>
+        """
+        key_id = self.__key_ids[key]
+        nkeys = len(self.__keys)
+        stats = {}
+        colnum = 0
+        for value_keyname in self.__value_keynames:
+            stats[value_keyname] = {}
+            for stat_func_name in self.__stat_func_names:
+                value = self.__view[colnum * nkeys + key_id]
+                stats[value_keyname][stat_func_name] = int(value) if stat_func_name in self.__int_stat_func_names else value
+                colnum += 1
+        tsstats = TimeseriesStats.__new__(TimeseriesStats)
+        tsstats.stats = stats
+        if self.__state_value_names:
+            states = {}
+            for value_keyname in self.__value_keynames:
+                values = [self.__view[(colnum + offset) * nkeys + key_id] for offset in range(len(self.__state_value_names))]
+                states[value_keyname] = StatsState.from_values(stats[value_keyname], values)
+                colnum += len(self.__state_value_names)
+            tsstats.state = states
+        return tsstats
+
+    def top_n(self, value_keyname, stat_func_name, n=10, reverse=True):
+        """
+        return the n keys with highest values of value_keyname and stat_func_name,
+        only this one column is read
+
+        parameters:
+        value_keyname <str>
+        stat_func_name <str>
+        n <int> number of keys to return
+        reverse <bool> True for highest values, False for lowest values
+
+        returns:
+        <list> of (<tuple> key, <float> value) best first
+        """
+        column = self.get_column(value_keyname, stat_func_name)
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return [(self.__keys[key_id], column[key_id]) for key_id in select(n, range(len(column)), key=column.__getitem__)]
+
+    def filter(self, value_keyname, stat_func_name, minimum=None, maximum=None):
+        """
+        return keys with minimum <= value <= maximum of value_keyname and stat_func_name,
+        only this one column is read
+
+        parameters:
+        value_keyname <str>
+        stat_func_name <str>
+        minimum <float> None for no lower limit
+        maximum <float> None for no upper limit
+
+        returns:
+        <list> of (<tuple> key, <float> value) in order of keys
+        """
+        column = self.get_column(value_keyname, stat_func_name)
+        lower = float("-inf") if minimum is None else minimum
+        upper = float("inf") if maximum is None else maximum
+        return [(self.__keys[key_id], value) for key_id, value in enumerate(column) if lower <= value <= upper]
+
+    @staticmethod
+    def write(filename, tsastats):
+        """
+        write container file, the file is written to a temporary file first,
+        and renamed afterwards, so existing memory mappings of an older
+        version of this file stay valid
+
+        parameters:
+        filename <str>
+        tsastats <TimeseriesArrayStats>
+        """
+        keys = list(tsastats.keys())
+        value_keynames = list(tsastats.value_keynames)
+        stat_func_names = list(TimeseriesStats.stat_funcs.keys())
+        int_stat_func_names = set(stat_func_names)
+        data = array("d")
+        for value_keyname in value_keynames:
+            for stat_func_name in stat_func_names:
+                values = [tsastats[key][value_keyname][stat_func_name] for key in keys]
+                if not all((isinstance(value, int) for value in values)):
+                    int_stat_func_names.discard(stat_func_name)
+                data.extend(values)
+        # states only if known for every key, derived states are not worth storing
+        with_state = len(keys) > 0 and all((tsastats[key].has_state for key in keys))
+        if with_state:
+            for value_keyname in value_keynames:
+                rows = [tsastats[key].state[value_keyname].to_values() for key in keys]
+                for values in zip(*rows):
+                    data.extend(values)
+        if sys.byteorder == "big":
+            data.byteswap()
+        index = {
+            "index_keys" : list(tsastats.index_keynames),
+            "value_keys" : value_keynames,
+            "stat_func_names" : stat_func_names,
+            "int_stat_func_names" : sorted(int_stat_func_names) if keys else [],
+            "keys" : [list(key) for key in keys],
+        }
+        if with_state:
+            index["state_value_names"] = StatsState.get_value_names()
+        index_block = zlib.compress(json.dumps(index).encode("utf-8"))
+        header = TimeseriesArrayStatsContainer.HEADER
+        with atomic_open(filename, "wb") as outfile:
+            outfile.write(header.pack(TimeseriesArrayStatsContainer.MAGIC, header.size + len(data) * data.itemsize, len(index_block)))
+            outfile.write(data.tobytes())
+            outfile.write(index_block)
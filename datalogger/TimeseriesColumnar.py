@@ -0,0 +1,700 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+Module for class TimeseriesColumnar
+
+array backed variant of Timeseries, timestamps and every value column are
+stored in contiguous float64 arrays instead of one python list per row,
+or in read only memoryviews of format "d", see from_views
+"""
+import logging
+import bisect
+from array import array
+from operator import lt
+from itertools import islice
+# own modules
+from CustomExceptions import *
+from TimeseriesStats import TimeseriesStats as TimeseriesStats
+from Timeseries import Timeseries as Timeseries
+
+
+class TimeseriesColumnar(object):
+    """
+    Timeseries Object for one specific index combination, columnar storage
+
+    ts_keyname -> array("d") [ ts1, ts2, ts3, ...]
+    headers[0] -> array("d") [ col1, col1, col1, ...]
+    headers[1] -> array("d") [ col2, col2, col2, ...]
+    ...
+
+    same public API as Timeseries, rows are assembled on access
+    all column values have to be numerical
+    """
+
+    datatype_mapper = Timeseries.datatype_mapper
+
+    def __init__(self, headers, ts_keyname="ts"):
+        """
+        headers <list> column names of values
+        ts_keyname <str> name of timestamp column
+
+        all header columns have to be strictly numeric
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.__ts_keyname = ts_keyname
+        self.__headers = list([value for value in headers]) # also the number of columns
+        self.__times = array("d")
+        self.__columns = [array("d") for _ in self.__headers]
+        self.__sorted = True # timestamps are strictly increasing
+        self.__views = False # columns are read only memoryviews
+
+    @classmethod
+    def from_columns(cls, headers, times, columns, ts_keyname="ts"):
+        """
+        create new object from already existing columns
+
+        rows with duplicate timestamps are skipped like in add, the
+        first one wins, like Timeseries.from_columns
+
+        parameters:
+        headers <list> column names of values
+        times <iterable> of <float> timestamps, should be strictly increasing
+        columns <list> of <iterable> of <float> one for every header
+        ts_keyname <str> name of timestamp column
+
+        returns:
+        <TimeseriesColumnar>
+        """
+        timeseries = cls(headers, ts_keyname)
+        times = array("d", times)
+        columns = [array("d", column) for column in columns]
+        if any(len(column) != len(times) for column in columns):
+            raise DataFormatError("all columns must have the same length as timestamps")
+        timeseries.__sorted = cls.__is_sorted(times)
+        if not timeseries.__sorted and len(set(times)) != len(times):
+            seen = set()
+            rownums = []
+            for rownum, timestamp in enumerate(times):
+                if timestamp not in seen:
+                    seen.add(timestamp)
+                    rownums.append(rownum)
+            times = array("d", (times[rownum] for rownum in rownums))
+            columns = [array("d", (column[rownum] for rownum in rownums)) for column in columns]
+        timeseries.__times = times
+        timeseries.__columns = columns
+        return timeseries
+
+    @classmethod
+    def from_views(cls, headers, times, columns, ts_keyname="ts"):
+        """
+        create new object referencing existing read only memoryviews
+        of format "d" without copying, like columns of memory mapped files
+
+        the views are copied to arrays on the first modification of existing
+        data, adding and removing columns works without copying
+
+        timestamps are not checked again, like blocks of
+        TimeseriesArrayContainer, which are checked when written
+
+        parameters:
+        headers <list> column names of values
+        times <memoryview> of <float> timestamps, strictly increasing
+        columns <list> of <memoryview> of <float> one for every header
+        ts_keyname <str> name of timestamp column
+
+        returns:
+        <TimeseriesColumnar>
+        """
+        timeseries = cls(headers, ts_keyname)
+        timeseries.__times = times
+        timeseries.__columns = list(columns)
+        if any(len(column) != len(times) for column in timeseries.__columns):
+            raise DataFormatError("all columns must have the same length as timestamps")
+        timeseries.__views = True
+        return timeseries
+
+    @staticmethod
+    def __is_sorted(times):
+        """return True if timestamps in times are strictly increasing"""
+        return all(map(lt, times, islice(times, 1, None)))
+
+    @property
+    def ts_keyname(self):
+        """name of timestamp key"""
+        return self.__ts_keyname
+
+    @ts_keyname.setter
+    def ts_keyname(self, value):
+        assert value not in self.__headers
+        self.__ts_keyname = value
+
+    @property
+    def headers(self):
+        """return list of headers (without timestamp)"""
+        return self.__headers
+
+    @headers.setter
+    def headers(self, value):
+        self.__headers = list(value)
+
+    @property
+    def colnames(self):
+        """return list of columns (including timestamp)"""
+        colnames = [self.__ts_keyname, ] + self.__headers
+        return tuple(colnames)
+
+    @property
+    def data(self):
+        """
+        return row representation of internal data, like Timeseries.data
+        this is a copy, changes will not be reflected in internal storage
+        """
+        return [self.__get_row(index) for index in range(len(self.__times))]
+
+    @property
+    def start_ts(self):
+        """return first recorded timestamp"""
+        return self.__times[0]
+
+    @property
+    def stop_ts(self):
+        """return last recorded timestamp"""
+        return self.__times[-1]
+
+    @property
+    def stats(self):
+        """return TimeseriesStats"""
+        return TimeseriesStats(self)
+
+    @property
+    def interval(self):
+        """
+        return median time interval between two entries
+        """
+        t_zero = self.__times[0]
+        return sum(((timestamp - t_zero) / (index + 1) for index, timestamp in enumerate(self.__times))) / len(self.__times)
+
+    @property
+    def datatypes(self):
+        return list(self.datatype_mapper.keys())
+
+    @property
+    def nbytes(self):
+        """
+        return approximate memory usage in bytes, 8 bytes per value,
+        also for memoryviews of memory mapped files
+        """
+        return len(self.__times) * (len(self.__columns) + 1) * 8
+
+    def __eq__(self, other):
+        if self.__headers != other.headers:
+            raise AssertionError("headers are different")
+        if self.ts_keyname != other.ts_keyname:
+            raise AssertionError("ts_keyname is different")
+        if len(self) != len(other):
+            raise AssertionError("data length is different, self %d, other %d" % (len(self), len(other)))
+        if isinstance(other, TimeseriesColumnar):
+            if self.__times != other.get_column(self.__ts_keyname):
+                raise AssertionError("data is different")
+            for colname, column in zip(self.__headers, self.__columns):
+                if column != other.get_column(colname):
+                    raise AssertionError("data is different")
+        elif self.data != other.data:
+            raise AssertionError("data is different")
+        return True
+
+    def __len__(self):
+        """
+        return length of timeseries data
+        """
+        return len(self.__times)
+
+    def __contains__(self, value):
+        """
+        mimic contains behaviour
+        something in self
+        """
+        return value in self.data
+
+    def __iter__(self):
+        """
+        mimic iter behaviour
+        """
+        for index in range(len(self.__times)):
+            yield self.__get_row(index)
+
+    def __getitem__(self, key):
+        """
+        implement sophisticated __getitem__ function
+
+        self[<int>row] -> returns row -> <list>
+        self[<float>timestamp] -> returns row where timestamp matches -> <list>
+        self[colname] -> returns all values of colname -> <tuple>
+        self[<int>row, <int>col] -> returns value at row, colnum -> <float>
+        self[<int>row, colname] -> returns value at row of colname -> <float>
+        """
+        # if key is int treat it as row of data
+        if isinstance(key, int):
+            return self.__get_row(key)
+        # if key is double-item tuple treat it position in matrix
+        elif isinstance(key, tuple):
+            row, col = key
+            rownum = None
+            # convert row to rownum, depending on type
+            if type(row) == int:
+                rownum = row
+            elif type(row) == float:
+                rownum = self.__find(row)
+                if rownum is None:
+                    raise KeyError("Timstamp %f not found in dataset" % row)
+            else:
+                raise KeyError("Row must be either int (index)  or float (timestamp) not %s" % type(row))
+            # convert col to something useful
+            if type(col) == str:
+                col = self.colnames.index(col)
+            return self.__get_column_by_num(col)[rownum]
+        # if key is float treat it as timestamp
+        elif isinstance(key, float):
+            rownum = self.__find(key)
+            if rownum is None:
+                raise KeyError("Timstamp %f not found in dataset" % key)
+            return self.__get_row(rownum)
+        # if key is text treat it as column name
+        elif isinstance(key, str):
+            return tuple(self.get_column(key))
+        else:
+            raise KeyError("%s of type %s is no valid key" % (key, type(key)))
+
+    def __str__headers(self, delimiter="\t"):
+        """generates and returns column names string"""
+        colnames = [self.__ts_keyname, ]
+        colnames += self.__headers
+        return delimiter.join(colnames)
+
+    def __get_row(self, index):
+        """
+        assemble one row [ts, col1, col2, ...] at position index
+        """
+        row = [self.__times[index], ]
+        row.extend([column[index] for column in self.__columns])
+        return row
+
+    def __get_column_by_num(self, colnum):
+        """
+        return column by number, 0 is the timestamp column
+        """
+        if colnum == 0:
+            return self.__times
+        if colnum < 0:
+            colnum += len(self.__columns) + 1
+        return self.__columns[colnum - 1]
+
+    def __copy_views(self):
+        """
+        replace read only memoryviews by arrays, before modifying existing data
+        """
+        if self.__views:
+            self.__times = array("d", self.__times)
+            self.__columns = [array("d", column) for column in self.__columns]
+            self.__views = False
+
+    def __find(self, timestamp):
+        """
+        return row number of timestamp, or None if not found
+
+        as long as timestamps are strictly increasing bisect is used,
+        otherwise fall back to linear search, memoryviews have no index()
+        """
+        if self.__sorted:
+            index = bisect.bisect_left(self.__times, timestamp)
+            if index < len(self.__times) and self.__times[index] == timestamp:
+                return index
+            return None
+        for index, value in enumerate(self.__times):
+            if value == timestamp:
+                return index
+        return None
+
+    def __add(self, timestamp, values):
+        """
+        private method to add data to internal data storage
+        timstamp should be float
+        values should be iterable of float
+
+        if the timestamp is already stored, this data will be skipped
+
+        parameters:
+        timestamp <float>
+        values <iterable> of float
+
+        raises:
+        DataformatError if TypeError occurs
+        """
+        self.__copy_views()
+        if len(self.__times) > 0 and timestamp <= self.__times[-1]:
+            if self.__find(timestamp) is not None:
+                return
+            self.__sorted = False
+        try:
+            for column, value in zip(self.__columns, values):
+                column.append(value)
+        except TypeError as exc:
+            # roll back partially added row
+            for column in self.__columns:
+                if len(column) > len(self.__times):
+                    column.pop()
+            logging.exception(exc)
+            logging.error("ts : %s, values: %s", timestamp, values)
+            raise DataFormatError("TypeError: some values are not of type <float>")
+        self.__times.append(timestamp)
+
+    def head(self, delimiter="\t", nrows=5, headers=True):
+        """return printable string for first ncols rows"""
+        lbuffer = []
+        if headers:
+            lbuffer.append(self.__str__headers(delimiter))
+        for index in range(min(nrows, len(self.__times))):
+            lbuffer.append(delimiter.join((str(value) for value in self.__get_row(index))))
+        return "\n".join(lbuffer)
+
+    def tail(self, delimiter="\t", nrows=5, headers=True):
+        """return printable string for last ncols rows"""
+        lbuffer = []
+        if headers:
+            lbuffer.append(self.__str__headers(delimiter))
+        for index in range(max(0, len(self.__times) - nrows), len(self.__times)):
+            lbuffer.append(delimiter.join((str(value) for value in self.__get_row(index))))
+        return "\n".join(lbuffer)
+
+    def __str__(self):
+        """return printable string head(), ..., tail()"""
+        lbuffer = []
+        lbuffer.append(self.head())
+        lbuffer.append("...")
+        lbuffer.append(self.tail(headers=False))
+        return "\n".join(lbuffer)
+
+    def add(self, timestamp, values, suppress_non_steady_ts=True):
+        """
+        add new data to timeseries
+        ts should be increasing, values have to be numeric
+
+        parameters:
+        ts <float> timestamp, has to be increasing, otherwise data will be ignored
+        values <tuple> of <float> the actual values for this timestamp
+        suppress_non_steady_ts <bool> show messages, if timestamp is not steadily increasing, or not
+        """
+        try:
+            assert isinstance(timestamp, float)
+            assert all((isinstance(value, float) for value in values))
+            assert len(values) == len(self.__headers)
+        except AssertionError as exc:
+            raise DataFormatError("Values %s are not the same length as format specification %s" % (values, self.__headers))
+        if len(self.__times) > 0 and self.__times[-1] >= timestamp:
+            if not suppress_non_steady_ts:
+                logging.debug("timestamp %s is not steadily increasing, ignoring this dataset, last_ts=%s", timestamp, self.__times[-1])
+        self.__add(timestamp, values)
+
+    def add_from_csv(self, timestamp, values):
+        """
+        add new data to timeseries, used to add value from trusted sources like CSV files
+
+        parameters:
+        ts <float> timestamp, has to be increasing, otherwise data will be ignored
+        values <tuple> of <float> the actual values for this timestamp
+        """
+        self.__add(timestamp, values)
+
+    def group_add(self, timestamp, values, group_func):
+        """
+        function to add new data, and if data exists, aggregate existing data with new ones
+        if there is no existing data for this timestamp, simply call add()
+
+        parameters:
+        timestamp <float>
+        values <tuple> of <floats>
+        group_func <func> will be called with existing and new values
+
+        returns:
+        None
+        """
+        assert isinstance(timestamp, float)
+        assert isinstance(values, list)
+        assert all((isinstance(value, float) for value in values))
+        rownum = self.__find(timestamp)
+        if rownum is None:
+            self.__add(timestamp, values)
+        else:
+            self.__copy_views()
+            for column, value in zip(self.__columns, values):
+                column[rownum] = group_func(column[rownum], float(value))
+
+    def __get_colnum(self, colname):
+        """
+        return column number of given column name
+        """
+        return self.__headers.index(colname) + 1
+
+    def get_column(self, colname):
+        """
+        return stored array of given column, ts_keyname is also accepted
+        the array is returned without copying, so do not modify
+
+        parameters:
+        colname <str> must be in self.colnames
+
+        returns:
+        <array> of <float>
+        """
+        if colname == self.__ts_keyname:
+            return self.__times
+        return self.__columns[self.__headers.index(colname)]
+
+    def resample(self, time_interval, func):
+        """
+        resample data to time interval given
+        using func as aggregation function for values in between
+
+        parameters:
+        time_interval <int> something above actual interval
+        func - something like lambda values : sum(values)
+
+        returns:
+        <TimeseriesColumnar>
+        """
+        ret_data = TimeseriesColumnar(self.__headers) # holds return data
+        first_ts = self.__times[0]
+        last_ts = None
+        subsample = []
+        for row in self:
+            timestamp = row[0]
+            if timestamp > (first_ts + time_interval):
+                # subsample is full, aggregate
+                agg_data = [0] * len(subsample[0])
+                for colnum in range(len(subsample[0])):
+                    agg_data[colnum] = func((row[colnum] for row in subsample))
+                ret_data.add(last_ts, agg_data)
+                first_ts = timestamp # new starting ts for next subsample
+                subsample = []
+            else:
+                # build up subsample data
+                subsample.append(row[1:])
+            last_ts = timestamp
+        return ret_data
+
+    def to_data(self, value_keynames=None, start_ts=None, stop_ts=None):
+        """
+        return internal data as list of dicts for every row
+        """
+        if value_keynames is None:
+            value_keynames = self.__headers # use all columns if None
+        try:
+            assert type(start_ts) == type(stop_ts)
+            if start_ts is not None:
+                assert type(start_ts) == int
+        except AssertionError as exc:
+            logging.exception("start_ts and stop_ts has to be the same type and int")
+            logging.error("start_ts=%s, stop_ts=%s", start_ts, stop_ts)
+            raise exc
+        columns = [(value_keyname, self.get_column(value_keyname)) for value_keyname in value_keynames]
+        for index, timestamp in enumerate(self.__times):
+            if (start_ts is None) or (start_ts <= timestamp <= stop_ts):
+                row_dict = dict(((value_keyname, column[index]) for value_keyname, column in columns))
+                row_dict.update({self.ts_keyname : timestamp})
+                yield row_dict
+
+    def to_csv(self, value_keynames=None, headers=True, delimiter=",", start_ts=None, stop_ts=None):
+        """
+        return internal data csv formatted
+
+        value_keyname <tuple> which column names to add in data
+        headers <bool>  add header row or not, default True
+        delimiter <str> delimiter to use for csv, default ','
+        start_ts <None> or <int> starting time to use
+        stop_ts <None> or <int> stopping time to use
+
+        start_ts and stop_ts has to be the same type
+        stop_ts has to be greater than start_ts and int if not None
+        """
+        if value_keynames is None:
+            value_keynames = self.__headers
+        try:
+            assert type(start_ts) == type(stop_ts)
+            if start_ts is not None:
+                assert type(start_ts) == int
+        except AssertionError as exc:
+            logging.exception("start_ts and stop_ts has to be the same type and int")
+            logging.error("start_ts=%s, stop_ts=%s", start_ts, stop_ts)
+            raise exc
+        columns = [self.get_column(key) for key in value_keynames]
+        headline = [self.ts_keyname, ]
+        headline.extend(value_keynames)
+        for index, timestamp in enumerate(self.__times):
+            if (start_ts is None) or (start_ts <= timestamp <= stop_ts):
+                if headers is True:
+                    yield "%s" % delimiter.join(headline)
+                    headers = False
+                yield "%s%s%s" % (timestamp, delimiter, delimiter.join((str(column[index]) for column in columns)))
+
+    def get_serie(self, colname):
+        """
+        returning all values for given colname
+
+        parameters:
+        colname <str> - must be in self.colnames
+
+        returns:
+        return <tuple> of <float>
+        """
+        return tuple(self.__columns[self.__get_colnum(colname) - 1])
+
+    def slice(self, colnames):
+        """
+        return new TimeseriesColumnar object with only in colnames given columns
+
+        parameters:
+        colnames <tuple>
+
+        returns:
+        <TimeseriesColumnar>
+        """
+        assert not isinstance(colnames, str)
+        ret_data = TimeseriesColumnar.from_columns(colnames, self.__times, [self.get_column(colname) for colname in colnames], ts_keyname=self.ts_keyname)
+        ret_data.__sorted = self.__sorted
+        return ret_data
+
+    def convert(self, colname, datatype, newcolname=None):
+        """
+        convert some existing columns to given datatype and add this column to Timeseries
+
+        parameters:
+        colname <str> - must be in colnames
+        datatype <str> - must be in datatypes
+        newcolname <str> - must not be in colnames
+
+        returns:
+        <None>
+        """
+        if len(self.__times) == 0:
+            logging.error("Empty Timeseries, nothing to convert")
+            return
+        series = self.get_column(colname)
+        newseries = self.datatype_mapper[datatype](self.__times, series)
+        if newcolname is None: # ovrewrite existing column
+            self.remove_col(colname)
+            self.append(colname, newseries)
+        else:
+            self.append(newcolname, newseries)
+
+    def add_derive_col(self, colname, colname_d):
+        self.logger.info("DEPRECATED function add_derive_col use convert(%s, 'derive', %s)", colname, colname_d)
+        return self.convert(colname, "derive", colname_d)
+
+    def add_per_s_col(self, colname, colname_d):
+        self.logger.info("DEPRECATED function add_per_s_col use convert(%s, 'persecond', %s)", colname, colname_d)
+        return self.convert(colname, "persecond", colname_d)
+
+    def add_calc_col_single(self, colname, newcolname, func):
+        """
+        use func to generate colname_c from colname
+        colname_c = func(colname)
+
+        parameters:
+        colname <str> original existing colname
+        newcolname <str> new column name added
+        func <func> function which returns <float>,
+            ex lambda a<float>: a<float>
+        """
+        assert newcolname not in self.__headers
+        self.__columns.append(array("d", map(func, self.get_column(colname))))
+        self.__headers.append(newcolname)
+
+    def add_calc_col_full(self, newcolname, func):
+        """
+        use func to generate newcolname from existing data at this timestamp
+        newcol = func(existing data at this timestamp)
+
+        the parameters for func are delivered as dict
+
+        parameters:
+        newcolname <str> new column name
+        func <func> function which returns <float>,
+            ex lambda a<dict>: a<float>
+        """
+        assert newcolname not in self.__headers
+        newcolumn = array("d")
+        for values in zip(*self.__columns):
+            newcolumn.append(func(dict(zip(self.__headers, values))))
+        self.__columns.append(newcolumn)
+        self.__headers.append(newcolname)
+
+    def remove_col(self, colname):
+        """
+        remove column with name colname from internal data structure
+
+        parameters:
+        colname <str> schould be in self.headers
+        """
+        colnum = self.__get_colnum(colname)
+        del self.__columns[colnum - 1]
+        self.__headers.remove(colname)
+
+    def append(self, colname, series):
+        """
+        append given series to internal data structure and give it the name colname
+
+        parameters:
+        colanme <str> must not be in headers
+        series <tuple> of <floats> must be the same length as existing data
+
+        returns:
+        None
+        """
+        assert colname not in self.__headers
+        if len(series) != len(self.__times):
+            msg = "new series of length %s, is not the same as existing datalength of %s" % (len(series), len(self.__times))
+            logging.error(msg)
+            raise AssertionError(msg)
+        self.__columns.append(array("d", series))
+        self.__headers.append(colname)
+
+    def dump(self, filehandle):
+        """
+        write internal data to filehandle in CSV format,
+        the same format as Timeseries.dump
+
+        parameters:
+        filename <str>
+        """
+        header_line = [self.__ts_keyname, ]
+        header_line.extend(self.__headers)
+        filehandle.write(";".join(header_line) + "\n")
+        for row in self:
+            filehandle.write(";".join((str(item) for item in row)) + "\n")
+
+    @staticmethod
+    def load(filehandle):
+        """
+        recreate TimeseriesColumnar Object from CSV Filehandle
+        """
+        try:
+            header = True # first line is header
+            timeseries = None
+            for row in filehandle:
+                if header is True:
+                    header_line = row.strip().split(";")
+                    timeseries = TimeseriesColumnar(header_line[1:], header_line[0])
+                    header = False
+                else:
+                    values = row.strip().split(";")
+                    try:
+                        timeseries.add_from_csv(float(values[0]), [float(value) for value in values[1:]])
+                    except ValueError as exc:
+                        logging.error("Error parsing row %s", row)
+                        raise exc
+            return timeseries
+        except IOError as exc:
+            logging.exception(exc)
+            logging.error("Error while reading from filehandle")
+            raise exc
+    load_from_csv = load
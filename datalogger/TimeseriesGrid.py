@@ -0,0 +1,236 @@
+#!/usr/bin/python
+# pylint: disable=line-too-long
+"""
+module for TimeseriesGrid Class
+
+all Timeseries of one TimeseriesArray aligned to one common time grid
+of fixed interval, stored in one dense block of doubles, so operations
+over keys and time do not have to match timestamps row by row
+
+block layout, one matrix keys x times for every value_keyname:
+    offset = (value_id * len(keys) + key_id) * len(times) + time_id
+
+gaps, time slots without any value, are filled by one of fill_policies
+    nan - value is float("nan")
+    previous - last known value, nan before the first known value
+    linear - linear interpolated between known values, nan before the
+        first and after the last known value
+"""
+import math
+import logging
+from array import array
+# own modules
+from CustomExceptions import *
+
+
+NAN = float("nan")
+
+def fill_previous(row, known):
+    """
+    fill gaps in row with previous known value, in place
+
+    parameters:
+    row <array> of <float>
+    known <list> of <int> sorted indices of known values in row
+    """
+    for position, index in enumerate(known):
+        end = known[position + 1] if position + 1 < len(known) else len(row)
+        value = row[index]
+        for gap in range(index + 1, end):
+            row[gap] = value
+
+def fill_linear(row, known):
+    """
+    fill gaps in row by linear interpolation between known values, in place
+
+    parameters:
+    row <array> of <float>
+    known <list> of <int> sorted indices of known values in row
+    """
+    for index, next_index in zip(known, known[1:]):
+        if next_index - index > 1:
+            value = row[index]
+            step = (row[next_index] - value) / (next_index - index)
+            for gap in range(index + 1, next_index):
+                row[gap] = value + step * (gap - index)
+
+
+class TimeseriesGrid(object):
+    """
+    dense, aligned view of all Timeseries of one TimeseriesArray
+    """
+    fill_policies = {
+        "nan" : None, # nothing to do, grid is prefilled
+        "previous" : fill_previous,
+        "linear" : fill_linear,
+    }
+
+    def __init__(self, tsa, interval, start_ts=None, stop_ts=None, fill="nan"):
+        """
+        every value is snapped to the nearest time slot of the grid,
+        if there is more than one value for one slot, the value with
+        the nearest timestamp is used, values outside of the grid are dropped
+
+        parameters:
+        tsa <TimeseriesArray>
+        interval <int> seconds between two time slots
+        start_ts <float> first time slot, defaults to first timestamp of tsa rounded down to interval
+        stop_ts <float> no time slot after stop_ts, defaults to last timestamp of tsa
+        fill <str> one of fill_policies
+        """
+        if fill not in self.fill_policies:
+            raise KeyError("unknown fill policy %s, use one of %s" % (fill, sorted(self.fill_policies.keys())))
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.__index_keynames = tuple(tsa.index_keynames)
+        self.__value_keynames = tuple(tsa.value_keynames)
+        self.__keys = list(tsa.keys())
+        self.__key_ids = dict(((key, key_id) for key_id, key in enumerate(self.__keys)))
+        self.__interval = interval
+        self.__fill = fill
+        if start_ts is None or stop_ts is None:
+            first, last = self.__get_bounds(tsa)
+            if start_ts is None:
+                start_ts = math.floor(first / interval) * interval
+            if stop_ts is None:
+                stop_ts = last
+        self.__start_ts = float(start_ts)
+        ntimes = max(0, int(math.floor((stop_ts - start_ts) / interval + 1e-9)) + 1) if self.__keys else 0
+        self.__times = tuple((self.__start_ts + slot * interval for slot in range(ntimes)))
+        fill_func = self.fill_policies[fill]
+        block = array("d")
+        rows = [[] for _ in self.__value_keynames] # rows of every value_keyname
+        for key in self.__keys:
+            timeseries = tsa[key]
+            # the nearest value of every slot, as slot : (distance, row number)
+            nearest = {}
+            for rownum, timestamp in enumerate(timeseries.get_column(timeseries.ts_keyname)):
+                position = (timestamp - self.__start_ts) / interval
+                slot = int(math.floor(position + 0.5))
+                if 0 <= slot < ntimes:
+                    distance = abs(position - slot)
+                    if slot not in nearest or distance < nearest[slot][0]:
+                        nearest[slot] = (distance, rownum)
+            known = sorted(nearest.keys())
+            if not known:
+                logging.debug("Timeseries of key %s has no values within grid", key)
+            rownums = [nearest[slot][1] for slot in known]
+            for value_id, value_keyname in enumerate(self.__value_keynames):
+                series = timeseries.get_serie(value_keyname)
+                row = array("d", [NAN]) * ntimes
+                for slot, rownum in zip(known, rownums):
+                    row[slot] = series[rownum]
+                if fill_func is not None:
+                    fill_func(row, known)
+                rows[value_id].append(row)
+        for value_rows in rows:
+            for row in value_rows:
+                block.extend(row)
+        self.__block = block
+
+    @staticmethod
+    def __get_bounds(tsa):
+        """return first and last timestamp of all Timeseries in tsa"""
+        first = last = None
+        for key in tsa.keys():
+            timeseries = tsa[key]
+            if len(timeseries) == 0:
+                continue
+            if first is None or timeseries.start_ts < first:
+                first = timeseries.start_ts
+            if last is None or timeseries.stop_ts > last:
+                last = timeseries.stop_ts
+        if first is None:
+            return 0.0, -1.0 # no data at all, empty grid
+        return first, last
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __contains__(self, key):
+        return key in self.__key_ids
+
+    def keys(self):
+        """index_keys in order of rows"""
+        return self.__keys
+
+    @property
+    def index_keynames(self):
+        """index_keynames of aligned TimeseriesArray"""
+        return self.__index_keynames
+
+    @property
+    def value_keynames(self):
+        """value_keynames of aligned TimeseriesArray"""
+        return self.__value_keynames
+
+    @property
+    def times(self):
+        """timestamps of all time slots"""
+        return self.__times
+
+    @property
+    def interval(self):
+        """seconds between two time slots"""
+        return self.__interval
+
+    @property
+    def start_ts(self):
+        """timestamp of first time slot"""
+        return self.__start_ts
+
+    @property
+    def fill(self):
+        """used fill policy"""
+        return self.__fill
+
+    @property
+    def block(self):
+        """whole dense data block, see module description for layout"""
+        return self.__block
+
+    def get_matrix(self, value_keyname):
+        """
+        return keys x times matrix of one value_keyname, one row of
+        len(times) values for every key in order of keys
+
+        parameters:
+        value_keyname <str>
+
+        returns:
+        <memoryview> of <float> without copying
+        """
+        size = len(self.__keys) * len(self.__times)
+        value_id = self.__value_keynames.index(value_keyname)
+        return memoryview(self.__block)[value_id * size:(value_id + 1) * size]
+
+    def get_row(self, key, value_keyname):
+        """
+        return aligned values of one key and value_keyname
+
+        parameters:
+        key <tuple> index_key
+        value_keyname <str>
+
+        returns:
+        <memoryview> of <float> one value for every time slot, without copying
+        """
+        ntimes = len(self.__times)
+        key_id = self.__key_ids[key]
+        return self.get_matrix(value_keyname)[key_id * ntimes:(key_id + 1) * ntimes]
+
+    def get_slot(self, value_keyname, timestamp):
+        """
+        return values of all keys at one time slot
+
+        parameters:
+        value_keyname <str>
+        timestamp <float> timestamp of time slot, will be snapped to grid
+
+        returns:
+        <memoryview> of <float> one value for every key in order of keys
+        """
+        slot = int(math.floor((timestamp - self.__start_ts) / self.__interval + 0.5))
+        if not 0 <= slot < len(self.__times):
+            raise KeyError("timestamp %s is not within grid" % timestamp)
+        return self.get_matrix(value_keyname)[slot::len(self.__times)]
@@ -4,7 +4,9 @@
 Modules deals with timeseries statistics
 """
 import json
+import math
 import logging
+from itertools import islice
 # own modules
 from CustomExceptions import *
 
@@ -67,13 +69,420 @@ def decrements(data):
     """
     return float(sum([data[index] - data[index + 1] for index in range(len(data)-1) if data[index + 1] < data[index]]))
 
+def series_stats(series):
+    """
+    calculate all statistical values of TimeseriesStats.stat_funcs at once
+
+    the builtin C functions are used wherever the result must be identical to
+    the single stat functions above, so the returned values are bitwise the
+    same as calling every function in stat_funcs on its own, only with fewer
+    walks over series and one single sorted copy for median
+
+    parameters:
+    series <tuple> or <list> or <array> of <float>, at least two values
+
+    returns:
+    <dict> with the keys of TimeseriesStats.stat_funcs in the same order
+    """
+    return _series_stats(series)[0]
+
+def series_stats_state(series, first_ts=None, last_ts=None):
+    """
+    calculate statistical values like series_stats and the mergeable
+    StatsState of series, sharing one sorted copy of series
+
+    parameters:
+    series <tuple> or <list> or <array> of <float>, at least one value
+    first_ts <float> timestamp of first value, None if unknown
+    last_ts <float> timestamp of last value, None if unknown
+
+    returns:
+    <tuple> of <dict> like series_stats, <StatsState>
+    """
+    if len(series) == 1:
+        stats = single_value_stats(series[0])
+        return stats, StatsState.from_stats(stats, first_ts, last_ts)
+    stats, ordered, ss = _series_stats(series)
+    return stats, StatsState.from_stats(stats, first_ts, last_ts, ss=ss, sketch=StatsState.get_sketch(ordered))
+
+def _series_stats(series):
+    """
+    implementation of series_stats
+
+    returns:
+    <tuple> of <dict> like series_stats, <list> sorted copy of series, <float> sum of square deviations
+    """
+    count = len(series)
+    if count < 2:
+        raise ValueError('series_stats requires at least two data points')
+    total = sum(series)
+    avg = total / float(count)
+    ss = sum([(value - avg) ** 2 for value in series])
+    std = (ss / count) ** 0.5
+    ordered = sorted(series)
+    increments_list = []
+    decrements_list = []
+    last_value = series[0]
+    for value in islice(series, 1, None):
+        if value > last_value:
+            increments_list.append(value - last_value)
+        elif value < last_value:
+            decrements_list.append(last_value - value)
+        last_value = value
+    stats = {
+        "min" : min(series),
+        "max" : max(series),
+        "avg" : avg,
+        "sum" : total,
+        "std" : std,
+        "median" : _sorted_median(ordered),
+        "count" : count,
+        "first" : series[0],
+        "last" : series[-1],
+        "mean" : avg,
+        "inc" : float(sum(increments_list)),
+        "dec" : float(sum(decrements_list)),
+        "diff" : series[-1] - series[0],
+    }
+    return stats, ordered, ss
+
+def _sorted_median(ordered):
+    """median of already sorted list, same as median"""
+    half = len(ordered) // 2
+    if not len(ordered) % 2:
+        return (ordered[half - 1] + ordered[half]) / 2.0
+    return ordered[half]
+
+def single_value_stats(value):
+    """
+    statistical values for a series with only one value, special case
+    if there is only one value a day
+
+    parameters:
+    value <float>
+
+    returns:
+    <dict> with the keys of TimeseriesStats.stat_funcs in the same order
+    """
+    return {
+        "min" : value,
+        "max" : value,
+        "avg" : value,
+        "sum" : value,
+        "std" : 0.0,
+        "median" : value,
+        "count" : 1,
+        "first" : value,
+        "last" : value,
+        "mean" : value,
+        "inc" : 0.0,
+        "dec" : 0.0,
+        "diff" : 0.0,
+    }
+
+
+class StatsState(object):
+    """
+    mergeable state of the statistical values of one column
+
+    states of different Timeseries, like other index_keys or following days
+    of the same index_key, can be merged without the values themselves,
+    the merged state returns the same statistical values as the joined series
+
+    count, sum, sum of square deviations (ss), min and max merge exact,
+    first and last are choosen by timestamp, inc, dec and diff include the step
+    between two following series, median is estimated from a sketch of
+    at most sketch_size weighted centroids, which is exact as long as
+    all merged series have not more than sketch_size values together
+
+    attributes:
+    count <int>
+    sum <float>
+    ss <float> sum of square deviations from average
+    min <float>
+    max <float>
+    first <float>
+    first_ts <float> timestamp of first, None if unknown
+    last <float>
+    last_ts <float> timestamp of last, None if unknown
+    inc <float>
+    dec <float>
+    diff <float>
+    sketch <list> of [<float> value, <int> weight] sorted by value
+    """
+    sketch_size = 32
+    attributes = ("count", "sum", "ss", "min", "max", "first", "first_ts", "last", "last_ts", "inc", "dec", "diff", "sketch")
+
+    def __init__(self, **kwds):
+        for attribute in self.attributes:
+            setattr(self, attribute, kwds[attribute])
+
+    def __eq__(self, other):
+        return all((getattr(self, attribute) == getattr(other, attribute) for attribute in self.attributes))
+
+    @staticmethod
+    def from_stats(stats, first_ts=None, last_ts=None, ss=None, sketch=None):
+        """
+        create state from statistical values, used for stored TimeseriesStats without state
+
+        parameters:
+        stats <dict> with keys of TimeseriesStats.stat_funcs
+        first_ts <float> timestamp of first value, None if unknown
+        last_ts <float> timestamp of last value, None if unknown
+        ss <float> sum of square deviations, calculated from std if None
+        sketch <list> median sketch, one single centroid of median if None
+
+        returns:
+        <StatsState>
+        """
+        count = int(stats["count"])
+        return StatsState(
+            count=count,
+            sum=stats["sum"],
+            ss=stats["std"] ** 2 * count if ss is None else ss,
+            min=stats["min"],
+            max=stats["max"],
+            first=stats["first"],
+            first_ts=first_ts,
+            last=stats["last"],
+            last_ts=last_ts,
+            inc=stats["inc"],
+            dec=stats["dec"],
+            diff=stats["diff"],
+            sketch=[[stats["median"], count]] if sketch is None else sketch)
+
+    @staticmethod
+    def get_sketch(ordered, size=None):
+        """
+        return median sketch of sorted values
+
+        parameters:
+        ordered <list> of <float> sorted values
+        size <int> maximum number of centroids, defaults to StatsState.sketch_size
+
+        returns:
+        <list> of [<float> value, <int> weight]
+        """
+        size = StatsState.sketch_size if size is None else size
+        count = len(ordered)
+        if count <= size:
+            return [[value, 1] for value in ordered]
+        sketch = []
+        for bucket in range(size):
+            values = ordered[bucket * count // size:(bucket + 1) * count // size]
+            sketch.append([sum(values) / len(values), len(values)])
+        return sketch
+
+    @staticmethod
+    def compress_sketch(sketch, size=None):
+        """
+        reduce sorted sketch to size centroids, every centroid is assigned
+        to one of size buckets of equal weight by its center
+
+        parameters:
+        sketch <list> of [<float> value, <int> weight] sorted by value
+        size <int> maximum number of centroids, defaults to StatsState.sketch_size
+
+        returns:
+        <list> of [<float> value, <int> weight]
+        """
+        size = StatsState.sketch_size if size is None else size
+        if len(sketch) <= size:
+            return sketch
+        total_weight = float(sum((weight for value, weight in sketch)))
+        compressed = []
+        last_bucket = None
+        rank = 0
+        for value, weight in sketch:
+            bucket = min(size - 1, int((rank + weight / 2.0) * size / total_weight))
+            if bucket == last_bucket:
+                centroid = compressed[-1]
+                centroid[0] = (centroid[0] * centroid[1] + value * weight) / (centroid[1] + weight)
+                centroid[1] += weight
+            else:
+                compressed.append([value, weight])
+                last_bucket = bucket
+            rank += weight
+        return compressed
+
+    def get_median(self):
+        """
+        return median estimated from sketch, centroids of weight w
+        are placed in the middle of their w ranks, values in between
+        are interpolated linear
+
+        returns:
+        <float>
+        """
+        target = (self.count - 1) / 2.0
+        rank = 0
+        previous = None
+        for value, weight in self.sketch:
+            center = rank + (weight - 1) / 2.0
+            if center == target:
+                return value
+            if center > target:
+                if previous is None:
+                    return value
+                previous_center, previous_value = previous
+                if target - previous_center == center - target:
+                    return (previous_value + value) / 2.0 # same as median()
+                return previous_value + (value - previous_value) * (target - previous_center) / (center - previous_center)
+            previous = (center, value)
+            rank += weight
+        return self.sketch[-1][0]
+
+    def merge(self, other):
+        """
+        merge this state with other state
+
+        if one series ends before the other begins, they are concatenated,
+        first and last are taken from the earlier and later series, the step
+        between both counts to inc, dec and diff, otherwise (parallel series,
+        or unknown timestamps) inc, dec and diff are summed up
+
+        parameters:
+        other <StatsState>
+
+        returns:
+        <StatsState> new object
+        """
+        count = self.count + other.count
+        delta = other.sum / other.count - self.sum / self.count
+        data = {
+            "count" : count,
+            "sum" : self.sum + other.sum,
+            "ss" : self.ss + other.ss + delta * delta * self.count * other.count / count,
+            "min" : min(self.min, other.min),
+            "max" : max(self.max, other.max),
+            "sketch" : self.compress_sketch(sorted(self.sketch + other.sketch)),
+        }
+        earlier = later = None
+        if self.last_ts is not None and other.first_ts is not None and self.last_ts < other.first_ts:
+            earlier, later = self, other
+        elif other.last_ts is not None and self.first_ts is not None and other.last_ts < self.first_ts:
+            earlier, later = other, self
+        if earlier is not None:
+            step = later.first - earlier.last
+            data["inc"] = earlier.inc + later.inc + max(step, 0.0)
+            data["dec"] = earlier.dec + later.dec + max(-step, 0.0)
+            data["diff"] = earlier.diff + step + later.diff
+        else:
+            if other.first_ts is not None and self.first_ts is not None and other.first_ts < self.first_ts:
+                earlier = other
+            else:
+                earlier = self
+            if self.last_ts is not None and other.last_ts is not None and self.last_ts > other.last_ts:
+                later = self
+            else:
+                later = other
+            data["inc"] = self.inc + other.inc
+            data["dec"] = self.dec + other.dec
+            data["diff"] = self.diff + other.diff
+        data["first"] = earlier.first
+        data["first_ts"] = earlier.first_ts
+        data["last"] = later.last
+        data["last_ts"] = later.last_ts
+        return StatsState(**data)
+
+    def get_stats(self):
+        """
+        return statistical values of this state
+
+        returns:
+        <dict> with the keys of TimeseriesStats.stat_funcs in the same order
+        """
+        avg = self.sum / float(self.count)
+        return {
+            "min" : self.min,
+            "max" : self.max,
+            "avg" : avg,
+            "sum" : self.sum,
+            "std" : (self.ss / self.count) ** 0.5,
+            "median" : self.get_median(),
+            "count" : self.count,
+            "first" : self.first,
+            "last" : self.last,
+            "mean" : avg,
+            "inc" : self.inc,
+            "dec" : self.dec,
+            "diff" : self.diff,
+        }
+
+    @staticmethod
+    def get_value_names(size=None):
+        """
+        names of the values returned by to_values
+
+        parameters:
+        size <int> number of centroids, defaults to StatsState.sketch_size
+
+        returns:
+        <list> of <str>
+        """
+        size = StatsState.sketch_size if size is None else size
+        return ["ss", "first_ts", "last_ts"] + ["sketch_value_%d" % index for index in range(size)] + ["sketch_weight_%d" % index for index in range(size)]
+
+    def to_values(self, size=None):
+        """
+        return the attributes not contained in the statistical values as
+        fixed number of floats, used to store states in columns,
+        unknown timestamps are NaN, unused centroids are NaN with weight 0
+
+        parameters:
+        size <int> number of centroids, defaults to StatsState.sketch_size
+
+        returns:
+        <list> of <float> in order of get_value_names
+        """
+        size = StatsState.sketch_size if size is None else size
+        assert len(self.sketch) <= size
+        sketch = self.sketch + [[float("nan"), 0]] * (size - len(self.sketch))
+        values = [float(self.ss)]
+        values.extend((float("nan") if ts is None else float(ts) for ts in (self.first_ts, self.last_ts)))
+        values.extend((float(value) for value, weight in sketch))
+        values.extend((float(weight) for value, weight in sketch))
+        return values
+
+    @staticmethod
+    def from_values(stats, values):
+        """
+        create state from statistical values and the values created by to_values
+
+        parameters:
+        stats <dict> with keys of TimeseriesStats.stat_funcs
+        values <list> of <float> in order of get_value_names
+
+        returns:
+        <StatsState>
+        """
+        size = (len(values) - 3) // 2
+        ss, first_ts, last_ts = values[:3]
+        sketch = [[value, int(weight)] for value, weight in zip(values[3:3 + size], values[3 + size:]) if weight > 0]
+        return StatsState.from_stats(stats, None if math.isnan(first_ts) else first_ts, None if math.isnan(last_ts) else last_ts, ss, sketch)
+
+    def to_data(self):
+        """return data used to further encode via json"""
+        return dict(((attribute, getattr(self, attribute)) for attribute in self.attributes))
+
+    @staticmethod
+    def from_data(data):
+        """create StatsState from data created by to_data"""
+        return StatsState(**data)
+
 
 class TimeseriesStats(object):
     """
     Statistics for one sepcific Timeseries Object
 
     separated to cache statistics in own files
+
+    besides the statistical values every value_keyname has a mergeable
+    StatsState, so TimeseriesStats of different index_keys or days can
+    be merged exact without the original Timeseries
     """
+    __states = None # no StatsState known, derived from stats on request
+    __state_filename = None # file written by dump_state, read on first access of state
     stat_funcs = {
         "min" : min,
         "max" : max,
@@ -101,32 +510,15 @@ class TimeseriesStats(object):
         """
         # define new data
         self.__stats = {}
+        self.__states = {}
         # calculate statisticsi, if timeseries given
         for key in timeseries.headers:
             series = timeseries.get_serie(key)
             if len(series) == 0:
                 logging.error("%s %s", key, len(timeseries))
                 raise TimeseriesEmptyError("Timeseries without data cannot have statistics")
-            elif len(series) > 1:
-                self.__stats[key] = {}
-                for func_name, func in self.stat_funcs.items():
-                    self.__stats[key][func_name] = func(series)
-            elif len(series) == 1: # special case if there is only one value a day
-                self.__stats[key] = {
-                    "min" : series[0],
-                    "max" : series[0],
-                    "avg" : series[0],
-                    "sum" : series[0],
-                    "std" : 0.0,
-                    "median" : series[0],
-                    "count" : 1,
-                    "first" : series[0],
-                    "last" : series[0],
-                    "mean" : series[0],
-                    "inc" : 0.0,
-                    "dec" : 0.0,
-                    "diff" : 0.0,
-                }
+            # special case if there is only one value a day is handled there
+            self.__stats[key], self.__states[key] = series_stats_state(series, timeseries.start_ts, timeseries.stop_ts)
 
     def __eq__(self, other):
         """ test for equality in depth"""
@@ -207,6 +599,74 @@ class TimeseriesStats(object):
     def stats(self, value):
         """set statistics dictionary"""
         self.__stats = value
+        self.__states = None
+        self.__state_filename = None
+
+    @property
+    def has_state(self):
+        """True if StatsState objects are known and not only derived from statistical values"""
+        if self.__state_filename is not None:
+            self.__load_state_file()
+        return self.__states is not None
+
+    @property
+    def state(self):
+        """
+        mergeable StatsState of every value_keyname, if there was no state
+        stored, it is derived from statistical values, in that case first
+        and last timestamps are unknown and median is only approximated
+
+        returns:
+        <dict> value_keyname : <StatsState>
+        """
+        if self.has_state:
+            return self.__states
+        return dict(((key, StatsState.from_stats(stats)) for key, stats in self.__stats.items()))
+
+    @state.setter
+    def state(self, value):
+        """set StatsState dictionary, value_keyname : <StatsState>"""
+        self.__states = value
+        self.__state_filename = None
+
+    def __load_state_file(self):
+        """read states from file written by dump_state, missing files leave the state unknown"""
+        try:
+            with open(self.__state_filename, "rt") as infile:
+                self.__states = dict(((key, StatsState.from_data(data)) for key, data in json.load(infile).items()))
+        except IOError:
+            logging.debug("no stored state in %s", self.__state_filename)
+        self.__state_filename = None
+
+    def merge(self, other):
+        """
+        merge statistical values of this and other TimeseriesStats,
+        like statistics of both Timeseries joined together
+
+        parameters:
+        other <TimeseriesStats> with the same value_keynames
+
+        returns:
+        <TimeseriesStats> new object
+        """
+        other_states = other.state
+        return TimeseriesStats.from_states(dict(((key, state.merge(other_states[key])) for key, state in self.state.items())))
+
+    @staticmethod
+    def from_states(states):
+        """
+        create TimeseriesStats Object from StatsState objects
+
+        parameters:
+        states <dict> value_keyname : <StatsState>
+
+        returns:
+        <TimeseriesStats>
+        """
+        tsstats = TimeseriesStats.__new__(TimeseriesStats)
+        tsstats.__stats = dict(((key, state.get_stats()) for key, state in states.items()))
+        tsstats.__states = states
+        return tsstats
 
     @property
     def funcnames(self):
@@ -262,19 +722,36 @@ class TimeseriesStats(object):
         json.dump(self.__stats, filehandle)
         filehandle.flush()
 
+    def dump_state(self, filehandle):
+        """
+        write StatsState of every value_keyname to filehandle in json format,
+        kept apart from dump() to leave the format of stored statistics unchanged
+
+        parameters:
+        filehandle <file>
+
+        returns:
+        <None>
+        """
+        json.dump(dict(((key, state.to_data()) for key, state in self.state.items())), filehandle)
+        filehandle.flush()
+
     @staticmethod
-    def load(filehandle):
+    def load(filehandle, state_filename=None):
         """
         recreate TimeseriesStats Object from stored JSON Data in filehandle
 
         parameters:
         filehandle <file>
+        state_filename <str> file written by dump_state, read on first access of state,
+            if missing the state is derived from statistical values
 
         returns:
         <TimeseriesStats>
         """
         tsstats = TimeseriesStats.__new__(TimeseriesStats)
         tsstats.__stats = json.load(filehandle)
+        tsstats.__state_filename = state_filename
         return tsstats
 
     def to_json(self):
@@ -28,11 +28,21 @@ __date__ = "$Date: 2013/04/16 06:50:15 $"
 
 from DataLogger import DataLogger as DataLogger
 from Timeseries import Timeseries as Timeseries
+from TimeseriesColumnar import TimeseriesColumnar as TimeseriesColumnar
 from TimeseriesArray import TimeseriesArray as TimeseriesArray
+from TimeseriesArrayContainer import TimeseriesArrayContainer as TimeseriesArrayContainer
+from TimeseriesGrid import TimeseriesGrid as TimeseriesGrid
+from KeyIndex import KeyIndex as KeyIndex
+from LRUCache import LRUCache as LRUCache
+from CachePlanner import CachePlanner as CachePlanner
+from SpillBuilder import SpillBuilder as SpillBuilder
+from ResponseCache import ResponseCache as ResponseCache
 from TimeseriesStats import TimeseriesStats as TimeseriesStats
 from TimeseriesArrayStats import TimeseriesArrayStats as TimeseriesArrayStats
+from TimeseriesArrayStatsContainer import TimeseriesArrayStatsContainer as TimeseriesArrayStatsContainer
 from Quantile import QuantileArray as QuantileArray
 from Quantile import Quantile as Quantile
+from Rollup import Rollup as Rollup
 from CorrelationMatrix import CorrelationMatrixArray as CorrelationMatrixArray
 from CorrelationMatrixTime import CorrelationMatrixTime as CorrelationMatrixTime
 # custom exceptions
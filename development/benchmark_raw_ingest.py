@@ -0,0 +1,102 @@
+#!/usr/bin/python
+"""
+compare rows/second of DataLogger.load_tsa_raw (bulk ingestion)
+against DataLogger.load_tsa_raw_rowwise (dict per row)
+
+a raw input file with the given number of lines will be generated
+in a temporary basedir, which is deleted afterwards
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import logging
+logging.basicConfig(level=logging.INFO)
+import datalogger
+
+PROJECT = "benchmark"
+TABLENAME = "rawingest"
+DATESTRING = "2018-04-01"
+
+def generate(basedir, lines, hosts, values, compress, columnar):
+    """
+    generate datalogger.json, meta and raw file in basedir
+
+    returns:
+    <str> filename of raw input file
+    """
+    os.makedirs(os.path.join(basedir, "cache"))
+    os.makedirs(os.path.join(basedir, PROJECT, "meta"))
+    os.makedirs(os.path.join(basedir, PROJECT, "raw"))
+    value_keynames = ["value%02d" % num for num in range(values)]
+    with open(os.path.join(basedir, "datalogger.json"), "wt") as outfile:
+        json.dump({"user" : "nobody", "group" : "nogroup", "cachedir" : "cache", "columnar" : columnar, "projects" : {PROJECT : {TABLENAME : "1"}}}, outfile)
+    meta = {
+        "blacklist" : [],
+        "delimiter" : "\t",
+        "headers" : ["ts", "hostname", "instance"] + value_keynames,
+        "index_keynames" : ["hostname", "instance"],
+        "interval" : 60,
+        "ts_keyname" : "ts",
+        "value_keynames" : dict((key, "asis") for key in value_keynames),
+    }
+    with open(os.path.join(basedir, PROJECT, "meta", "%s.json" % TABLENAME), "wt") as outfile:
+        json.dump(meta, outfile)
+    filename = os.path.join(basedir, PROJECT, "raw", "%s_%s.csv" % (TABLENAME, DATESTRING))
+    if compress:
+        filename += ".gz"
+        outfile = gzip.open(filename, "wt")
+    else:
+        outfile = open(filename, "wt")
+    start_ts, stop_ts = datalogger.DataLogger.get_ts_for_datestring(DATESTRING)
+    keys = [("host%04d.example.com" % (num // 4), str(num % 4)) for num in range(hosts)]
+    # spread all lines evenly across the whole day
+    step = (stop_ts - start_ts - 60) / (lines // hosts + 1)
+    with outfile:
+        outfile.write("\t".join(meta["headers"]) + "\n")
+        for lineno in range(lines):
+            hostname, instance = keys[lineno % hosts]
+            timestamp = start_ts + 30 + (lineno // hosts) * step
+            row = ["%.2f" % timestamp, hostname, instance] + ["%d" % random.randint(0, 1000000) for _ in value_keynames]
+            outfile.write("\t".join(row) + "\n")
+    return filename
+
+def measure(dl, method, lines):
+    """call method of dl, return rows/second"""
+    starttime = time.time()
+    tsa = getattr(dl, method)()
+    duration = time.time() - starttime
+    rows = sum((len(tsa[key]) for key in tsa.keys()))
+    print("%-24s %10d rows in %8.2f s, %12.0f rows/s" % (method, rows, duration, lines / duration))
+    return tsa
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=2000000, help="number of raw input lines to generate")
+    parser.add_argument("--hosts", type=int, default=1000, help="number of distinct index keys")
+    parser.add_argument("--values", type=int, default=10, help="number of value columns")
+    parser.add_argument("--gzip", action="store_true", help="compress generated raw file")
+    parser.add_argument("--columnar", action="store_true", help="store data in TimeseriesColumnar objects")
+    args = parser.parse_args()
+    basedir = tempfile.mkdtemp()
+    try:
+        print("generating %d lines for %d keys and %d value columns" % (args.lines, args.hosts, args.values))
+        filename = generate(basedir, args.lines, args.hosts, args.values, args.gzip, args.columnar)
+        print("raw file %s has %d bytes" % (filename, os.stat(filename).st_size))
+        dl = datalogger.DataLogger(basedir)
+        dl.setup(PROJECT, TABLENAME, DATESTRING)
+        tsa_rowwise = measure(dl, "load_tsa_raw_rowwise", args.lines)
+        tsa = measure(dl, "load_tsa_raw", args.lines)
+        if tsa != tsa_rowwise:
+            print("ERROR: results differ")
+            sys.exit(1)
+    finally:
+        shutil.rmtree(basedir)
+
+if __name__ == "__main__":
+    main()
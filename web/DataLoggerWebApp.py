@@ -17,6 +17,7 @@ from datalogger import DataLoggerRawFileMissing as DataLoggerRawFileMissing
 from datalogger import DataLoggerLiveDataError as DataLoggerLiveDataError
 from datalogger import DataLogger as DataLogger
 from datalogger import TimeseriesStats as TimeseriesStats
+from datalogger import ResponseCache as ResponseCache
 
 urls = (
     "/oauth2/v1/", "tk_web.IdpConnector",
@@ -35,42 +36,44 @@ authenticator = tk_web.std_authenticator(web, CONFIG)
 calllogger = tk_web.std_calllogger(web, CONFIG)
 outformat = tk_web.std_jsonout(web, CONFIG)
 
-MEMCACHE = {}
 MAXAGE = 300
 def memcache(func):
     """
-    decorator to cache return values according to used function parameters
+    decorator to cache return values according to used function parameters,
+    the cache is DataLogger.response_cache on disk and shared by all
+    processes and DataLoggerWebApp3, entries of finished days are valid
+    until their caches change, all other entries for MAXAGE seconds, see
+    DataLogger.get_generation, answers conditional requests with 304
     """
     logger = logging.getLogger("MemCache")
     def inner(*args, **kwds):
-        starttime = time.time()
-        thiskey = unicode((func.__name__, args, kwds))
-        logger.info("number of keys in cache %d", len(MEMCACHE.keys()))
-        logger.info("key to look for %s", thiskey)
-        # get rid of old cache entries
-        for key in MEMCACHE.keys():
-            if (MEMCACHE[key]["ts"] + MAXAGE) < starttime:
-                logger.info("deleting aged cache entry for key %s", key)
-                try:
-                    del MEMCACHE[key]
-                except KeyError:
-                    pass # ignore race conditioned KeyError
-        # is there an entry for this key
-        if thiskey in MEMCACHE:
-            if (MEMCACHE[thiskey]["ts"] + MAXAGE) > starttime:
-                logger.info("returning from cache for key %s", thiskey)
-                return MEMCACHE[thiskey]["data"]
-        #logging.info("createing new cache entry for %s", key)
-        try:
-            ret_val = func(*args, **kwds)
-            #logging.info("Storing returned data in cache for %s s", MAXAGE)
-            MEMCACHE[thiskey] = {
-                "ts" : starttime,
-                "data" : ret_val,
-            }
-            return ret_val
-        except StandardError as exc:
-            logger.exception(exc)
+        # first argument is self, not part of key
+        url_args = []
+        for arg in args[1:]:
+            url_args.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+        datalogger = DataLogger(basedir)
+        response_cache = datalogger.response_cache
+        generation = datalogger.get_generation(url_args, MAXAGE)
+        thiskey = response_cache.get_key(func.__name__, (args[1:], sorted(kwds.items())), generation)
+        entry = response_cache.get(thiskey)
+        if entry is not None:
+            logger.info("returning from cache for key %s", thiskey)
+            etag, last_modified, ret_val = entry
+        else:
+            try:
+                ret_val = func(*args, **kwds)
+            except StandardError as exc:
+                logger.exception(exc)
+                return None
+            if ret_val is None:
+                return ret_val
+            etag, last_modified = response_cache.put(thiskey, ret_val)
+        web.header("ETag", etag)
+        web.header("Last-Modified", last_modified)
+        if ResponseCache.is_not_modified(etag, last_modified, web.ctx.env.get("HTTP_IF_NONE_MATCH"), web.ctx.env.get("HTTP_IF_MODIFIED_SINCE")):
+            web.ctx.status = "304 Not Modified"
+            return ""
+        return ret_val
     # set inner function __name__ and __doc__ to original ones
     inner.__name__ = func.__name__
     inner.__doc__ = func.__doc__
@@ -546,19 +549,11 @@ class DataLoggerWebApp(object):
         self.logger.info("index_key : %s", index_key)
         self.logger.info("value_keyname : %s", value_keyname)
         self.logger.info("stat_func_name: %s", stat_func_name)
-        datalogger = DataLogger(basedir, project, tablename)
-        filterkeys = dict(zip(datalogger.index_keynames, index_key))
-        ret_data = []
-        for datestring in datalogger.monthwalker(monthstring):
-            self.logger.debug("getting tsatstats for %s", monthstring)
-            try:
-                tsastats = datalogger.load_tsastats(datestring, filterkeys=filterkeys)
-                ret_data.append([datestring, tsastats[index_key][value_keyname][stat_func_name]])
-            except DataLoggerRawFileMissing as exc:
-                self.logger.error("No Input File for datestring %s found, skipping this date", datestring)
-            except DataLoggerLiveDataError as exc:
-                self.logger.error("Reading from live data is not allowed, skipping this data, and ending loop")
-                break
+        datestrings = tuple(DataLogger.monthwalker(monthstring))
+        datalogger = DataLogger(basedir)
+        datalogger.setup(project, tablename, datestrings[0])
+        # answered from rollups where available
+        ret_data = datalogger.get_tsastats_longtime(datestrings[0], datestrings[-1], index_key, value_keyname, stat_func_name)
         return json.dumps(ret_data)
 
     def get_lt_ts(self, project, tablename, args):
@@ -568,18 +563,10 @@ class DataLoggerWebApp(object):
         # datestringStart + "/" + datestringStop + "/" + Base64.encode(indexKey) + "/" + valueKeyname + "/" + statFuncName
         start, stop, index_key_enc, value_keyname, stat_func_name = args
         index_key = tuple([unicode(key_value) for key_value in eval(base64.b64decode(index_key_enc))])
-        datalogger = DataLogger(basedir, project, tablename)
-        filterkeys = dict(zip(datalogger.index_keynames, index_key))
-        ret_data = []
-        for datestring in datalogger.datewalker(start, stop):
-            try:
-                tsastats = datalogger.load_tsastats(datestring, filterkeys=filterkeys)
-                ret_data.append([datestring, tsastats[index_key][value_keyname][stat_func_name]])
-            except DataLoggerRawFileMissing as exc:
-                self.logger.error("No Input File for datestring %s found, skipping this date", datestring)
-            except DataLoggerLiveDataError as exc:
-                self.logger.error("Reading from live data is not allowed, skipping this data, and ending loop")
-                break
+        datalogger = DataLogger(basedir)
+        datalogger.setup(project, tablename, start)
+        # answered from rollups where available
+        ret_data = datalogger.get_tsastats_longtime(start, stop, index_key, value_keyname, stat_func_name)
         return json.dumps(ret_data)
 
     def upload_raw_file(self, args):
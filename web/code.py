@@ -11,9 +11,13 @@ import json
 import time
 import base64
 import gzip
+import types
 # own modules
 from datalogger import DataLogger as DataLogger
 from datalogger import TimeseriesStats as TimeseriesStats
+from datalogger import ResponseCache as ResponseCache
+from datalogger import Streaming
+from datalogger import Downsampling
 
 urls = (
     "/(.*)", "DataLoggerWeb",
@@ -49,44 +53,69 @@ def calllogger(func):
     inner.__doc__ = func.__doc__
     return inner
 
-MEMCACHE = {}
 MAXAGE = 300
 def memcache(func):
     """
-    decorator to cache return values according to used function parameters
+    decorator to cache return values according to used function parameters,
+    the cache is DataLogger.response_cache on disk and shared by all
+    processes and DataLoggerWebApp3, entries of finished days are valid
+    until their caches change, all other entries for MAXAGE seconds, see
+    DataLogger.get_generation, answers conditional requests with 304
+
+    only for static methods, the only argument is the list of url arguments
     """
     def inner(*args, **kwds):
-        starttime = time.time()
-        thiskey = unicode((func.__name__, args, kwds))
-        logging.info("number of keys in cache %d", len(MEMCACHE.keys()))
-        logging.info("key to look for %s", thiskey)
-        # get rid of old cache entries
-        for key in MEMCACHE.keys():
-            if (MEMCACHE[key]["ts"] + MAXAGE) < starttime:
-                logging.info("deleting aged cache entry for key %s", key)
-                del MEMCACHE[key]
-        # is there an entry for this key
-        if thiskey in MEMCACHE:
-            if (MEMCACHE[thiskey]["ts"] + MAXAGE) > starttime:
-                logging.info("returning from cache for key %s", thiskey)
-                return MEMCACHE[thiskey]["data"]
-        #logging.info("createing new cache entry for %s", key)
-        try:
-            ret_val = func(*args, **kwds)
-            #logging.info("Storing returned data in cache for %s s", MAXAGE)
-            MEMCACHE[thiskey] = {
-                "ts" : starttime,
-                "data" : ret_val,
-            }
-            return ret_val
-        except StandardError as exc:
-            logging.exception(exc)
+        datalogger = DataLogger(basedir)
+        response_cache = datalogger.response_cache
+        generation = datalogger.get_generation(args[0] if args else [], MAXAGE)
+        thiskey = response_cache.get_key(func.__name__, (args, sorted(kwds.items())), generation)
+        entry = response_cache.get(thiskey)
+        if entry is not None:
+            logging.info("returning from cache for key %s", thiskey)
+            etag, last_modified, ret_val = entry
+        else:
+            try:
+                ret_val = func(*args, **kwds)
+            except StandardError as exc:
+                logging.exception(exc)
+                return None
+            if ret_val is None:
+                return ret_val
+            etag, last_modified = response_cache.put(thiskey, ret_val)
+        web.header("ETag", etag)
+        web.header("Last-Modified", last_modified)
+        if ResponseCache.is_not_modified(etag, last_modified, web.ctx.env.get("HTTP_IF_NONE_MATCH"), web.ctx.env.get("HTTP_IF_MODIFIED_SINCE")):
+            web.ctx.status = "304 Not Modified"
+            return ""
+        return ret_val
     # set inner function __name__ and __doc__ to original ones
     inner.__name__ = func.__name__
     inner.__doc__ = func.__doc__
     return inner
 
 
+def hc_series(data, value_keynames):
+    """
+    convert dump_dict() data to highcharts series, sorted by timestamp
+
+    if the request has query parameter points, every series is reduced
+    to about this number of points, by query parameter downsample, one
+    of lttb (default) or minmax
+    """
+    query = web.input(points=None, downsample="lttb")
+    times = sorted(data.keys())
+    series = []
+    for value_keyname in value_keynames:
+        ts_ms = [ts * 1000 for ts in times]
+        values = [data[ts][value_keyname] for ts in times]
+        if query.points is not None:
+            ts_ms, values = Downsampling.downsample(ts_ms, values, int(query.points), query.downsample)
+        series.append({
+            "name" : value_keyname,
+            "data" : tuple(zip(ts_ms, values))
+        })
+    return series
+
 
 class DataLoggerWeb(object):
     """retrieve Data from RRD Archive"""
@@ -149,10 +178,16 @@ class DataLoggerWeb(object):
             "sr_hrstorage_unused" : self.sr_hrstorage_unused,
         }
         try:
-            return method_func_dict[method](method_args)
+            result = method_func_dict[method](method_args)
         except KeyError as exc:
             logging.debug("unknown method called %s", method)
             return "There is no method called %s" % method
+        # streamed responses are compressed chunk by chunk
+        if isinstance(result, types.GeneratorType) and "gzip" in web.ctx.env.get("HTTP_ACCEPT_ENCODING", ""):
+            web.header("Content-Encoding", "gzip")
+            web.header("Vary", "Accept-Encoding")
+            return Streaming.gzip_chunks(result)
+        return result
 
     def POST(self, args):
         """
@@ -458,11 +493,7 @@ class DataLoggerWeb(object):
         # you must not set this option, according to
         # http://stackoverflow.com/questions/11866333/ioerror-when-trying-to-serve-file
         # web.header('Transfer-Encoding','chunked')
-        yield "[" + json.dumps(tsa.export().next())
-        for chunk in tsa.export():
-            #logging.info("yielding %s", chunk)
-            yield "," + json.dumps(chunk)
-        yield "]"
+        return Streaming.json_chunks(tsa.export())
 
     def get_tsa_adv(self, args):
         """
@@ -499,11 +530,7 @@ class DataLoggerWeb(object):
         # you must not set this option, according to
         # http://stackoverflow.com/questions/11866333/ioerror-when-trying-to-serve-file
         # web.header('Transfer-Encoding','chunked')
-        yield "[" + json.dumps(tsa.export().next())
-        for chunk in tsa.export():
-            #logging.info("yielding %s", chunk)
-            yield "," + json.dumps(chunk)
-        yield "]"
+        return Streaming.json_chunks(tsa.export())
 
     def get_ts(self, args):
         """
@@ -525,12 +552,7 @@ class DataLoggerWeb(object):
         datalogger = DataLogger(basedir, project, tablename)
         key_dict = dict(zip(datalogger.index_keynames, key))
         tsa = datalogger.load_tsa(datestring, filterkeys=key_dict)
-        yield "[" + json.dumps(tsa.export().next())
-        for chunk in tsa.export():
-            yield "," + json.dumps(chunk)
-        yield "]"
-        #outbuffer = json.dumps(tuple(tsa.export()))
-        #return outbuffer
+        return Streaming.json_chunks(tsa.export())
 
     def get_tsastats(self, args):
         """
@@ -550,10 +572,12 @@ class DataLoggerWeb(object):
         project, tablename, datestring = args[:3]
         datalogger = DataLogger(basedir, project, tablename)
         tsastats = datalogger.load_tsastats(datestring)
-        return tsastats.to_json()
+        # same structure as tsastats.to_json(), streamed key by key
+        return Streaming.json_chunks([tsastats.index_keynames, tsastats.value_keynames, ([key, tsastats[key].stats] for key in tsastats.keys())])
 
+    @staticmethod
     @memcache
-    def get_stat_func_names(self, args):
+    def get_stat_func_names(args):
         """
         return defined stat_func_names in TimeseriesStats objects
 
@@ -620,6 +644,7 @@ class DataLoggerWeb(object):
 
         parameters:
         /<str>project/<str>tablename/<str>datestring/<str>key/<str>value_keys/<str>datetype/<str>group_str
+        optional ?points=<int>&downsample=<lttb|minmax> to reduce every series to about points
 
         keyids=hostname:srvszp2orb.tilak.cc means
         this is only useful if keyids are unique
@@ -696,21 +721,14 @@ class DataLoggerWeb(object):
         else:
             data = tsa[keys].dump_dict()
             stats = tsa[keys].stats.htmltable()
-        result = {
-                "stats" : stats,
-                "data" : [],
-                }
         # holds return data
         logging.info("data keys : %s", data[data.keys()[0]].keys())
-        for value_key in value_keys:
-            # ist important to sort by timestamp, to not confuse
-            # highcharts
-            result["data"].append(
-                {
-                    "name" : value_key,
-                    "data" : tuple(((ts * 1000, row_dict[value_key]) for ts, row_dict in sorted(data.items())))
+        # ist important to sort by timestamp, to not confuse
+        # highcharts
+        result = {
+                "stats" : stats,
+                "data" : hc_series(data, value_keys),
                 }
-            )
         return json.dumps(result)
 
     def get_hc_daily_data(self, args):
@@ -730,6 +748,7 @@ class DataLoggerWeb(object):
             if given, the data will be grouped on this given index_keyname
             if hostname is given the above example will be gruped by hostname=u'srvcl14db2.tilak.cc'
             and all possible Timeseries will be summed up
+        optional ?points=<int>&downsample=<lttb|minmax> to reduce every series to about points
 
         return data json encoded like this
         [
@@ -792,17 +811,8 @@ class DataLoggerWeb(object):
         # get in highcharts shape
         result = {
             "stats" : stats,
-            "data" : [], # holds highchart data
+            "data" : hc_series(data, value_keynames), # holds highchart data
         }
-        for value_keyname in value_keynames:
-            # its important to sort by timestamp, to not confuse
-            # highcharts
-            result["data"].append(
-                {
-                    "name" : value_keyname,
-                    "data" : tuple(((ts * 1000, row_dict[value_keyname]) for ts, row_dict in sorted(data.items())))
-                }
-            )
         return json.dumps(result)
 
     def get_longtime_data(self, args):